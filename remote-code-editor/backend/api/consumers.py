@@ -451,3 +451,112 @@ class AIChatConsumer(AsyncWebsocketConsumer):
             'type': 'done',
             'elapsed_time': elapsed_time
         }))
+
+
+class SearchConsumer(AsyncWebsocketConsumer):
+    """
+    内容搜索WebSocket消费者
+
+    客户端发送 {"type": "search", "id", "query", "options"} 开始搜索（同时取消上一次搜索），
+    发送 {"type": "cancel"} 取消当前搜索；服务端逐帧推送带 id 的搜索事件
+    """
+    
+    async def connect(self):
+        """建立连接"""
+        await self.accept()
+        self.job = None
+        self.search_task = None
+    
+    async def disconnect(self, close_code):
+        """断开连接"""
+        self.cancel_search()
+    
+    async def receive(self, text_data):
+        """接收消息"""
+        try:
+            data = json.loads(text_data)
+        except json.JSONDecodeError:
+            await self.send(json.dumps({
+                'type': 'error',
+                'message': '无效的JSON格式'
+            }))
+            return
+        
+        request_type = data.get('type')
+        
+        if request_type == 'search':
+            await self.handle_search(data)
+        elif request_type == 'cancel':
+            self.cancel_search()
+        elif request_type == 'ping':
+            await self.send(json.dumps({'type': 'pong'}))
+        else:
+            await self.send(json.dumps({
+                'type': 'error',
+                'message': f'未知的请求类型: {request_type}'
+            }))
+    
+    def cancel_search(self):
+        """取消当前搜索"""
+        if self.job is not None:
+            self.job.cancel()
+            self.job = None
+    
+    async def handle_search(self, data):
+        """开始新的搜索"""
+        import os
+        import re
+        from services.search_service import create_search_job
+        
+        self.cancel_search()
+        search_id = data.get('id')
+        query = data.get('query', '')
+        workspace = settings.WORKSPACE_PATH
+        if not query or not workspace or not os.path.exists(workspace):
+            await self.send(json.dumps({
+                'type': 'error',
+                'id': search_id,
+                'message': '搜索内容为空或工作区路径无效'
+            }))
+            return
+        
+        try:
+            job = create_search_job(workspace, query, data.get('options', {}), search_id)
+        except (re.error, ValueError) as e:
+            await self.send(json.dumps({
+                'type': 'error',
+                'id': search_id,
+                'message': f'无效的搜索参数: {e}'
+            }))
+            return
+        
+        self.job = job
+        self.search_task = asyncio.ensure_future(self.stream_search(job))
+    
+    async def stream_search(self, job):
+        """在线程中执行搜索，并将事件逐帧发送给客户端"""
+        from services.search_service import event_to_json
+        
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        
+        def produce():
+            try:
+                for event in job.run():
+                    loop.call_soon_threadsafe(queue.put_nowait, event_to_json(event))
+            finally:
+                loop.call_soon_threadsafe(queue.put_nowait, None)
+        
+        producer = loop.run_in_executor(None, produce)
+        await self.send(json.dumps({'type': 'start', 'id': job.id}))
+        try:
+            while True:
+                event = await queue.get()
+                if event is None:
+                    break
+                event['id'] = job.id
+                await self.send(json.dumps(event))
+            await producer
+        except Exception as e:
+            job.cancel()
+            print(f"搜索推送失败: {e}")
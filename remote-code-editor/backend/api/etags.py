@@ -0,0 +1,50 @@
+"""
+条件请求（ETag）辅助函数
+配合 django.views.decorators.http.condition 使用：ETag 函数返回弱 ETag（无法计算时返回 None），
+请求的 If-None-Match 匹配时由 Django 直接返回 304 Not Modified
+"""
+import hashlib
+import uuid
+from typing import Optional
+
+from services.file_service import FileService
+
+
+# 进程标识：基于进程内计数器的 ETag 在重启后不能与之前的混淆
+PROCESS_TOKEN = uuid.uuid4().hex[:8]
+
+
+def weak_etag(*parts) -> str:
+    """由若干部分生成弱 ETag"""
+    digest = hashlib.blake2b('\0'.join(map(str, parts)).encode('utf-8'), digest_size=8).hexdigest()
+    return f'W/"{digest}"'
+
+
+def file_etag(file_service: FileService, relative_path: str) -> Optional[str]:
+    """文件的 ETag：inode、mtime、大小（文件不存在等情况返回 None，由视图返回错误）"""
+    try:
+        file_stat = file_service.resolve_file(relative_path).stat()
+    except (OSError, ValueError):
+        return None
+    return weak_etag('file', file_stat.st_ino, file_stat.st_mtime_ns, file_stat.st_size)
+
+
+def directory_etag(file_service: FileService, relative_path: str) -> Optional[str]:
+    """
+    目录列表的 ETag：目录列表缓存的代数
+
+    列表中含子项的大小和修改时间，目录自身的 mtime 不足以判断；列表缓存在目录 mtime 变化、
+    收到文件变更通知或超过有效期时重新列出并更新代数
+    """
+    if not file_service.workspace:
+        return None
+    try:
+        generation = file_service.directory_generation(relative_path)
+    except (OSError, ValueError):
+        return None
+    return weak_etag('tree', PROCESS_TOKEN, file_service.workspace, relative_path, generation)
+
+
+def outline_etag(graph, file: str) -> str:
+    """文件大纲的 ETag：代码图的代数（符号增删时变化）"""
+    return weak_etag('outline', PROCESS_TOKEN, graph.generation, file)
@@ -6,4 +6,5 @@ from . import consumers
 
 websocket_urlpatterns = [
     re_path(r'^api/ai/chat/?$', consumers.AIChatConsumer.as_asgi()),
+    re_path(r'^api/search/ws/?$', consumers.SearchConsumer.as_asgi()),
 ]
@@ -13,12 +13,15 @@ urlpatterns = [
     # 文件操作API
     path('files/tree/', views.get_file_tree, name='file_tree'),
     path('files/read/', views.read_file, name='file_read'),
+    path('files/raw/', views.raw_file, name='file_raw'),
     path('files/save/', views.save_file, name='file_save'),
+    path('files/patch/', views.patch_file, name='file_patch'),
     path('files/create/', views.create_file_or_dir, name='file_create'),
     path('files/rename/', views.rename_file_or_dir, name='file_rename'),
     path('files/delete/', views.delete_file_or_dir, name='file_delete'),
     path('files/exists/', views.check_exists, name='file_exists'),
     path('files/copy/', views.copy_file_or_dir, name='file_copy'),
+    path('files/find/', views.find_files, name='file_find'),
     
     # 工作区API
     path('workspace/get/', views.get_workspace, name='workspace_get'),
@@ -48,6 +51,8 @@ urlpatterns = [
     
     # 搜索功能API
     path('search/content/', views.search_content, name='search_content'),
+    path('search/stream/', views.search_stream, name='search_stream'),
+    path('search/cancel/', views.search_cancel, name='search_cancel'),
     
     # AI对话历史管理API
     path('conversations/list/', views.list_conversations, name='conversations_list'),
@@ -104,6 +109,7 @@ urlpatterns = [
     path('agent/verify/', views.verify_code_api, name='agent_verify'),
     path('agent/generate-tests/', views.generate_tests, name='agent_generate_tests'),
     path('agent/index/', views.index_workspace, name='agent_index'),
+    path('agent/index/stats/', views.index_stats, name='agent_index_stats'),
     path('agent/search/', views.search_symbol, name='agent_search'),
     path('agent/references/', views.get_references, name='agent_references'),
     path('agent/call-graph/', views.get_call_graph, name='agent_call_graph'),
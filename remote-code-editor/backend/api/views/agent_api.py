@@ -3,32 +3,51 @@ Agent API 接口
 提供代码生成、验证、索引等功能的 REST API
 """
 import json
+from pathlib import Path
+from typing import Set
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
-from django.views.decorators.http import require_http_methods
+from django.views.decorators.http import condition, require_http_methods
 from django.conf import settings
 
 from agent.code_agent import CodeAgent, solve_task
 from pipeline.verify_pipeline import VerifyPipeline, verify_code
-from code_index.indexer import CodeIndexer
+from api.etags import outline_etag
 from code_index.searcher import CodeSearcher
+from services.code_index_service import get_index_registry
 
 
-# 全局代码索引（延迟初始化）
-_code_graph = None
-_code_searcher = None
+class WorkspaceNotAllowed(Exception):
+    """请求的工作区既未配置也未建立索引"""
+
+
+def _known_workspaces() -> Set[str]:
+    """已配置的工作区：当前工作区及 workspace_config.json 中的工作区列表（规范化路径）"""
+    paths = [settings.WORKSPACE_PATH]
+    config_file = Path(settings.BASE_DIR) / 'workspace_config.json'
+    try:
+        with open(config_file, 'r', encoding='utf-8') as f:
+            paths += json.load(f).get('workspaces', [])
+    except (OSError, ValueError, AttributeError):
+        pass
+    registry = get_index_registry()
+    return {registry.normalize(path) for path in paths if path}
 
 
 def _get_searcher(workspace: str = None) -> CodeSearcher:
-    """获取代码搜索器（带缓存）"""
-    global _code_graph, _code_searcher
-    
-    if _code_searcher is None and workspace:
-        indexer = CodeIndexer(workspace)
-        _code_graph = indexer.index()
-        _code_searcher = CodeSearcher(_code_graph)
+    """
+    获取工作区的代码搜索器（按工作区缓存，默认使用当前工作区）
     
-    return _code_searcher
+    只接受已配置的工作区和已建立索引的工作区（POST /api/agent/index/），
+    其他路径抛出 WorkspaceNotAllowed，不会为任意路径建立索引和文件监听
+    """
+    workspace = workspace or settings.WORKSPACE_PATH
+    if not workspace:
+        return None
+    registry = get_index_registry()
+    if registry.peek(workspace) is None and registry.normalize(workspace) not in _known_workspaces():
+        raise WorkspaceNotAllowed(f"工作区未打开: {workspace}")
+    return registry.get(workspace).searcher
 
 
 @csrf_exempt
@@ -188,11 +207,10 @@ def index_workspace(request):
     
     POST /api/agent/index/
     {
-        "workspace": "/path/to/workspace"
+        "workspace": "/path/to/workspace",
+        "incremental": true
     }
     """
-    global _code_graph, _code_searcher
-    
     try:
         data = json.loads(request.body)
         workspace = data.get("workspace", "")
@@ -203,14 +221,12 @@ def index_workspace(request):
                 "error": "缺少 workspace 参数"
             }, status=400)
         
-        # 创建索引
-        indexer = CodeIndexer(workspace)
-        _code_graph = indexer.index()
-        _code_searcher = CodeSearcher(_code_graph)
+        # 创建索引（默认增量：只解析变更的文件，其余从持久化存储加载）
+        entry = get_index_registry().reindex(workspace, incremental=data.get("incremental", True))
         
         return JsonResponse({
             "success": True,
-            "stats": _code_graph.to_dict()["stats"]
+            "stats": entry.graph.to_dict()["stats"]
         })
         
     except Exception as e:
@@ -239,7 +255,7 @@ def search_symbol(request):
                 "error": "缺少 q 参数"
             }, status=400)
         
-        searcher = _get_searcher()
+        searcher = _get_searcher(request.GET.get("workspace"))
         if not searcher:
             return JsonResponse({
                 "success": False,
@@ -263,6 +279,11 @@ def search_symbol(request):
             ]
         })
         
+    except WorkspaceNotAllowed as e:
+        return JsonResponse({
+            "success": False,
+            "error": str(e)
+        }, status=403)
     except Exception as e:
         return JsonResponse({
             "success": False,
@@ -287,7 +308,7 @@ def get_references(request):
                 "error": "缺少 name 参数"
             }, status=400)
         
-        searcher = _get_searcher()
+        searcher = _get_searcher(request.GET.get("workspace"))
         if not searcher:
             return JsonResponse({
                 "success": False,
@@ -301,6 +322,11 @@ def get_references(request):
             "references": references
         })
         
+    except WorkspaceNotAllowed as e:
+        return JsonResponse({
+            "success": False,
+            "error": str(e)
+        }, status=403)
     except Exception as e:
         return JsonResponse({
             "success": False,
@@ -315,31 +341,42 @@ def get_call_graph(request):
     获取调用图
     
     GET /api/agent/call-graph/?name=function_name&depth=2
+    GET /api/agent/call-graph/?name=a&name=b&depth=2（批量，返回 call_graphs）
     """
     try:
-        name = request.GET.get("name", "")
+        names = [n for n in request.GET.getlist("name") if n]
         depth = int(request.GET.get("depth", 2))
         
-        if not name:
+        if not names:
             return JsonResponse({
                 "success": False,
                 "error": "缺少 name 参数"
             }, status=400)
         
-        searcher = _get_searcher()
+        searcher = _get_searcher(request.GET.get("workspace"))
         if not searcher:
             return JsonResponse({
                 "success": False,
                 "error": "代码索引未初始化"
             }, status=400)
         
-        call_graph = searcher.get_call_graph(name, depth)
+        call_graphs = searcher.get_call_graphs(names, depth)
         
+        if len(names) > 1:
+            return JsonResponse({
+                "success": True,
+                "call_graphs": call_graphs
+            })
         return JsonResponse({
             "success": True,
-            "call_graph": call_graph
+            "call_graph": call_graphs[names[0]]
         })
         
+    except WorkspaceNotAllowed as e:
+        return JsonResponse({
+            "success": False,
+            "error": str(e)
+        }, status=403)
     except Exception as e:
         return JsonResponse({
             "success": False,
@@ -347,8 +384,20 @@ def get_call_graph(request):
         }, status=500)
 
 
+def _outline_etag(request):
+    file = request.GET.get("file", "")
+    try:
+        searcher = _get_searcher(request.GET.get("workspace"))
+    except Exception:
+        return None
+    if not file or not searcher:
+        return None
+    return outline_etag(searcher.graph, file)
+
+
 @csrf_exempt
 @require_http_methods(["GET"])
+@condition(etag_func=_outline_etag)
 def get_file_outline(request):
     """
     获取文件大纲
@@ -364,7 +413,7 @@ def get_file_outline(request):
                 "error": "缺少 file 参数"
             }, status=400)
         
-        searcher = _get_searcher()
+        searcher = _get_searcher(request.GET.get("workspace"))
         if not searcher:
             return JsonResponse({
                 "success": False,
@@ -378,8 +427,27 @@ def get_file_outline(request):
             "outline": outline
         })
         
+    except WorkspaceNotAllowed as e:
+        return JsonResponse({
+            "success": False,
+            "error": str(e)
+        }, status=403)
     except Exception as e:
         return JsonResponse({
             "success": False,
             "error": str(e)
         }, status=500)
+
+
+@csrf_exempt
+@require_http_methods(["GET"])
+def index_stats(request):
+    """
+    获取代码索引缓存统计（各工作区索引大小、命中率、淘汰次数）
+    
+    GET /api/agent/index/stats/
+    """
+    return JsonResponse({
+        "success": True,
+        "stats": get_index_registry().stats()
+    })
@@ -2,12 +2,18 @@
 文件操作视图
 """
 import json
-from django.http import JsonResponse
-from django.views.decorators.http import require_http_methods
+import os
+import re
+from urllib.parse import urlencode
+from django.http import FileResponse, HttpResponse, JsonResponse
+from django.urls import reverse
+from django.views.decorators.http import condition, require_http_methods
 from django.views.decorators.csrf import csrf_exempt
 from django.conf import settings
 
-from services.file_service import FileService
+from api.etags import directory_etag, file_etag
+from code_index.path_index import get_path_index
+from services.file_service import FileService, VersionConflictError
 
 
 # 初始化文件服务
@@ -37,6 +43,7 @@ def sync_to_async(coro):
 
 @csrf_exempt
 @require_http_methods(["GET"])
+@condition(etag_func=lambda request: directory_etag(file_service, request.GET.get('path', '')))
 def get_file_tree(request):
     """获取文件目录树"""
     # 检查工作区是否设置
@@ -61,18 +68,47 @@ def get_file_tree(request):
         return JsonResponse({'error': str(e)}, status=500)
 
 
+# 单次按行读取的最大行数
+MAX_LINE_WINDOW = 10000
+
+# 原始字节接口每次从文件读取的块大小
+RAW_CHUNK_SIZE = 256 * 1024
+
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
 @csrf_exempt
 @require_http_methods(["GET"])
+@condition(etag_func=lambda request: file_etag(file_service, request.GET.get('path', '')))
 def read_file(request):
-    """读取文件内容"""
+    """
+    读取文件内容
+
+    Query params:
+        path: 文件路径
+        start_line / line_count: 提供任一个时只读取该行窗口（大文件无需整体读取）
+    """
     path = request.GET.get('path', '')
 
     if not path:
         return JsonResponse({'error': '缺少path参数'}, status=400)
 
+    start_line = request.GET.get('start_line')
+    line_count = request.GET.get('line_count')
+
     try:
-        result = sync_to_async(file_service.read_file(path))
+        if start_line is not None or line_count is not None:
+            try:
+                start_line = int(start_line or 1)
+                line_count = min(int(line_count or 1000), MAX_LINE_WINDOW)
+            except ValueError:
+                return JsonResponse({'error': 'start_line 和 line_count 必须是整数'}, status=400)
+            result = sync_to_async(file_service.read_lines(path, start_line, line_count))
+        else:
+            result = sync_to_async(file_service.read_file(path))
         # result 包含 content, is_binary, mime_type 等信息
+        if result.get('is_binary'):
+            result['raw_url'] = reverse('file_raw') + '?' + urlencode({'path': path})
         return JsonResponse({'path': path, **result})
     except FileNotFoundError:
         return JsonResponse({'error': f'文件不存在: {path}'}, status=404)
@@ -80,10 +116,104 @@ def read_file(request):
         return JsonResponse({'error': f'路径是目录，不是文件: {path}'}, status=400)
     except PermissionError:
         return JsonResponse({'error': f'无权限访问: {path}'}, status=403)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
 
+def _parse_range(header: str, size: int):
+    """
+    解析单个 Range（bytes=a-b、bytes=a-、bytes=-n）
+
+    Returns:
+        (start, end)（包含 end）；无法解析或多个范围时返回 None（按完整内容响应）；
+        范围不可满足时返回 False
+    """
+    match = _RANGE_RE.match(header.strip())
+    if not match or match.group(1) == match.group(2) == '':
+        return None
+    first, last = match.groups()
+    if first == '':
+        # 最后 n 个字节
+        length = int(last)
+        if length == 0 or size == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+class _RangeReader:
+    """只读取文件 [start, end] 范围的类文件对象（供 FileResponse 逐块发送）"""
+
+    def __init__(self, f, start: int, end: int):
+        self.f = f
+        self.f.seek(start)
+        self.remaining = end - start + 1
+
+    def read(self, size: int = -1) -> bytes:
+        if self.remaining <= 0:
+            return b''
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.f.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.f.close()
+
+
+@csrf_exempt
+@require_http_methods(["GET", "HEAD"])
+@condition(etag_func=lambda request: file_etag(file_service, request.GET.get('path', '')))
+def raw_file(request):
+    """
+    以原始字节流式返回文件（不做 base64 或解码），支持 HTTP Range（单个范围）
+
+    Query params:
+        path: 文件路径
+    """
+    path = request.GET.get('path', '')
+
+    if not path:
+        return JsonResponse({'error': '缺少path参数'}, status=400)
+
+    try:
+        abs_path = file_service.resolve_file(path)
+        f = open(abs_path, 'rb')
+    except FileNotFoundError:
+        return JsonResponse({'error': f'文件不存在: {path}'}, status=404)
+    except IsADirectoryError:
+        return JsonResponse({'error': f'路径是目录，不是文件: {path}'}, status=400)
+    except PermissionError:
+        return JsonResponse({'error': f'无权限访问: {path}'}, status=403)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    size = os.fstat(f.fileno()).st_size
+    byte_range = _parse_range(request.headers.get('Range', ''), size)
+    if byte_range is False:
+        f.close()
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    start, end = byte_range or (0, size - 1)
+    response = FileResponse(_RangeReader(f, start, end), filename=abs_path.name)
+    response.block_size = RAW_CHUNK_SIZE
+    response['Content-Length'] = str(end - start + 1)
+    response['Accept-Ranges'] = 'bytes'
+    if byte_range:
+        response.status_code = 206
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return response
+
+
 @csrf_exempt
 @require_http_methods(["POST"])
 def save_file(request):
@@ -100,8 +230,8 @@ def save_file(request):
         return JsonResponse({'error': '缺少path参数'}, status=400)
 
     try:
-        sync_to_async(file_service.save_file(path, content))
-        return JsonResponse({'success': True, 'message': f'文件已保存: {path}'})
+        version = sync_to_async(file_service.save_file(path, content))
+        return JsonResponse({'success': True, 'message': f'文件已保存: {path}', 'version': version})
     except FileNotFoundError:
         return JsonResponse({'error': '目录不存在'}, status=404)
     except PermissionError:
@@ -110,6 +240,46 @@ def save_file(request):
         return JsonResponse({'error': str(e)}, status=500)
 
 
+@csrf_exempt
+@require_http_methods(["POST"])
+def patch_file(request):
+    """
+    按补丁保存文件（只上传修改的部分，原子替换）
+
+    Body:
+        path: 文件路径
+        base_version: 读取文件时返回的 version
+        edits: [{start, end, text}]（按字符偏移，相对于基准内容），或
+        diff: 统一格式差异
+    """
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'error': '无效的JSON数据'}, status=400)
+
+    path = data.get('path', '')
+    base_version = data.get('base_version', '')
+
+    if not path or not base_version:
+        return JsonResponse({'error': '缺少path或base_version参数'}, status=400)
+
+    try:
+        result = sync_to_async(file_service.patch_file(path, base_version, data.get('edits'), data.get('diff')))
+        return JsonResponse({'success': True, **result})
+    except VersionConflictError as e:
+        return JsonResponse({'error': str(e), 'current_version': e.current_version}, status=409)
+    except FileNotFoundError:
+        return JsonResponse({'error': f'文件不存在: {path}'}, status=404)
+    except IsADirectoryError:
+        return JsonResponse({'error': f'路径是目录，不是文件: {path}'}, status=400)
+    except PermissionError:
+        return JsonResponse({'error': '无权限写入'}, status=403)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+
 @csrf_exempt
 @require_http_methods(["POST"])
 def create_file_or_dir(request):
@@ -229,3 +399,41 @@ def copy_file_or_dir(request):
         return JsonResponse({'error': '无权限复制'}, status=403)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
+
+
+@csrf_exempt
+@require_http_methods(["GET"])
+def find_files(request):
+    """
+    按文件路径模糊查找（fzf 风格的子序列匹配）
+
+    Query params:
+        q: 查询
+        limit: 最多返回的数量（默认 50，最多 500）
+    """
+    if not settings.WORKSPACE_PATH:
+        return JsonResponse({
+            'error': '工作区未设置，请先选择工作区'
+        }, status=400)
+
+    query = request.GET.get('q', '')
+    try:
+        limit = min(max(0, int(request.GET.get('limit', 50))), 500)
+    except ValueError:
+        return JsonResponse({'error': 'limit 必须是整数'}, status=400)
+
+    try:
+        index = get_path_index(settings.WORKSPACE_PATH)
+        matches, complete = index.find(query, limit, getattr(settings, 'FILE_FIND_BUDGET_MS', 8) / 1000)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+    return JsonResponse({
+        'files': [
+            {'path': m.path, 'name': os.path.basename(m.path), 'score': m.score, 'positions': m.positions}
+            for m in matches
+        ],
+        'count': len(matches),
+        # 超出时间预算时为 False：结果来自已打分的候选
+        'complete': complete,
+    })
@@ -9,6 +9,8 @@ from typing import Any, TypeVar, Union, Dict, List, Coroutine as CoroutineTyping
 from django.conf import settings
 from django.http import JsonResponse, HttpRequest
 from django.views.decorators.csrf import csrf_exempt
+from django.middleware.http import ConditionalGetMiddleware
+from django.utils.decorators import decorator_from_middleware
 from django.views.decorators.http import require_http_methods
 
 from services.file_service import FileService
@@ -49,8 +51,14 @@ def sync_to_async(coro: CoroutineTyping[Any, Any, T]) -> T:
 
 @csrf_exempt
 @require_http_methods(["GET"])
+@decorator_from_middleware(ConditionalGetMiddleware)
 def git_status(request: HttpRequest) -> JsonResponse:
-    """获取Git状态"""
+    """
+    获取Git状态
+    
+    工作区文件的修改不会反映在 .git 目录的时间戳上，无法廉价地判断状态是否变化；
+    这里按响应内容生成 ETag，内容未变时返回 304（节省传输，状态仍需计算）
+    """
     try:
         result: Dict[str, Any] = sync_to_async(git_service.get_status())
         return JsonResponse(result)
@@ -4,11 +4,15 @@
 import os
 import re
 import json
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
 from django.conf import settings
 
+from services.search_service import (
+    build_pattern, search_workspace, create_search_job, cancel_search, event_to_json
+)
+
 
 @csrf_exempt
 @require_http_methods(["POST"])
@@ -35,75 +39,79 @@ def search_content(request):
     if not workspace_path or not os.path.exists(workspace_path):
         return JsonResponse({'error': '工作区路径无效'}, status=400)
     
-    results = []
+    try:
+        pattern = build_pattern(query, use_regex, case_sensitive, whole_word)
+    except re.error as e:
+        return JsonResponse({'error': f'无效的正则表达式: {e}'}, status=400)
     
-    # 需要忽略的目录
-    ignore_dirs = {'.git', '__pycache__', 'node_modules', '.venv', 'venv', 'dist', 'build', '.idea', '.vscode'}
+    results = search_workspace(
+        workspace_path, pattern, max_files=50, max_matches_per_file=10,
+        timeout=getattr(settings, 'SEARCH_TIMEOUT', 10.0)
+    )
     
-    def should_ignore(path):
-        return any(ignored in path for ignored in ignore_dirs)
+    return JsonResponse({'results': [
+        {
+            'file': result['file'],
+            'matches': [
+                {'line': m.line, 'column': m.column, 'lineContent': m.text}
+                for m in result['matches']
+            ]
+        }
+        for result in results
+    ]})
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def search_stream(request):
+    """
+    流式搜索：以 NDJSON 逐行返回事件，找到一个文件就立即发送
+
+    第一行为 {"type": "start", "id"}，可用该 ID 调用 search/cancel/ 取消；
+    随后为 {"type": "file", "file", "matches"}，最后为 {"type": "done", "status", ...}
+    """
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'error': '无效的JSON数据'}, status=400)
     
-    def search_in_file(file_path):
-        """在单个文件中搜索"""
-        matches = []
-        try:
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                for line_num, line in enumerate(f, 1):
-                    # 构建搜索模式
-                    search_pattern = query
-                    if not use_regex:
-                        search_pattern = re.escape(query)
-                    if whole_word:
-                        search_pattern = r'\b' + search_pattern + r'\b'
-                    
-                    flags = 0 if case_sensitive else re.IGNORECASE
-                    
-                    try:
-                        if re.search(search_pattern, line, flags):
-                            # 找到匹配，提取上下文
-                            matches.append({
-                                'line': line_num,
-                                'column': 1,
-                                'lineContent': line.rstrip()[:200]  # 限制显示长度
-                            })
-                    except re.error:
-                        continue
-                    
-                    # 限制每个文件的匹配数量
-                    if len(matches) >= 10:
-                        break
-        except Exception:
-            pass
-        return matches
+    query = data.get('query', '')
+    if not query:
+        return JsonResponse({'error': '搜索内容不能为空'}, status=400)
     
-    def walk_directory(directory):
-        """遍历目录搜索"""
-        for root, dirs, files in os.walk(directory):
-            # 过滤掉忽略的目录
-            dirs[:] = [d for d in dirs if d not in ignore_dirs]
-            
-            if should_ignore(root):
-                continue
-            
-            for file in files:
-                # 跳过二进制文件和大型文件
-                if file.startswith('.') or file.endswith(('.pyc', '.exe', '.dll', '.so', '.bin')):
-                    continue
-                
-                file_path = os.path.join(root, file)
-                rel_path = os.path.relpath(file_path, workspace_path)
-                
-                matches = search_in_file(file_path)
-                if matches:
-                    results.append({
-                        'file': rel_path,
-                        'matches': matches
-                    })
-                    
-                    # 限制返回的文件数量
-                    if len(results) >= 50:
-                        return
+    workspace_path = settings.WORKSPACE_PATH
+    if not workspace_path or not os.path.exists(workspace_path):
+        return JsonResponse({'error': '工作区路径无效'}, status=400)
+    
+    try:
+        job = create_search_job(workspace_path, query, data.get('options', {}), data.get('id'))
+    except (re.error, ValueError) as e:
+        return JsonResponse({'error': f'无效的搜索参数: {e}'}, status=400)
     
-    walk_directory(workspace_path)
+    def stream():
+        yield json.dumps({'type': 'start', 'id': job.id}) + '\n'
+        events = job.run()
+        try:
+            for event in events:
+                yield json.dumps(event_to_json(event)) + '\n'
+        finally:
+            # 客户端断开时停止扫描
+            job.cancel()
+            events.close()
+    
+    response = StreamingHttpResponse(stream(), content_type='application/x-ndjson')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def search_cancel(request):
+    """取消正在进行的流式搜索"""
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'error': '无效的JSON数据'}, status=400)
     
-    return JsonResponse({'results': results})
+    return JsonResponse({'cancelled': cancel_search(data.get('id', ''))})
@@ -2,17 +2,39 @@
 工作区管理视图
 """
 import os
+import re
 import json
+import bisect
+import itertools
 from pathlib import Path
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
 from django.conf import settings
 
+from code_index.workspace_snapshot import compile_glob, get_snapshot
+from services.code_index_service import get_content_index
 from services.file_service import FileService
 from services.git_service import GitService
 
 
+# 工作区文件列表中包含的文本文件扩展名
+TEXT_EXTENSIONS = (
+    '.txt', '.md', '.py', '.js', '.ts', '.jsx', '.tsx', '.vue',
+    '.java', '.c', '.cpp', '.h', '.hpp', '.cs', '.go', '.rs',
+    '.php', '.rb', '.swift', '.kt', '.scala', '.lua', '.sh',
+    '.bash', '.zsh', '.fish', '.ps1', '.bat', '.cmd', '.json',
+    '.xml', '.yaml', '.yml', '.toml', '.ini', '.cfg', '.conf',
+    '.html', '.css', '.scss', '.sass', '.less', '.sql', '.r',
+    '.m', '.mm', '.dart', '.ex', '.exs', '.erl', '.hrl', '.clj',
+    '.cljs', '.cljc', '.edn', '.groovy', '.gradle', '.proto'
+)
+
+
+# 文件列表额外跳过的目录（常见的虚拟环境和构建输出，不在工作区快照的默认忽略目录中）
+EXTRA_IGNORE_DIRS = frozenset({'env', 'target', 'out'})
+
+
 def sync_to_async(coro):
     """将协程转换为同步调用的辅助函数"""
     import asyncio
@@ -238,6 +260,9 @@ def set_workspace(request):
     from . import git
     git.git_service = GitService(workspace_path)
     
+    # 开启 CONTENT_INDEX_ENABLED 时在后台预先构建内容索引（未开启时不构建）
+    get_content_index(workspace_path, wait=False)
+    
     # 保存到配置文件（包括工作区列表）
     config_file = Path(settings.BASE_DIR) / 'workspace_config.json'
     logger.info(f"配置文件路径: {config_file}")
@@ -388,10 +413,17 @@ def delete_workspace(request):
 @require_http_methods(["GET"])
 def get_workspace_files(request):
     """
-    获取工作区的所有文件列表
+    获取工作区的文件列表（按相对路径排序）
     
     Query params:
         path: 工作区路径
+        ext: 扩展名过滤，逗号分隔（如 py,ts），默认为常见文本文件
+        glob: 相对路径通配符过滤，匹配整个相对路径：* 和 ? 不匹配 /，** 匹配任意层目录
+            （如 src/*.py 只匹配 src 下一层，**/*.py 匹配所有 .py 文件）
+        relative: 为 1 时返回相对路径
+        limit: 每页数量；提供时分页返回，响应中的 next_cursor 用于获取下一页
+        cursor: 上一页返回的 next_cursor
+        format: ndjson 时逐行流式返回，每行一个文件，最后一行为 {"done": true, "count"}
     """
     workspace_path = request.GET.get('path', '')
     
@@ -401,46 +433,81 @@ def get_workspace_files(request):
     if not os.path.exists(workspace_path):
         return JsonResponse({'error': '工作区路径不存在'}, status=404)
     
+    ext = request.GET.get('ext', '')
+    extensions = tuple(
+        e if e.startswith('.') else '.' + e
+        for e in (part.strip() for part in ext.split(',')) if e
+    ) or TEXT_EXTENSIONS
     try:
-        files = []
-        
-        # 遍历工作区目录
-        for root, dirs, filenames in os.walk(workspace_path):
-            # 过滤掉隐藏目录和常见的忽略目录
-            dirs[:] = [d for d in dirs if not d.startswith('.') and d not in [
-                'node_modules', '__pycache__', 'venv', 'env', 'dist', 'build', 
-                '.git', '.vscode', '.idea', 'target', 'out'
-            ]]
-            
-            for filename in filenames:
-                # 过滤掉隐藏文件
-                if filename.startswith('.'):
-                    continue
-                
-                file_path = os.path.join(root, filename)
-                
-                # 只包含文本文件（根据扩展名）
-                text_extensions = [
-                    '.txt', '.md', '.py', '.js', '.ts', '.jsx', '.tsx', '.vue', 
-                    '.java', '.c', '.cpp', '.h', '.hpp', '.cs', '.go', '.rs', 
-                    '.php', '.rb', '.swift', '.kt', '.scala', '.lua', '.sh', 
-                    '.bash', '.zsh', '.fish', '.ps1', '.bat', '.cmd', '.json', 
-                    '.xml', '.yaml', '.yml', '.toml', '.ini', '.cfg', '.conf', 
-                    '.html', '.css', '.scss', '.sass', '.less', '.sql', '.r', 
-                    '.m', '.mm', '.dart', '.ex', '.exs', '.erl', '.hrl', '.clj', 
-                    '.cljs', '.cljc', '.edn', '.groovy', '.gradle', '.proto'
-                ]
-                
-                if any(filename.endswith(ext) for ext in text_extensions):
-                    files.append({
-                        'path': file_path,
-                        'name': filename
-                    })
-        
-        return JsonResponse({
-            'files': files,
-            'count': len(files)
-        })
-
+        glob = compile_glob(request.GET['glob']) if request.GET.get('glob') else None
+    except re.error:
+        return JsonResponse({'error': '无效的 glob'}, status=400)
+    relative = request.GET.get('relative') in ('1', 'true')
+    cursor = request.GET.get('cursor', '')
+    try:
+        limit = max(0, int(request.GET.get('limit', 0)))
+    except ValueError:
+        return JsonResponse({'error': 'limit 必须是整数'}, status=400)
+    
+    try:
+        # 工作区快照已按默认忽略目录和 .gitignore 过滤，且按路径排序（路径列表按快照版本缓存）
+        entries, paths = get_snapshot(workspace_path).listing()
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
+    
+    def matching():
+        """从游标之后开始产出符合过滤条件的文件"""
+        # bisect 的 key 参数需要 Python 3.10，这里对快照缓存的路径列表二分
+        start = bisect.bisect_right(paths, cursor) if cursor else 0
+        for entry in itertools.islice(entries, start, None):
+            parts = Path(entry.path).parts
+            # 过滤掉隐藏文件和隐藏目录中的文件，以及额外忽略的目录
+            if any(part.startswith('.') for part in parts):
+                continue
+            if any(part in EXTRA_IGNORE_DIRS for part in parts[:-1]):
+                continue
+            if not entry.path.endswith(extensions):
+                continue
+            if glob and not glob.match(entry.path):
+                continue
+            yield entry
+    
+    def file_info(entry) -> dict:
+        return {
+            'path': entry.path if relative else os.path.join(workspace_path, entry.path),
+            'name': os.path.basename(entry.path)
+        }
+    
+    if request.GET.get('format') == 'ndjson':
+        def stream():
+            count = 0
+            lines = []
+            for entry in matching():
+                lines.append(json.dumps(file_info(entry), ensure_ascii=False))
+                count += 1
+                # 每批合并成一个块发送
+                if len(lines) >= 500:
+                    yield '\n'.join(lines) + '\n'
+                    lines = []
+            lines.append(json.dumps({'done': True, 'count': count}))
+            yield '\n'.join(lines) + '\n'
+        
+        return StreamingHttpResponse(stream(), content_type='application/x-ndjson')
+    
+    files = []
+    last_path = next_cursor = None
+    for entry in matching():
+        if limit and len(files) >= limit:
+            # 还有下一页
+            next_cursor = last_path
+            break
+        files.append(file_info(entry))
+        last_path = entry.path
+    
+    response = {
+        'files': files,
+        'count': len(files)
+    }
+    if limit:
+        response['next_cursor'] = next_cursor
+    return JsonResponse(response)
@@ -5,5 +5,15 @@
 from .code_graph import CodeGraph
 from .indexer import CodeIndexer
 from .searcher import CodeSearcher
+from .index_store import IndexStore, open_workspace_store
+from .watcher import IndexWatcher, notify_file_changed
+from .registry import IndexRegistry
+from .content_index import ContentIndex
+from .workspace_snapshot import WorkspaceSnapshot, get_snapshot
+from .path_index import PathIndex, get_path_index
 
-__all__ = ['CodeGraph', 'CodeIndexer', 'CodeSearcher']
+__all__ = [
+    'CodeGraph', 'CodeIndexer', 'CodeSearcher', 'IndexStore', 'open_workspace_store',
+    'IndexWatcher', 'notify_file_changed', 'IndexRegistry', 'ContentIndex',
+    'WorkspaceSnapshot', 'get_snapshot', 'PathIndex', 'get_path_index',
+]
@@ -0,0 +1,387 @@
+"""
+代码索引基准
+- memory：在合成解析结果上对比紧凑存储与原先"每条边一个对象"的存储方式的内存占用
+- suite：生成合成仓库（N 个文件、每个文件 M 个类、每个函数调用 K 个其他函数），
+  计时索引、各类查询、保存/加载并记录峰值内存，结果输出为 JSON，可与基线对比发现性能退化
+
+用法：
+    python -m code_index.benchmark memory --symbols 100000
+    python -m code_index.benchmark suite --files 500 --output result.json
+    python -m code_index.benchmark suite --files 500 --baseline baseline.json --tolerance 0.25
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from .code_graph import CodeGraph, CodeSymbol, symbol_name_of
+
+
+# 合成仓库参数
+SYMBOLS_PER_FILE = 20
+CALLS_PER_FUNCTION = 3
+
+
+def synthetic_repo(symbol_count: int) -> Iterator[Tuple[List[tuple], List[tuple]]]:
+    """
+    生成合成仓库的解析结果（与 parse_source 的输出格式一致）
+
+    每个文件一个类、若干方法和函数；每个函数调用若干其他函数，类继承一个基类。
+    字符串逐个文件重新生成，与多进程解析后反序列化得到的对象一样互不共享
+    """
+    file_count = max(1, symbol_count // SYMBOLS_PER_FILE)
+    for f in range(file_count):
+        file = f"pkg{f % 50}/module_{f}.py"
+        symbols = [(f"Service{f}", "class", file, 1, 200, f"class Service{f}(BaseService)",
+                    f"Service {f} 的业务逻辑", None)]
+        edges = [(f"{file}::Service{f}", "*::BaseService", "inherits")]
+        for i in range(1, SYMBOLS_PER_FILE):
+            if i % 2:
+                name, type_, parent = f"Service{f}.handle_{i}", "method", f"Service{f}"
+            else:
+                name, type_, parent = f"process_item_{f}_{i}", "function", None
+            symbols.append((name, type_, file, i * 10, i * 10 + 8,
+                            f"def {name.split('.')[-1]}(self, request, *args)", None, parent))
+            for c in range(CALLS_PER_FUNCTION):
+                callee = f"process_item_{(f + c + 1) % file_count}_{(i + c) % SYMBOLS_PER_FILE}"
+                edges.append((f"{file}::{name}", f"*::{callee}", "calls"))
+        yield symbols, edges
+
+
+# ===== 原先的存储方式（普通 dataclass，每条边一个对象，邻接表保存边对象） =====
+
+@dataclass
+class _LegacySymbol:
+    name: str
+    type: str
+    file: str
+    line: int
+    end_line: int
+    signature: Optional[str] = None
+    docstring: Optional[str] = None
+    parent: Optional[str] = None
+
+
+@dataclass
+class _LegacyEdge:
+    source: str
+    target: str
+    type: str
+
+
+def build_legacy(repo) -> Dict[str, Any]:
+    symbols = {}
+    file_symbols = defaultdict(list)
+    edges = []
+    adjacency = [defaultdict(list) for _ in range(5)]
+    out_edges, in_edges, out_by_name, in_by_name, file_edges = adjacency
+    for file_symbols_data, file_edges_data in repo:
+        for data in file_symbols_data:
+            symbol = _LegacySymbol(*data)
+            key = f"{symbol.file}::{symbol.name}"
+            symbols[key] = symbol
+            file_symbols[symbol.file].append(key)
+        for data in file_edges_data:
+            edge = _LegacyEdge(*data)
+            edges.append(edge)
+            file_edges[edge.source.split("::", 1)[0]].append(edge)
+            out_edges[edge.source].append(edge)
+            in_edges[edge.target].append(edge)
+            out_by_name[symbol_name_of(edge.source)].append(edge)
+            in_by_name[symbol_name_of(edge.target)].append(edge)
+    return {"symbols": symbols, "file_symbols": file_symbols, "edges": edges, "adjacency": adjacency}
+
+
+def build_compact(repo) -> CodeGraph:
+    graph = CodeGraph()
+    for file_symbols_data, file_edges_data in repo:
+        for data in file_symbols_data:
+            graph.add_symbol(CodeSymbol(*data))
+        for data in file_edges_data:
+            graph.link(*data)
+    return graph
+
+
+def measure(build: Callable[[Any], Any], symbol_count: int) -> Tuple[int, Any]:
+    """构建并返回 (新分配的内存字节数, 构建结果)"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = build(synthetic_repo(symbol_count))
+        gc.collect()
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return size, result
+
+
+def run(symbol_count: int = 100_000) -> Dict[str, Any]:
+    """运行基准，返回两种存储方式的内存占用"""
+    legacy_bytes, legacy = measure(build_legacy, symbol_count)
+    stats = {"symbols": len(legacy["symbols"]), "edges": len(legacy["edges"])}
+    del legacy
+
+    compact_bytes, graph = measure(build_compact, symbol_count)
+    assert len(graph.symbols) == stats["symbols"] and len(graph.edges) == stats["edges"]
+
+    return {
+        **stats,
+        "legacy_bytes": legacy_bytes,
+        "compact_bytes": compact_bytes,
+        "saved_ratio": round(1 - compact_bytes / legacy_bytes, 4) if legacy_bytes else 0.0,
+    }
+
+
+# ===== 性能基准套件 =====
+
+# 结果格式版本，格式变化时递增（不同版本的结果不做对比）
+SUITE_VERSION = 1
+
+
+@dataclass
+class SuiteParams:
+    """合成仓库与计时参数"""
+    files: int = 200          # 文件数
+    classes: int = 2          # 每个文件的类数
+    methods: int = 4          # 每个类的方法数
+    functions: int = 4        # 每个文件的顶层函数数
+    fanout: int = 3           # 每个函数/方法调用的其他函数数
+    queries: int = 50         # 每项查询计时使用的查询数
+    repeat: int = 3           # 每项计时重复次数（取最小值）
+    seed: int = 0
+
+
+def write_workspace(root: Path, params: SuiteParams) -> int:
+    """
+    在 root 下生成合成仓库，返回写入的文件数
+
+    文件分布在 10 个包中；每个文件导入前一个模块，类继承公共基类，
+    函数/方法按 fanout 随机调用其他文件中的顶层函数
+    """
+    rng = random.Random(params.seed)
+    functions = max(1, params.functions)
+    for f in range(params.files):
+        package = root / f"pkg{f % 10}"
+        package.mkdir(parents=True, exist_ok=True)
+        lines = [f"from pkg{(f - 1) % 10}.mod_{(f - 1) % params.files} import func_{(f - 1) % params.files}_0", ""]
+
+        def body(indent: str) -> List[str]:
+            calls = [
+                f"{indent}func_{rng.randrange(params.files)}_{rng.randrange(functions)}(value)"
+                for _ in range(params.fanout)
+            ]
+            return calls or [f"{indent}pass"]
+
+        for c in range(params.classes):
+            lines += [f"class Service{f}_{c}(BaseService):", f'    """第 {f} 个模块的服务 {c}，处理请求与缓存"""', ""]
+            for m in range(params.methods):
+                lines += [f"    def handle_{m}(self, value: int) -> int:", f'        """处理第 {m} 类请求"""']
+                lines += body("        ") + ["        return value", ""]
+        for i in range(functions):
+            lines += [f"def func_{f}_{i}(value: int) -> int:", f'    """模块 {f} 的辅助函数 {i}"""']
+            lines += body("    ") + ["    return value", ""]
+        (package / f"mod_{f}.py").write_text("\n".join(lines), encoding="utf-8")
+    return params.files
+
+
+def _best_of(repeat: int, fn: Callable[[], Any], setup: Optional[Callable[[], Any]] = None) -> float:
+    """重复执行 fn，返回最短耗时（秒）"""
+    best = float("inf")
+    for _ in range(max(1, repeat)):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _max_rss_bytes() -> Optional[int]:
+    try:
+        import resource
+    except ImportError:   # Windows
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def run_suite(params: Optional[SuiteParams] = None, workspace: Optional[str] = None) -> Dict[str, Any]:
+    """
+    运行基准套件
+
+    Args:
+        params: 合成仓库与计时参数
+        workspace: 合成仓库目录（默认使用临时目录，运行后删除）
+
+    Returns:
+        JSON 可序列化的结果；timings 中索引/保存/加载为单次耗时，查询为平均每次耗时（秒）
+    """
+    from .indexer import CodeIndexer
+    from .searcher import CodeSearcher
+
+    params = params or SuiteParams()
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(workspace or os.path.join(tmp, "repo"))
+        write_workspace(root, params)
+        timings: Dict[str, float] = {}
+
+        # 索引：全量耗时取多次最小值，峰值内存单独测量（tracemalloc 本身会拖慢执行）
+        indexer = CodeIndexer(str(root))
+        timings["index"] = _best_of(params.repeat, lambda: indexer.index())
+        timings["index_incremental"] = _best_of(params.repeat, lambda: indexer.index(incremental=True))
+        gc.collect()
+        tracemalloc.start()
+        try:
+            graph = CodeIndexer(str(root)).index()
+            _, index_peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        searcher = CodeSearcher(graph)
+        rng = random.Random(params.seed)
+        names = sorted({s.name for s in graph.symbols.values()})
+        queries = rng.sample(names, min(params.queries, len(names))) if names else []
+        n = max(1, len(queries))
+
+        def per_query(fn: Callable[[str], Any], setup: Optional[Callable[[], Any]] = None) -> float:
+            return _best_of(params.repeat, lambda: [fn(q) for q in queries], setup) / n
+
+        # 首次查询包含派生索引的构建
+        timings["search_symbol_first"] = _best_of(1, lambda: searcher.search_symbol(queries[0] if queries else ""))
+        timings["search_symbol"] = per_query(searcher.search_symbol)
+        timings["search_symbol_prefix"] = per_query(lambda q: searcher.search_symbol(q[:3]))
+        timings["semantic_search_first"] = _best_of(1, lambda: searcher.semantic_search("处理请求 缓存"))
+        timings["semantic_search"] = per_query(lambda q: searcher.semantic_search(f"{q} 请求"))
+        timings["find_callers"] = per_query(graph.find_callers)
+        timings["get_call_graph"] = per_query(
+            searcher.get_call_graph, setup=lambda: graph.drop_derived("call_graph")
+        )
+        timings["get_call_graph_cached"] = per_query(searcher.get_call_graph)
+
+        path = os.path.join(tmp, "graph.db")
+        timings["save"] = _best_of(params.repeat, lambda: graph.save(path))
+        timings["load"] = _best_of(params.repeat, lambda: CodeGraph.load(path))
+
+        return {
+            "version": SUITE_VERSION,
+            "params": asdict(params),
+            "environment": {
+                "python": platform.python_version(),
+                "implementation": platform.python_implementation(),
+                "platform": platform.platform(),
+                "cpus": os.cpu_count(),
+            },
+            "stats": {
+                "files": len(graph.file_symbols),
+                "symbols": len(graph.symbols),
+                "edges": len(graph.edges),
+            },
+            "timings": {name: round(value, 9) for name, value in timings.items()},
+            "memory": {
+                "index_peak_bytes": index_peak,
+                "graph_bytes": sum(graph.memory_usage().values()),
+                "max_rss_bytes": _max_rss_bytes(),
+            },
+        }
+
+
+def compare(result: Dict[str, Any], baseline: Dict[str, Any], tolerance: float = 0.2) -> Dict[str, Any]:
+    """
+    与基线对比
+
+    Args:
+        result: run_suite() 的结果
+        baseline: 作为基线的历史结果
+        tolerance: 允许的相对增长（0.2 表示比基线慢/大 20% 以内不算退化）
+
+    Returns:
+        {"comparable": 参数与格式是否一致, "regressions": [指标名], "metrics": {指标名: {...}}}
+    """
+    comparable = (
+        result.get("version") == baseline.get("version") and
+        result.get("params") == baseline.get("params")
+    )
+    metrics: Dict[str, Dict[str, Any]] = {}
+    for section in ("timings", "memory"):
+        for name, current in result.get(section, {}).items():
+            base = baseline.get(section, {}).get(name)
+            if not current or not base:
+                continue
+            ratio = current / base
+            metrics[f"{section}.{name}"] = {
+                "baseline": base,
+                "current": current,
+                "ratio": round(ratio, 4),
+                "regressed": ratio > 1 + tolerance,
+            }
+    return {
+        "comparable": comparable,
+        "tolerance": tolerance,
+        "regressions": [name for name, m in metrics.items() if m["regressed"]] if comparable else [],
+        "metrics": metrics,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="代码索引基准")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    memory = commands.add_parser("memory", help="对比紧凑存储与原存储方式的内存占用")
+    memory.add_argument("--symbols", type=int, default=100_000, help="合成仓库的符号数量")
+
+    suite = commands.add_parser("suite", help="计时索引/查询/保存/加载并记录峰值内存")
+    defaults = SuiteParams()
+    for name, value in asdict(defaults).items():
+        suite.add_argument(f"--{name}", type=int, default=value)
+    suite.add_argument("--workspace", help="合成仓库目录（默认临时目录）")
+    suite.add_argument("--output", help="结果 JSON 文件（默认输出到标准输出）")
+    suite.add_argument("--baseline", help="基线结果 JSON 文件，存在退化时返回码为 1")
+    suite.add_argument("--tolerance", type=float, default=0.2, help="允许的相对增长")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "memory":
+        result = run(args.symbols)
+        mb = 1024 * 1024
+        print(f"符号数: {result['symbols']}, 依赖边数: {result['edges']}")
+        print(f"原存储: {result['legacy_bytes'] / mb:.1f} MB")
+        print(f"紧凑存储: {result['compact_bytes'] / mb:.1f} MB")
+        print(f"节省: {result['saved_ratio']:.1%}")
+        return 0
+
+    params = SuiteParams(**{name: getattr(args, name) for name in asdict(defaults)})
+    result = run_suite(params, args.workspace)
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            result["comparison"] = compare(result, json.load(f), args.tolerance)
+
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    comparison = result.get("comparison")
+    if comparison:
+        if not comparison["comparable"]:
+            print("基线的参数或格式与本次运行不一致，未做对比", file=sys.stderr)
+        for name in comparison["regressions"]:
+            m = comparison["metrics"][name]
+            print(f"性能退化 {name}: {m['baseline']} -> {m['current']} (x{m['ratio']})", file=sys.stderr)
+        return 1 if comparison["regressions"] else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
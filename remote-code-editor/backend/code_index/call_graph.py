@@ -0,0 +1,146 @@
+"""
+调用图引擎
+基于索引时解析出的调用目标计算有深度限制的调用树，按 (符号, 剩余深度) 缓存子树，
+同一批次或后续请求中重叠的子图只计算一次
+"""
+from typing import Any, Dict, FrozenSet, Iterable, List, Set, Tuple
+
+from .code_graph import CodeGraph, CodeSymbol
+from .resolver import CallResolver
+
+
+# 子树缓存条目: (子树, 子树中出现的符号键)
+_Subtree = Tuple[Dict[str, Any], FrozenSet[str]]
+
+
+class CallGraphIndex:
+    """
+    调用图缓存
+
+    挂在 CodeGraph 上作为派生索引。每个调用沿最可信的候选目标展开；
+    调用链上已出现的符号（递归）标记为 cycle 且不再展开。
+
+    不指向上层调用链的子树与所在位置无关，按 (符号键, 剩余深度) 缓存，
+    复用时只需确认当前调用链不经过子树中的任何符号。
+    符号增删或调用目标重新解析后缓存整体失效
+    """
+
+    def __init__(self, graph: CodeGraph):
+        self.graph = graph
+        self._cache: Dict[Tuple[str, int], _Subtree] = {}
+        self._resolver_version = -1
+        self.hits = 0
+        self.misses = 0
+
+    # ===== 增量维护 =====
+
+    def symbol_added(self, key: str, symbol: CodeSymbol):
+        """符号添加通知"""
+        self._cache.clear()
+
+    def symbol_removed(self, key: str, symbol: CodeSymbol):
+        """符号移除通知"""
+        self._cache.clear()
+
+    def _resolver(self) -> CallResolver:
+        resolver = self.graph.derived_index("calls", CallResolver)
+        if resolver.version != self._resolver_version:
+            self._cache.clear()
+            self._resolver_version = resolver.version
+        return resolver
+
+    # ===== 查询 =====
+
+    def tree(self, name: str, keys: List[str], depth: int) -> Dict[str, Any]:
+        """
+        调用树
+
+        Args:
+            name: 根节点显示的名称
+            keys: 根对应的符号键（同名的多个定义合并展开）
+            depth: 深度（根的直接调用为第 1 层，展开到第 depth + 1 层）
+        """
+        resolver = self._resolver()
+        path = set(keys)
+        calls: List[Dict[str, Any]] = []
+        seen: Set[str] = set()
+        for key in keys:
+            for child in self._expand(resolver, key, depth, path)[0]:
+                target = child.get("key", child["name"])
+                if target not in seen:
+                    seen.add(target)
+                    calls.append(child)
+        return {"name": name, "calls": calls}
+
+    def trees(self, roots: Iterable[Tuple[str, List[str]]], depth: int) -> Dict[str, Dict[str, Any]]:
+        """批量计算调用树（共享子树缓存）：[(名称, 符号键)] -> {名称: 调用树}"""
+        return {name: self.tree(name, keys, depth) for name, keys in roots}
+
+    def reachable(self, key: str, depth: int) -> FrozenSet[str]:
+        """depth + 1 层调用内可达的符号键（含自身）"""
+        return self._subtree(self._resolver(), key, depth, set())[1]
+
+    def _subtree(
+        self,
+        resolver: CallResolver,
+        key: str,
+        depth: int,
+        path: Set[str]
+    ) -> Tuple[Dict[str, Any], FrozenSet[str], Set[str]]:
+        """
+        以 key 为根、剩余 depth 层的子树
+
+        Returns:
+            (子树, 子树中出现的符号键, 子树中递归标记指向的上层调用链符号)
+        """
+        cached = self._cache.get((key, depth))
+        if cached is not None and cached[1].isdisjoint(path):
+            self.hits += 1
+            return cached[0], cached[1], set()
+        self.misses += 1
+
+        node = {"name": self.graph.symbols[key].name, "key": key, "calls": []}
+        keys: Set[str] = {key}
+        above: Set[str] = set()
+        if depth >= 0:
+            path.add(key)
+            try:
+                node["calls"], child_keys, above = self._expand(resolver, key, depth, path)
+            finally:
+                path.discard(key)
+            keys |= child_keys
+            above.discard(key)
+
+        frozen = frozenset(keys)
+        if not above:
+            self._cache[(key, depth)] = (node, frozen)
+        return node, frozen, above
+
+    def _expand(
+        self,
+        resolver: CallResolver,
+        key: str,
+        depth: int,
+        path: Set[str]
+    ) -> Tuple[List[Dict[str, Any]], Set[str], Set[str]]:
+        """展开 key 的直接调用（key 已在调用链 path 中）"""
+        calls: List[Dict[str, Any]] = []
+        keys: Set[str] = set()
+        above: Set[str] = set()
+        for callee, candidates in resolver.callees(key):
+            if not candidates:
+                calls.append({"name": callee, "calls": []})
+                continue
+            target = candidates[0]
+            if target in path:
+                calls.append({
+                    "name": self.graph.symbols[target].name, "key": target, "cycle": True, "calls": []
+                })
+                keys.add(target)
+                above.add(target)
+                continue
+            child, child_keys, child_above = self._subtree(resolver, target, depth - 1, path)
+            calls.append(child)
+            keys |= child_keys
+            above |= child_above
+        return calls, keys, above
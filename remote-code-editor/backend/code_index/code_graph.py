@@ -3,58 +3,631 @@
 存储代码的结构化信息和依赖关系
 """
 import os
-import ast
+import sys
 import json
-from typing import Dict, Any, List, Optional, Set
-from dataclasses import dataclass, field
-from pathlib import Path
+import itertools
+import threading
+from array import array
+from typing import Dict, Any, Callable, Iterable, Iterator, List, Mapping, Optional, Set
+from dataclasses import dataclass
 from collections import defaultdict
 
 
-@dataclass
 class CodeSymbol:
-    """代码符号"""
-    name: str
-    type: str  # function, class, method, variable, import
-    file: str
-    line: int
-    end_line: int
-    signature: Optional[str] = None
-    docstring: Optional[str] = None
-    parent: Optional[str] = None  # 父类或所属模块
-
-
-@dataclass 
+    """
+    代码符号
+
+    大量实例常驻内存，用 __slots__ 省去每个实例的 __dict__
+    （dataclass 的 slots 参数需要 Python 3.10，且带默认值的字段与手写 __slots__ 冲突，这里写成普通类）
+    """
+    __slots__ = ('name', 'type', 'file', 'line', 'end_line', 'signature', 'docstring', 'parent')
+
+    def __init__(
+        self,
+        name: str,
+        type: str,  # function, class, method, variable, import
+        file: str,
+        line: int,
+        end_line: int,
+        signature: Optional[str] = None,
+        docstring: Optional[str] = None,
+        parent: Optional[str] = None  # 父类或所属模块
+    ):
+        self.name = name
+        self.type = type
+        self.file = file
+        self.line = line
+        self.end_line = end_line
+        self.signature = signature
+        self.docstring = docstring
+        self.parent = parent
+
+    def _astuple(self) -> tuple:
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __eq__(self, other) -> bool:
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return self._astuple() == other._astuple()
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"CodeSymbol({fields})"
+
+
+@dataclass
 class CodeEdge:
     """代码依赖边"""
+    __slots__ = ('source', 'target', 'type')
     source: str  # 源符号
     target: str  # 目标符号
     type: str    # calls, imports, inherits, uses
 
 
+def symbol_name_of(key: str) -> str:
+    """从符号键（file::name 或 *::name）中取出符号名"""
+    return key.split("::", 1)[-1]
+
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    return sys.intern(value) if value is not None else None
+
+
+def _pack_strings(values: Iterable[str]) -> bytes:
+    """字符串序列编码为 NUL 结尾的 UTF-8 字节串"""
+    return "".join(f"{v}\0" for v in values).encode("utf-8")
+
+
+def _unpack_strings(data: bytes) -> List[str]:
+    return data.decode("utf-8").split("\0")[:-1]
+
+
+# SQLite 数据库文件头
+SQLITE_HEADER = b"SQLite format 3\x00"
+
+# 边 ID 数组的类型码
+_ID_CODE = 'i'
+# 已删除边的类型编号
+_DEAD = -1
+
+# 图的代数（所有图共用，保证不同图、不同时刻的值都不同）
+_generations = itertools.count(1)
+
+
+class _EdgeMap(Mapping):
+    """
+    邻接表的只读视图：键 -> 边对象列表（边对象按需生成）
+
+    column 为空时键直接对应 index 中的键（符号名、文件）；
+    否则键为完整符号键，从其符号名的边中按 column（源/目标列）上的符号键 ID 过滤
+    """
+
+    def __init__(self, graph: 'CodeGraph', index: Dict[str, array], column: Optional[array] = None):
+        self._graph = graph
+        self._index = index
+        self._column = column
+
+    def _lookup(self, key: str) -> Optional[array]:
+        if self._column is None:
+            return self._index.get(key)
+        return self._graph._filter_by_key(self._index, self._column, key)
+
+    def __getitem__(self, key: str) -> List[CodeEdge]:
+        ids = self._lookup(key)
+        if not ids:
+            raise KeyError(key)
+        return self._graph._materialize(ids)
+
+    def __contains__(self, key) -> bool:
+        return bool(self._lookup(key))
+
+    def _keys(self) -> List[str]:
+        if self._column is None:
+            return list(self._index)
+        graph = self._graph
+        key_ids = {}
+        for ids in self._index.values():
+            for eid in ids:
+                key_ids.setdefault(self._column[eid], eid)
+        return [graph._keys[k] for k, _ in sorted(key_ids.items(), key=lambda item: item[1])]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._keys())
+
+    def __len__(self) -> int:
+        return len(self._index) if self._column is None else len(self._keys())
+
+
+class _EdgeList:
+    """全部依赖边的只读视图（按添加顺序）"""
+
+    def __init__(self, graph: 'CodeGraph'):
+        self._graph = graph
+
+    def __len__(self) -> int:
+        return self._graph._edge_count
+
+    def __iter__(self) -> Iterator[CodeEdge]:
+        graph = self._graph
+        types = graph._edge_type
+        for eid in range(len(types)):
+            if types[eid] != _DEAD:
+                yield graph._edge(eid)
+
+    def __getitem__(self, index):
+        return list(self)[index]
+
+    def __eq__(self, other) -> bool:
+        return list(self) == list(other)
+
+    def __repr__(self) -> str:
+        return repr(list(self))
+
+
 class CodeGraph:
     """
     代码图
     
     存储项目中所有代码符号及其关系
     支持快速查询和导航
+    
+    存储采用紧凑表示：符号为 __slots__ 记录，名称/文件/类型等字符串驻留（intern）共享；
+    符号键编号为整数，依赖边按列存放在 array 中（源 ID、目标 ID、类型编号），
+    邻接表只保存边 ID。edges / out_edges / in_edges 等属性是按需生成 CodeEdge 的视图，
+    对外接口保持不变
+    
+    依赖边按源/目标的符号名维护邻接表（完整符号键的查询在同名边中按 ID 过滤），
+    调用者/被调用者/引用查询的开销只与结果规模相关
+    
+    搜索等派生索引通过 derived_index() 挂在图上，并在符号增删时收到通知：
+    listener.symbol_added(key, symbol) / listener.symbol_removed(key, symbol)
     """
     
-    def __init__(self):
+    # 已删除的边超过该数量且多于存活边时压缩边存储
+    COMPACT_MIN_DEAD = 4096
+    
+    def __init__(self, lock: Optional[threading.RLock] = None):
+        """
+        Args:
+            lock: 保护图读写的锁；由索引器传入它的写锁，文件监听线程原地更新时读操作与之互斥
+        """
+        self.lock = lock if lock is not None else threading.RLock()
         self.symbols: Dict[str, CodeSymbol] = {}
-        self.edges: List[CodeEdge] = []
         self.file_symbols: Dict[str, List[str]] = defaultdict(list)
         self.imports_map: Dict[str, Set[str]] = defaultdict(set)
+        # 符号键 <-> 整数 ID（包括未解析的 *::name 目标）
+        self._key_ids: Dict[str, int] = {}
+        self._keys: List[str] = []
+        # 边类型 <-> 类型编号
+        self._type_ids: Dict[str, int] = {}
+        self._types: List[str] = []
+        # 边的列存储，下标即边 ID
+        self._edge_source = array(_ID_CODE)
+        self._edge_target = array(_ID_CODE)
+        self._edge_type = array('b')
+        self._edge_count = 0
+        # 邻接表：源符号名 / 目标符号名 / 源文件 -> 边 ID
+        self._out_by_name: Dict[str, array] = {}
+        self._in_by_name: Dict[str, array] = {}
+        self._file_edges: Dict[str, array] = {}
+        # 限定名最后一段 -> 限定名（Class.method）及其符号数，用于按方法名查询发出的边
+        self._qualified_names: Dict[str, Dict[str, int]] = defaultdict(dict)
+        # 派生索引（名称 -> 索引对象），同时作为符号变更监听者
+        self._derived: Dict[str, Any] = {}
+        # 符号每次增删时取进程内递增的新值（不同的图也不会重复，可用作大纲等响应的 ETag）
+        self.generation = next(_generations)
+    
+    # ===== 边存储视图 =====
+    
+    @property
+    def edges(self) -> _EdgeList:
+        """所有依赖边"""
+        return _EdgeList(self)
+    
+    @property
+    def out_edges(self) -> Mapping[str, List[CodeEdge]]:
+        """完整符号键 -> 发出的边"""
+        return _EdgeMap(self, self._out_by_name, self._edge_source)
+    
+    @property
+    def in_edges(self) -> Mapping[str, List[CodeEdge]]:
+        """完整符号键 -> 指向它的边"""
+        return _EdgeMap(self, self._in_by_name, self._edge_target)
+    
+    @property
+    def out_edges_by_name(self) -> Mapping[str, List[CodeEdge]]:
+        """符号名 -> 发出的边"""
+        return _EdgeMap(self, self._out_by_name)
+    
+    @property
+    def in_edges_by_name(self) -> Mapping[str, List[CodeEdge]]:
+        """符号名 -> 指向它的边"""
+        return _EdgeMap(self, self._in_by_name)
+    
+    @property
+    def file_edges(self) -> Mapping[str, List[CodeEdge]]:
+        """文件 -> 源自该文件的边"""
+        return _EdgeMap(self, self._file_edges)
+    
+    def _edge(self, eid: int) -> CodeEdge:
+        keys = self._keys
+        return CodeEdge(
+            keys[self._edge_source[eid]],
+            keys[self._edge_target[eid]],
+            self._types[self._edge_type[eid]]
+        )
+    
+    def _materialize(self, ids: array) -> List[CodeEdge]:
+        return [self._edge(eid) for eid in ids]
+    
+    def _key_id(self, key: str) -> int:
+        kid = self._key_ids.get(key)
+        if kid is None:
+            key = sys.intern(key)
+            kid = self._key_ids[key] = len(self._keys)
+            self._keys.append(key)
+        return kid
+    
+    def _filter_by_key(self, index: Dict[str, array], column: array, key: str) -> Optional[array]:
+        """完整符号键的边：取同名符号的边，再按列上的符号键 ID 过滤"""
+        kid = self._key_ids.get(key)
+        ids = index.get(symbol_name_of(key)) if kid is not None else None
+        if not ids:
+            return None
+        return array(_ID_CODE, (eid for eid in ids if column[eid] == kid))
+    
+    def memory_usage(self) -> Dict[str, int]:
+        """边存储各部分占用的字节数（不含符号对象）"""
+        with self.lock:
+            return self._memory_usage()
+    
+    def _memory_usage(self) -> Dict[str, int]:
+        adjacency = self._adjacency().values()
+        return {
+            "edge_columns": sum(
+                sys.getsizeof(column)
+                for column in (self._edge_source, self._edge_target, self._edge_type)
+            ),
+            "adjacency": sum(
+                sys.getsizeof(index) + sum(sys.getsizeof(ids) for ids in index.values())
+                for index in adjacency
+            ),
+            "key_table": sys.getsizeof(self._keys) + sys.getsizeof(self._key_ids),
+        }
+    
+    # ===== 修改 =====
     
     def add_symbol(self, symbol: CodeSymbol):
         """添加符号"""
-        key = f"{symbol.file}::{symbol.name}"
+        symbol.name = sys.intern(symbol.name)
+        symbol.type = sys.intern(symbol.type)
+        symbol.file = sys.intern(symbol.file)
+        symbol.parent = _intern(symbol.parent)
+        key = self._keys[self._key_id(f"{symbol.file}::{symbol.name}")]
+        old = self.symbols.get(key)
         self.symbols[key] = symbol
         self.file_symbols[symbol.file].append(key)
+        if old is None and "." in symbol.name:
+            names = self._qualified_names[symbol.name.rsplit(".", 1)[1]]
+            names[symbol.name] = names.get(symbol.name, 0) + 1
+        self.generation = next(_generations)
+        for listener in self._derived.values():
+            if old is not None:
+                listener.symbol_removed(key, old)
+            listener.symbol_added(key, symbol)
+    
+    def derived_index(self, name: str, factory: Callable[['CodeGraph'], Any]) -> Any:
+        """
+        获取派生索引，不存在时用 factory(graph) 构建
+        
+        派生索引随图一起缓存，并通过 symbol_added/symbol_removed 增量更新
+        """
+        index = self._derived.get(name)
+        if index is None:
+            index = factory(self)
+            self._derived[name] = index
+        return index
+    
+    def peek_derived(self, name: str) -> Optional[Any]:
+        """获取已构建的派生索引（不存在时返回 None）"""
+        return self._derived.get(name)
+    
+    def derived_names(self) -> List[str]:
+        """已构建的派生索引名称"""
+        return list(self._derived)
+    
+    def drop_derived(self, name: str) -> Optional[Any]:
+        """移除派生索引（下次 derived_index() 时重新构建），返回被移除的索引"""
+        return self._derived.pop(name, None)
     
     def add_edge(self, edge: CodeEdge):
         """添加依赖边"""
-        self.edges.append(edge)
+        self.link(edge.source, edge.target, edge.type)
+    
+    def link(self, source: str, target: str, type: str):
+        """添加依赖边（不创建 CodeEdge 对象）"""
+        type_id = self._type_ids.get(type)
+        if type_id is None:
+            type_id = self._type_ids[sys.intern(type)] = len(self._types)
+            self._types.append(type)
+        source_id = self._key_id(source)
+        target_id = self._key_id(target)
+        source = self._keys[source_id]
+        target = self._keys[target_id]
+        
+        eid = len(self._edge_type)
+        self._edge_source.append(source_id)
+        self._edge_target.append(target_id)
+        self._edge_type.append(type_id)
+        self._edge_count += 1
+        
+        self._append(self._file_edges, sys.intern(source.split("::", 1)[0]), eid)
+        self._append(self._out_by_name, sys.intern(symbol_name_of(source)), eid)
+        self._append(self._in_by_name, sys.intern(symbol_name_of(target)), eid)
+    
+    def link_many(self, edges: Iterable[tuple]):
+        """
+        批量添加依赖边 (source, target, type)（加载存储时使用）
+
+        与逐条 link() 结果相同；同一符号键的拆分和驻留只做一次
+        """
+        key_ids, keys = self._key_ids, self._keys
+        type_ids = self._type_ids
+        sources, targets, types = self._edge_source, self._edge_target, self._edge_type
+        file_edges, out_by_name, in_by_name = self._file_edges, self._out_by_name, self._in_by_name
+        # 符号键 ID -> (文件的边 ID 数组, 符号名的出边/入边 ID 数组)
+        source_slots: Dict[int, tuple] = {}
+        target_slots: Dict[int, array] = {}
+        intern = sys.intern
+
+        def slot(index: Dict[str, array], name: str) -> array:
+            ids = index.get(name)
+            if ids is None:
+                ids = index[intern(name)] = array(_ID_CODE)
+            return ids
+
+        def key_id(key: str) -> int:
+            kid = key_ids.get(key)
+            if kid is None:
+                key = intern(key)
+                kid = key_ids[key] = len(keys)
+                keys.append(key)
+            return kid
+
+        start = eid = len(types)
+        for source, target, type in edges:
+            type_id = type_ids.get(type)
+            if type_id is None:
+                type_id = type_ids[intern(type)] = len(self._types)
+                self._types.append(type)
+            source_id = key_id(source)
+            target_id = key_id(target)
+            sources.append(source_id)
+            targets.append(target_id)
+            types.append(type_id)
+
+            out = source_slots.get(source_id)
+            if out is None:
+                out = source_slots[source_id] = (
+                    slot(file_edges, source.split("::", 1)[0]),
+                    slot(out_by_name, symbol_name_of(source)),
+                )
+            out[0].append(eid)
+            out[1].append(eid)
+
+            incoming = target_slots.get(target_id)
+            if incoming is None:
+                incoming = target_slots[target_id] = slot(in_by_name, symbol_name_of(target))
+            incoming.append(eid)
+            eid += 1
+
+        self._edge_count += eid - start
+
+    @staticmethod
+    def _append(index: Dict[str, array], key: str, eid: int):
+        ids = index.get(key)
+        if ids is None:
+            ids = index[key] = array(_ID_CODE)
+        ids.append(eid)
+    
+    def remove_file(self, file: str):
+        """移除文件的所有符号、依赖边和导入（文件变更或删除时调用）"""
+        self.generation = next(_generations)
+        for key in self.file_symbols.pop(file, []):
+            symbol = self.symbols.pop(key, None)
+            if symbol is not None:
+                self._forget_qualified_name(symbol.name)
+                for listener in self._derived.values():
+                    listener.symbol_removed(key, symbol)
+        
+        stale = self._file_edges.pop(file, None)
+        if stale:
+            stale_ids = set(stale)
+            keys = self._keys
+            self._unlink_edges(
+                self._out_by_name, {symbol_name_of(keys[self._edge_source[eid]]) for eid in stale}, stale_ids
+            )
+            self._unlink_edges(
+                self._in_by_name, {symbol_name_of(keys[self._edge_target[eid]]) for eid in stale}, stale_ids
+            )
+            for eid in stale:
+                self._edge_type[eid] = _DEAD
+            self._edge_count -= len(stale)
+            
+            dead = len(self._edge_type) - self._edge_count
+            if dead >= self.COMPACT_MIN_DEAD and dead > self._edge_count:
+                self._compact()
+        
+        self.imports_map.pop(file, None)
+    
+    def _forget_qualified_name(self, name: str):
+        if "." not in name:
+            return
+        tail = name.rsplit(".", 1)[1]
+        names = self._qualified_names.get(tail)
+        if not names or name not in names:
+            return
+        names[name] -= 1
+        if not names[name]:
+            del names[name]
+            if not names:
+                del self._qualified_names[tail]
+    
+    @staticmethod
+    def _unlink_edges(index: Dict[str, array], keys: Set[str], stale_ids: Set[int]):
+        """从邻接表中移除指定的边"""
+        for key in keys:
+            ids = index.get(key)
+            if ids is None:
+                continue
+            remaining = array(_ID_CODE, (eid for eid in ids if eid not in stale_ids))
+            if remaining:
+                index[key] = remaining
+            else:
+                del index[key]
+    
+    def _compact(self):
+        """丢弃已删除的边并重新编号，同时回收不再被引用的符号键"""
+        keys = self._keys
+        edges = [
+            (keys[self._edge_source[eid]], keys[self._edge_target[eid]], self._types[t])
+            for eid, t in enumerate(self._edge_type) if t != _DEAD
+        ]
+        
+        self._key_ids = {}
+        self._keys = []
+        self._edge_source = array(_ID_CODE)
+        self._edge_target = array(_ID_CODE)
+        self._edge_type = array('b')
+        self._edge_count = 0
+        for index in (self._out_by_name, self._in_by_name, self._file_edges):
+            index.clear()
+        
+        for key in self.symbols:
+            self._key_id(key)
+        self.link_many(edges)
+    
+    # ===== 边存储快照 =====
+    
+    def _adjacency(self) -> Dict[str, Dict[str, array]]:
+        return {"out_by_name": self._out_by_name, "in_by_name": self._in_by_name, "file_edges": self._file_edges}
+    
+    def edge_snapshot(self) -> Dict[str, bytes]:
+        """
+        边存储（符号键表、边列、邻接表）的二进制快照
+        
+        加载时用 restore_edges() 直接恢复数组，无需逐条边重建邻接表
+        """
+        snapshot = {
+            "keys": _pack_strings(self._keys),
+            "types": _pack_strings(self._types),
+            "edge_source": self._edge_source.tobytes(),
+            "edge_target": self._edge_target.tobytes(),
+            "edge_type": self._edge_type.tobytes(),
+        }
+        for name, index in self._adjacency().items():
+            ids = array(_ID_CODE)
+            for part in index.values():
+                ids.extend(part)
+            snapshot[f"{name}.keys"] = _pack_strings(index)
+            snapshot[f"{name}.sizes"] = array(_ID_CODE, map(len, index.values())).tobytes()
+            snapshot[f"{name}.ids"] = ids.tobytes()
+        return snapshot
+    
+    def restore_edges(self, snapshot: Mapping[str, bytes]):
+        """
+        从 edge_snapshot() 的结果恢复边存储（须在添加符号之前调用）
+        
+        Raises:
+            KeyError, ValueError: 快照不完整或已损坏
+        """
+        intern = sys.intern
+        keys = [intern(k) for k in _unpack_strings(snapshot["keys"])]
+        types = [intern(t) for t in _unpack_strings(snapshot["types"])]
+        columns = []
+        for name, code in (("edge_source", _ID_CODE), ("edge_target", _ID_CODE), ("edge_type", 'b')):
+            column = array(code)
+            column.frombytes(snapshot[name])
+            columns.append(column)
+        if len(set(map(len, columns))) > 1:
+            raise ValueError("边列长度不一致")
+        
+        adjacency = {}
+        for name in self._adjacency():
+            names = _unpack_strings(snapshot[f"{name}.keys"])
+            sizes = array(_ID_CODE)
+            sizes.frombytes(snapshot[f"{name}.sizes"])
+            ids = array(_ID_CODE)
+            ids.frombytes(snapshot[f"{name}.ids"])
+            if len(names) != len(sizes) or sum(sizes) != len(ids):
+                raise ValueError(f"邻接表 {name} 已损坏")
+            index = {}
+            pos = 0
+            for key, size in zip(names, sizes):
+                index[intern(key)] = ids[pos:pos + size]
+                pos += size
+            adjacency[name] = index
+        
+        self._keys = keys
+        self._key_ids = dict(zip(keys, range(len(keys))))
+        self._types = types
+        self._type_ids = dict(zip(types, range(len(types))))
+        self._edge_source, self._edge_target, self._edge_type = columns
+        self._edge_count = len(self._edge_type) - self._edge_type.count(_DEAD)
+        self._out_by_name = adjacency["out_by_name"]
+        self._in_by_name = adjacency["in_by_name"]
+        self._file_edges = adjacency["file_edges"]
+    
+    # ===== 查询 =====
+    
+    def _outgoing_ids(self, symbol: str) -> Optional[array]:
+        """
+        某符号发出的边 ID，symbol 可以是符号名或完整符号键
+
+        邻接表按源的限定名（Class.method）记录，不带 . 的名称同时匹配最后一段与之相同的限定名
+        """
+        if "::" in symbol:
+            return self._filter_by_key(self._out_by_name, self._edge_source, symbol)
+        ids = self._out_by_name.get(symbol)
+        qualified = self._qualified_names.get(symbol) if "." not in symbol else None
+        if not qualified:
+            return ids
+        merged = array(_ID_CODE, ids or ())
+        for name in qualified:
+            merged.extend(self._out_by_name.get(name, ()))
+        return merged
+    
+    def _incoming_ids(self, symbol: str) -> Optional[array]:
+        """指向某符号的边 ID，symbol 可以是符号名或完整符号键"""
+        if "::" in symbol:
+            return self._filter_by_key(self._in_by_name, self._edge_target, symbol)
+        return self._in_by_name.get(symbol)
+    
+    def _outgoing(self, symbol: str) -> List[CodeEdge]:
+        """某符号发出的边"""
+        ids = self._outgoing_ids(symbol)
+        return self._materialize(ids) if ids else []
+    
+    def _incoming(self, symbol: str) -> List[CodeEdge]:
+        """指向某符号的边"""
+        ids = self._incoming_ids(symbol)
+        return self._materialize(ids) if ids else []
+    
+    def _endpoints(self, ids: Optional[array], column: array, type: str) -> List[str]:
+        """取指定类型的边在某一列（源或目标）上的符号键，不创建边对象"""
+        type_id = self._type_ids.get(type)
+        if not ids or type_id is None:
+            return []
+        keys = self._keys
+        types = self._edge_type
+        return [keys[column[eid]] for eid in ids if types[eid] == type_id]
+    
+    def get_file_edges(self, file: str) -> List[CodeEdge]:
+        """获取源自某文件的所有依赖边"""
+        ids = self._file_edges.get(file)
+        return self._materialize(ids) if ids else []
     
     def get_symbol(self, file: str, name: str) -> Optional[CodeSymbol]:
         """获取符号"""
@@ -68,106 +641,119 @@ class CodeGraph:
     
     def find_callers(self, symbol_name: str) -> List[str]:
         """查找调用某符号的所有位置"""
-        callers = []
-        for edge in self.edges:
-            if edge.target.endswith(f"::{symbol_name}") and edge.type == "calls":
-                callers.append(edge.source)
-        return callers
+        return self._endpoints(self._incoming_ids(symbol_name), self._edge_source, "calls")
     
     def find_callees(self, symbol_name: str) -> List[str]:
-        """查找某符号调用的所有符号"""
-        callees = []
-        for edge in self.edges:
-            if edge.source.endswith(f"::{symbol_name}") and edge.type == "calls":
-                callees.append(edge.target)
-        return callees
+        """查找某符号调用的所有符号（方法名不带类名时匹配所有同名方法）"""
+        return self._endpoints(self._outgoing_ids(symbol_name), self._edge_target, "calls")
     
     def find_references(self, symbol_name: str) -> List[Dict[str, Any]]:
         """查找符号的所有引用"""
         refs = []
-        for edge in self.edges:
-            if edge.target.endswith(f"::{symbol_name}"):
-                source_symbol = self.symbols.get(edge.source)
-                if source_symbol:
-                    refs.append({
-                        "file": source_symbol.file,
-                        "line": source_symbol.line,
-                        "type": edge.type
-                    })
+        for edge in self._incoming(symbol_name):
+            source_symbol = self.symbols.get(edge.source)
+            if source_symbol:
+                refs.append({
+                    "file": source_symbol.file,
+                    "line": source_symbol.line,
+                    "type": edge.type
+                })
         return refs
     
     def get_class_hierarchy(self, class_name: str) -> Dict[str, Any]:
         """获取类继承层次"""
-        hierarchy = {
+        return {
             "name": class_name,
-            "parents": [],
-            "children": []
+            "parents": [
+                symbol_name_of(e.target) for e in self._outgoing(class_name)
+                if e.type == "inherits"
+            ],
+            "children": [
+                symbol_name_of(e.source) for e in self._incoming(class_name)
+                if e.type == "inherits"
+            ]
         }
-        
-        for edge in self.edges:
-            if edge.type == "inherits":
-                if edge.source.endswith(f"::{class_name}"):
-                    hierarchy["parents"].append(edge.target.split("::")[-1])
-                if edge.target.endswith(f"::{class_name}"):
-                    hierarchy["children"].append(edge.source.split("::")[-1])
-        
-        return hierarchy
     
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典"""
-        return {
-            "symbols": {
-                k: {
-                    "name": v.name,
-                    "type": v.type,
-                    "file": v.file,
-                    "line": v.line,
-                    "signature": v.signature,
-                    "docstring": v.docstring
+        with self.lock:
+            return {
+                "symbols": {
+                    k: {
+                        "name": v.name,
+                        "type": v.type,
+                        "file": v.file,
+                        "line": v.line,
+                        "end_line": v.end_line,
+                        "signature": v.signature,
+                        "docstring": v.docstring,
+                        "parent": v.parent
+                    }
+                    for k, v in self.symbols.items()
+                },
+                "edges": [
+                    {"source": e.source, "target": e.target, "type": e.type}
+                    for e in self.edges
+                ],
+                "imports": {
+                    file: sorted(names) for file, names in self.imports_map.items() if names
+                },
+                "stats": {
+                    "total_symbols": len(self.symbols),
+                    "total_edges": len(self.edges),
+                    "files": len(self.file_symbols)
                 }
-                for k, v in self.symbols.items()
-            },
-            "edges": [
-                {"source": e.source, "target": e.target, "type": e.type}
-                for e in self.edges
-            ],
-            "stats": {
-                "total_symbols": len(self.symbols),
-                "total_edges": len(self.edges),
-                "files": len(self.file_symbols)
             }
-        }
     
     def save(self, path: str):
-        """保存到文件"""
-        with open(path, 'w', encoding='utf-8') as f:
-            json.dump(self.to_dict(), f, indent=2, ensure_ascii=False)
+        """
+        保存到文件
+        
+        使用 SQLite 格式（符号/依赖边/导入分表存放），先写临时文件再原子替换
+        """
+        from .index_store import IndexStore
+        
+        tmp_path = f"{path}.tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        IndexStore(tmp_path).save_graph(self)
+        os.replace(tmp_path, path)
     
     @classmethod
-    def load(cls, path: str) -> 'CodeGraph':
-        """从文件加载"""
-        graph = cls()
+    def load(cls, path: str, lazy_docstrings: bool = True) -> 'CodeGraph':
+        """
+        从文件加载
         
+        Args:
+            path: save() 保存的 SQLite 文件，也兼容旧版的 JSON 文件
+            lazy_docstrings: 文档字符串是否延迟到首次访问时再读取（仅 SQLite 格式）
+        """
+        from .index_store import IndexStore
+        
+        with open(path, 'rb') as f:
+            header = f.read(len(SQLITE_HEADER))
+        if header == SQLITE_HEADER:
+            return IndexStore(path).load_graph(lazy_docstrings=lazy_docstrings)
+        
+        graph = cls()
         with open(path, 'r', encoding='utf-8') as f:
             data = json.load(f)
         
-        for key, sym_data in data.get("symbols", {}).items():
-            graph.symbols[key] = CodeSymbol(
+        for sym_data in data.get("symbols", {}).values():
+            graph.add_symbol(CodeSymbol(
                 name=sym_data["name"],
                 type=sym_data["type"],
                 file=sym_data["file"],
                 line=sym_data["line"],
                 end_line=sym_data.get("end_line", sym_data["line"]),
                 signature=sym_data.get("signature"),
-                docstring=sym_data.get("docstring")
-            )
-            graph.file_symbols[sym_data["file"]].append(key)
-        
-        for edge_data in data.get("edges", []):
-            graph.edges.append(CodeEdge(
-                source=edge_data["source"],
-                target=edge_data["target"],
-                type=edge_data["type"]
+                docstring=sym_data.get("docstring"),
+                parent=sym_data.get("parent")
             ))
         
+        graph.link_many((e["source"], e["target"], e["type"]) for e in data.get("edges", []))
+        
+        for file, names in data.get("imports", {}).items():
+            graph.imports_map[sys.intern(file)].update(sys.intern(n) for n in names)
+        
         return graph
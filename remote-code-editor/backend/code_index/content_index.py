@@ -0,0 +1,492 @@
+"""
+工作区内容索引
+为工作区中的文本文件建立三元组（trigram）倒排索引：查询时先用字面量/正则中必须出现的
+三元组求交得到候选文件，再由调用方用正则逐个确认。
+索引持久化到 SQLite，重启后按 mtime/大小增量更新；文件监听器通过 update_paths() 保持索引实时
+"""
+import os
+import re
+import sqlite3
+import threading
+from array import array
+from pathlib import Path
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+try:
+    from re import _parser as sre_parse
+except ImportError:   # Python < 3.11
+    import sre_parse
+
+from .index_store import INDEX_DIR_NAME
+from .workspace_snapshot import get_snapshot
+
+
+# 内容索引数据库文件名
+CONTENT_DB_NAME = 'content.db'
+
+# 存储格式版本
+CONTENT_SCHEMA_VERSION = 1
+
+# 判断二进制文件时读取的字节数
+SNIFF_BYTES = 8192
+
+# 文件 ID 数组的类型码
+_ID_CODE = 'i'
+
+# 查询计划：若干备选，每个备选为必须同时出现的三元组集合；None 表示无法缩小范围
+QueryPlan = Optional[List[FrozenSet[bytes]]]
+
+# 正则展开出的备选数量上限（超过时放弃缩小范围）
+MAX_ALTERNATIVES = 32
+
+_REPEATS = tuple(
+    op for op in (
+        sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT, getattr(sre_parse, 'POSSESSIVE_REPEAT', None)
+    ) if op is not None
+)
+_ATOMIC_GROUP = getattr(sre_parse, 'ATOMIC_GROUP', None)
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    id INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    kind TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS postings (
+    trigram BLOB PRIMARY KEY,
+    ids BLOB NOT NULL
+);
+"""
+
+
+def is_binary(sample: bytes) -> bool:
+    """内容中含 NUL 字节视为二进制文件"""
+    return b"\0" in sample
+
+
+def trigrams(data: bytes) -> Set[bytes]:
+    """
+    内容的三元组集合（按字节、ASCII 字母转为小写）
+
+    在三个起始偏移上各按 3 字节切分，合起来覆盖全部位置（切分在 C 层完成）
+    """
+    data = data.lower()
+    grams: Set[bytes] = set()
+    for offset in range(3):
+        grams.update(re.findall(b"...", data[offset:], re.S))
+    return grams
+
+
+def _literal_trigrams(text: str, ignore_case: bool) -> Set[bytes]:
+    grams = trigrams(text.encode("utf-8"))
+    if ignore_case:
+        # 非 ASCII 字符的大小写变体编码不同，忽略大小写时不能要求它们出现
+        grams = {g for g in grams if max(g) < 0x80}
+    return grams
+
+
+def _required_literals(items) -> List[List[str]]:
+    """
+    正则语法树中必须出现的字面量：返回备选列表，每个备选为须同时出现的字面量
+
+    [[]] 表示没有约束
+    """
+    alternatives: List[List[str]] = [[]]
+    run: List[str] = []
+
+    def flush():
+        if run:
+            text = "".join(run)
+            run.clear()
+            for alt in alternatives:
+                alt.append(text)
+
+    for op, av in items:
+        if op is sre_parse.LITERAL:
+            run.append(chr(av))
+            continue
+        flush()
+        if op is sre_parse.SUBPATTERN:
+            sub = _required_literals(av[-1])
+        elif op in _REPEATS:
+            low, _, body = av
+            sub = _required_literals(body) if low >= 1 else [[]]
+        elif op is sre_parse.BRANCH:
+            sub = [alt for branch in av[1] for alt in _required_literals(branch)]
+            if any(not alt for alt in sub):
+                sub = [[]]
+        elif _ATOMIC_GROUP is not None and op is _ATOMIC_GROUP:
+            sub = _required_literals(av)
+        else:
+            continue   # 字符类、任意字符、锚点等不产生字面量
+        if sub != [[]]:
+            alternatives = [a + b for a in alternatives for b in sub]
+            if len(alternatives) > MAX_ALTERNATIVES:
+                return [[]]
+    flush()
+    return alternatives
+
+
+def query_plan(pattern: str, flags: int = 0) -> QueryPlan:
+    """
+    由正则表达式得到查询计划
+
+    Args:
+        pattern: 正则表达式（字面量查询先 re.escape）
+        flags: re 标志（IGNORECASE 等）
+    """
+    try:
+        parsed = sre_parse.parse(pattern, flags)
+    except (re.error, RecursionError, OverflowError):
+        return None
+    ignore_case = bool((flags | parsed.state.flags) & re.IGNORECASE)
+
+    plan = []
+    for alt in _required_literals(parsed.data):
+        grams: Set[bytes] = set()
+        for text in alt:
+            grams |= _literal_trigrams(text, ignore_case)
+        if not grams:
+            return None   # 某个备选不要求任何三元组，任何文件都可能匹配
+        plan.append(frozenset(grams))
+    return plan or None
+
+
+class ContentIndex:
+    """
+    工作区内容索引
+
+    文件编号后按三元组保存文件 ID 的倒排表（array）。文件变更时分配新 ID，
+    旧 ID 只从存活表中移除，查询时过滤；失效的 ID 多于存活文件时压缩倒排表。
+    超过 max_file_size 的文本文件不建索引，总是作为候选
+    """
+
+    # 失效的 ID 超过该数量且多于存活文件时压缩倒排表
+    COMPACT_MIN_DEAD = 1024
+
+    # 累计变更的文件数超过该值时写入持久化存储
+    SAVE_EVERY = 256
+
+    def __init__(
+        self,
+        workspace_path: str,
+        db_path: Optional[str] = None,
+        max_file_size: int = 16 * 1024 * 1024
+    ):
+        """
+        初始化内容索引
+
+        Args:
+            workspace_path: 工作区路径
+            db_path: SQLite 文件路径（None 表示只在内存中维护）
+            max_file_size: 建索引的最大文件大小（字节）
+        """
+        self.workspace = Path(workspace_path).resolve()
+        self.snapshot = get_snapshot(str(self.workspace))
+        self.db_path = Path(db_path) if db_path else None
+        self.max_file_size = max_file_size
+        self.lock = threading.RLock()
+
+        # 路径 -> (mtime_ns, 大小, 类型 text/large/binary)
+        self._files: Dict[str, Tuple[int, int, str]] = {}
+        # 已建索引的文件：路径 <-> 文件 ID
+        self._ids: Dict[str, int] = {}
+        self._paths: Dict[int, str] = {}
+        self._next_id = 0
+        self._dead = 0
+        self._postings: Dict[bytes, array] = {}
+        self._unsaved = 0
+
+        if self.db_path:
+            try:
+                self._load()
+            except (OSError, sqlite3.Error, ValueError) as e:
+                print(f"加载内容索引失败 {self.db_path}: {e}")
+                self._reset()
+
+    @classmethod
+    def for_workspace(cls, workspace_path: str, **kwargs) -> 'ContentIndex':
+        """使用工作区默认位置持久化的内容索引"""
+        db_path = Path(workspace_path).resolve() / INDEX_DIR_NAME / CONTENT_DB_NAME
+        return cls(workspace_path, db_path=str(db_path), **kwargs)
+
+    # ===== 构建与增量更新 =====
+
+    def index(self, incremental: bool = True) -> 'ContentIndex':
+        """
+        扫描工作区：按 mtime/大小找出变化的文件重新建索引，并移除已删除的文件
+
+        Args:
+            incremental: False 时丢弃已有索引全部重建
+        """
+        with self.lock:
+            if not incremental:
+                self._reset()
+            seen: Set[str] = set()
+            for path in self._iter_files(self.workspace):
+                rel_path = self._rel_path(path)
+                seen.add(rel_path)
+                self._update_file(path, rel_path)
+            for rel_path in [p for p in self._files if p not in seen]:
+                self._remove(rel_path)
+            self._maybe_save(force=True)
+        return self
+
+    def update_paths(self, paths: Iterable[str]) -> 'ContentIndex':
+        """
+        按路径增量更新（供文件监听器调用）
+
+        Args:
+            paths: 变更的文件或目录（绝对路径或相对工作区的路径），不存在的视为已删除
+        """
+        with self.lock:
+            for raw_path in paths:
+                path = Path(raw_path)
+                if not path.is_absolute():
+                    path = self.workspace / path
+                try:
+                    rel_path = self._rel_path(path)
+                except ValueError:
+                    continue
+                if self._is_ignored(rel_path):
+                    continue
+
+                prefix = "" if rel_path == "." else rel_path + os.sep
+                if path.is_dir():
+                    existing = set()
+                    for file_path in self._iter_files(path):
+                        file_rel = self._rel_path(file_path)
+                        existing.add(file_rel)
+                        self._update_file(file_path, file_rel)
+                    stale = [p for p in self._files if p.startswith(prefix) and p not in existing]
+                elif path.is_file():
+                    self._update_file(path, rel_path)
+                    stale = []
+                else:
+                    stale = [p for p in self._files if p == rel_path or p.startswith(prefix)]
+                for stale_path in stale:
+                    self._remove(stale_path)
+            self._maybe_save()
+        return self
+
+    def _update_file(self, path: Path, rel_path: str):
+        try:
+            stat = path.stat()
+        except OSError:
+            self._remove(rel_path)
+            return
+        old = self._files.get(rel_path)
+        if old and old[0] == stat.st_mtime_ns and old[1] == stat.st_size:
+            return
+
+        self._remove(rel_path)
+        if stat.st_size > self.max_file_size:
+            try:
+                with open(path, 'rb') as f:
+                    kind = "binary" if is_binary(f.read(SNIFF_BYTES)) else "large"
+            except OSError:
+                return
+            self._files[rel_path] = (stat.st_mtime_ns, stat.st_size, kind)
+            self._unsaved += 1
+            return
+
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return
+        if is_binary(data[:SNIFF_BYTES]):
+            self._files[rel_path] = (stat.st_mtime_ns, stat.st_size, "binary")
+            self._unsaved += 1
+            return
+
+        fid = self._next_id
+        self._next_id += 1
+        self._ids[rel_path] = fid
+        self._paths[fid] = rel_path
+        self._files[rel_path] = (stat.st_mtime_ns, stat.st_size, "text")
+        postings = self._postings
+        for gram in trigrams(data):
+            ids = postings.get(gram)
+            if ids is None:
+                ids = postings[gram] = array(_ID_CODE)
+            ids.append(fid)
+        self._unsaved += 1
+
+    def _remove(self, rel_path: str):
+        if self._files.pop(rel_path, None) is None:
+            return
+        self._unsaved += 1
+        fid = self._ids.pop(rel_path, None)
+        if fid is None:
+            return
+        del self._paths[fid]
+        self._dead += 1
+        if self._dead >= self.COMPACT_MIN_DEAD and self._dead > len(self._paths):
+            self._compact()
+
+    def _compact(self):
+        """从倒排表中移除失效的文件 ID"""
+        live = self._paths
+        postings = {}
+        for gram, ids in self._postings.items():
+            kept = array(_ID_CODE, (fid for fid in ids if fid in live))
+            if kept:
+                postings[gram] = kept
+        self._postings = postings
+        self._dead = 0
+
+    def _reset(self):
+        self._files.clear()
+        self._ids.clear()
+        self._paths.clear()
+        self._postings = {}
+        self._next_id = 0
+        self._dead = 0
+        self._unsaved += 1
+
+    # ===== 查询 =====
+
+    def candidates(self, plan: QueryPlan) -> List[str]:
+        """
+        可能匹配查询计划的文件（相对路径，按路径排序）
+
+        未建索引的大文件总是包含在内；二进制文件总是排除
+        """
+        with self.lock:
+            if plan is None:
+                paths = [p for p, (_, _, kind) in self._files.items() if kind != "binary"]
+                return sorted(paths)
+
+            matched: Set[int] = set()
+            for grams in plan:
+                lists = []
+                for gram in grams:
+                    ids = self._postings.get(gram)
+                    if ids is None:
+                        break
+                    lists.append(ids)
+                else:
+                    lists.sort(key=len)
+                    found = set(lists[0])
+                    for ids in lists[1:]:
+                        if not found:
+                            break
+                        found.intersection_update(ids)
+                    matched |= found
+
+            paths = [self._paths[fid] for fid in matched if fid in self._paths]
+            paths.extend(p for p, (_, _, kind) in self._files.items() if kind == "large")
+            return sorted(paths)
+
+    def search_candidates(self, pattern: str, flags: int = 0) -> List[str]:
+        """正则表达式的候选文件"""
+        return self.candidates(query_plan(pattern, flags))
+
+    def stats(self) -> Dict[str, int]:
+        """索引统计"""
+        with self.lock:
+            kinds = [kind for _, _, kind in self._files.values()]
+            return {
+                "files": len(kinds),
+                "indexed": kinds.count("text"),
+                "large": kinds.count("large"),
+                "binary": kinds.count("binary"),
+                "trigrams": len(self._postings),
+                "postings": sum(len(ids) for ids in self._postings.values()),
+            }
+
+    def memory_usage(self) -> int:
+        """倒排表占用的字节数（估算）"""
+        with self.lock:
+            return sum(ids.itemsize * len(ids) + 64 for ids in self._postings.values()) + 120 * len(self._files)
+
+    # ===== 持久化 =====
+
+    def _maybe_save(self, force: bool = False):
+        if self.db_path and (self._unsaved >= self.SAVE_EVERY or (force and self._unsaved)):
+            self.save()
+
+    def save(self):
+        """将索引写入 SQLite（整体替换）"""
+        if not self.db_path:
+            return
+        with self.lock:
+            try:
+                self.db_path.parent.mkdir(parents=True, exist_ok=True)
+                conn = sqlite3.connect(str(self.db_path))
+                try:
+                    with conn:
+                        conn.executescript(_SCHEMA)
+                        conn.execute("DELETE FROM files")
+                        conn.execute("DELETE FROM postings")
+                        conn.executemany(
+                            "INSERT INTO files (path, id, mtime_ns, size, kind) VALUES (?, ?, ?, ?, ?)",
+                            [
+                                (path, self._ids.get(path, -1), mtime_ns, size, kind)
+                                for path, (mtime_ns, size, kind) in self._files.items()
+                            ]
+                        )
+                        conn.executemany(
+                            "INSERT INTO postings (trigram, ids) VALUES (?, ?)",
+                            ((gram, ids.tobytes()) for gram, ids in self._postings.items())
+                        )
+                        conn.executemany(
+                            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                            [
+                                ("schema_version", str(CONTENT_SCHEMA_VERSION)),
+                                ("next_id", str(self._next_id)),
+                                ("dead", str(self._dead)),
+                            ]
+                        )
+                finally:
+                    conn.close()
+                self._unsaved = 0
+            except (OSError, sqlite3.Error) as e:
+                print(f"保存内容索引失败 {self.db_path}: {e}")
+
+    def _load(self):
+        if not self.db_path.exists():
+            return
+        conn = sqlite3.connect(str(self.db_path))
+        try:
+            conn.executescript(_SCHEMA)
+            meta = dict(conn.execute("SELECT key, value FROM meta"))
+            if meta.get("schema_version") != str(CONTENT_SCHEMA_VERSION):
+                return
+            for path, fid, mtime_ns, size, kind in conn.execute(
+                "SELECT path, id, mtime_ns, size, kind FROM files"
+            ):
+                self._files[path] = (mtime_ns, size, kind)
+                if fid >= 0:
+                    self._ids[path] = fid
+                    self._paths[fid] = path
+            for gram, blob in conn.execute("SELECT trigram, ids FROM postings"):
+                ids = array(_ID_CODE)
+                ids.frombytes(blob)
+                self._postings[gram] = ids
+            self._next_id = int(meta.get("next_id", 0))
+            self._dead = int(meta.get("dead", 0))
+        finally:
+            conn.close()
+
+    # ===== 路径 =====
+
+    def _is_ignored(self, rel_path: str) -> bool:
+        return self.snapshot.is_ignored(rel_path)
+
+    def _rel_path(self, path: Path) -> str:
+        try:
+            return str(path.relative_to(self.workspace))
+        except ValueError:
+            return str(path.resolve().relative_to(self.workspace))
+
+    def _iter_files(self, root: Path):
+        return self.snapshot.iter_paths("" if root == self.workspace else self._rel_path(root))
@@ -0,0 +1,391 @@
+"""
+索引持久化存储
+基于 SQLite 记录每个文件的指纹（mtime、大小、内容哈希）及其符号、依赖边和导入，
+重启后可直接加载，增量索引时只需重新解析变更的文件
+"""
+import sys
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, Optional
+
+from .code_graph import CodeGraph, CodeSymbol
+from .resolver import CallResolver
+
+
+# 索引目录（位于工作区下）
+INDEX_DIR_NAME = '.code_index'
+
+# 索引数据库文件名
+INDEX_DB_NAME = 'index.db'
+
+# 快照表中调用解析结果的名称（其余为边存储快照）
+CALLS_SNAPSHOT = 'calls'
+
+# 存储格式版本，解析规则变化时递增，旧索引会被丢弃重建
+SCHEMA_VERSION = 3
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    hash TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS symbols (
+    key TEXT PRIMARY KEY,
+    file TEXT NOT NULL,
+    name TEXT NOT NULL,
+    type TEXT NOT NULL,
+    line INTEGER NOT NULL,
+    end_line INTEGER NOT NULL,
+    signature TEXT,
+    docstring TEXT,
+    parent TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_symbols_file ON symbols(file);
+CREATE TABLE IF NOT EXISTS edges (
+    file TEXT NOT NULL,
+    source TEXT NOT NULL,
+    target TEXT NOT NULL,
+    type TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_edges_file ON edges(file);
+CREATE TABLE IF NOT EXISTS imports (
+    file TEXT NOT NULL,
+    name TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_imports_file ON imports(file);
+CREATE TABLE IF NOT EXISTS snapshot (
+    name TEXT PRIMARY KEY,
+    data BLOB NOT NULL
+);
+"""
+
+# 索引数据表（清空索引时一并清空）
+_DATA_TABLES = ('files', 'symbols', 'edges', 'imports', 'snapshot')
+
+
+# 文档字符串未加载的标记
+_UNLOADED = object()
+
+
+class DocstringLoader:
+    """
+    按需从 SQLite 读取符号的文档字符串
+
+    单个读取走主键查询；读取次数较多（如构建全文索引）时一次性加载全部
+    """
+
+    # 单个读取超过该次数后改为批量加载
+    BULK_THRESHOLD = 256
+
+    def __init__(self, db_path: Path):
+        self.db_path = db_path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._all: Optional[Dict[str, str]] = None
+        self._reads = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            if self._all is not None:
+                return self._all.get(key)
+            try:
+                if self._conn is None:
+                    self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+                self._reads += 1
+                if self._reads > self.BULK_THRESHOLD:
+                    self._all = dict(self._conn.execute(
+                        "SELECT key, docstring FROM symbols WHERE docstring IS NOT NULL"
+                    ))
+                    self.close()
+                    return self._all.get(key)
+                row = self._conn.execute(
+                    "SELECT docstring FROM symbols WHERE key = ?", (key,)
+                ).fetchone()
+            except sqlite3.Error:
+                return None
+            return row[0] if row else None
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+# CodeSymbol.docstring 的槽描述符，供延迟加载的子类读写底层存储
+_DOCSTRING_SLOT = CodeSymbol.__dict__['docstring']
+
+
+class LazySymbol(CodeSymbol):
+    """文档字符串延迟加载的符号（从存储加载代码图时使用）"""
+    __slots__ = ('_loader',)
+
+    @property
+    def docstring(self) -> Optional[str]:
+        value = _DOCSTRING_SLOT.__get__(self)
+        if value is _UNLOADED:
+            value = self._loader.get(f"{self.file}::{self.name}")
+            _DOCSTRING_SLOT.__set__(self, value)
+        return value
+
+    @docstring.setter
+    def docstring(self, value: Optional[str]):
+        _DOCSTRING_SLOT.__set__(self, value)
+
+
+@dataclass
+class FileFingerprint:
+    """文件指纹"""
+    path: str      # 相对工作区的路径
+    mtime_ns: int
+    size: int
+    hash: str      # 内容哈希
+
+    def same_stat(self, mtime_ns: int, size: int) -> bool:
+        """mtime 和大小是否一致（一致时无需读取内容）"""
+        return self.mtime_ns == mtime_ns and self.size == size
+
+
+class IndexStore:
+    """
+    索引存储
+
+    一个工作区对应一个 SQLite 文件，按文件粒度保存/删除索引数据
+    """
+
+    def __init__(self, db_path: str):
+        """
+        初始化索引存储
+
+        Args:
+            db_path: SQLite 数据库文件路径
+        """
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._init_schema()
+
+    @classmethod
+    def for_workspace(cls, workspace_path: str) -> 'IndexStore':
+        """获取工作区默认位置的索引存储"""
+        return cls(str(Path(workspace_path).resolve() / INDEX_DIR_NAME / INDEX_DB_NAME))
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """打开连接，正常退出时提交事务，始终关闭连接"""
+        conn = sqlite3.connect(str(self.db_path))
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _init_schema(self):
+        """创建表结构，版本不匹配时清空旧数据"""
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+            row = conn.execute(
+                "SELECT value FROM meta WHERE key = 'schema_version'"
+            ).fetchone()
+            if row is None or row[0] != str(SCHEMA_VERSION):
+                for table in _DATA_TABLES:
+                    conn.execute(f"DELETE FROM {table}")
+                conn.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('schema_version', ?)",
+                    (str(SCHEMA_VERSION),)
+                )
+
+    def load_fingerprints(self) -> Dict[str, FileFingerprint]:
+        """加载所有文件指纹"""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT path, mtime_ns, size, hash FROM files").fetchall()
+        return {row[0]: FileFingerprint(*row) for row in rows}
+
+    def load_graph(self, lazy_docstrings: bool = True) -> CodeGraph:
+        """
+        从存储中加载完整代码图
+
+        Args:
+            lazy_docstrings: 文档字符串是否延迟到首次访问时再读取
+        """
+        graph = CodeGraph()
+
+        with self._connect() as conn:
+            # 边存储优先从快照恢复，快照缺失或损坏时逐条重建
+            restored = False
+            snapshot = dict(conn.execute("SELECT name, data FROM snapshot"))
+            if snapshot:
+                try:
+                    graph.restore_edges(snapshot)
+                    restored = True
+                except (KeyError, ValueError) as e:
+                    print(f"索引快照无效 {self.db_path}: {e}")
+                    graph = CodeGraph()
+
+            if lazy_docstrings:
+                loader = DocstringLoader(self.db_path)
+                for *fields, has_doc, parent in conn.execute(
+                    "SELECT name, type, file, line, end_line, signature, docstring IS NOT NULL, parent "
+                    "FROM symbols ORDER BY rowid"
+                ):
+                    symbol = LazySymbol(*fields, _UNLOADED if has_doc else None, parent)
+                    symbol._loader = loader
+                    graph.add_symbol(symbol)
+            else:
+                for row in conn.execute(
+                    "SELECT name, type, file, line, end_line, signature, docstring, parent "
+                    "FROM symbols ORDER BY rowid"
+                ):
+                    graph.add_symbol(CodeSymbol(*row))
+
+            if not restored:
+                graph.link_many(conn.execute("SELECT source, target, type FROM edges ORDER BY rowid"))
+
+            for file, name in conn.execute("SELECT file, name FROM imports"):
+                graph.imports_map[sys.intern(file)].add(sys.intern(name))
+
+        # 调用解析结果与边存储快照一起保存，边存储恢复成功时才可信
+        calls = snapshot.get(CALLS_SNAPSHOT) if restored else None
+        if calls is not None:
+            try:
+                graph.derived_index("calls", lambda g: CallResolver.restore(g, calls))
+            except ValueError as e:
+                print(f"调用解析快照无效 {self.db_path}: {e}")
+
+        if not restored and graph.symbols:
+            # 为下次冷启动写入快照
+            try:
+                self.save_snapshot(graph)
+            except sqlite3.Error as e:
+                print(f"保存索引快照失败 {self.db_path}: {e}")
+        return graph
+
+    def save_snapshot(self, graph: CodeGraph):
+        """保存代码图边存储及调用解析结果的快照（须与存储中的数据一致）"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM snapshot")
+            conn.executemany(
+                "INSERT INTO snapshot (name, data) VALUES (?, ?)",
+                self._snapshot_rows(graph).items()
+            )
+
+    @staticmethod
+    def _snapshot_rows(graph: CodeGraph) -> Dict[str, bytes]:
+        rows = graph.edge_snapshot()
+        resolver = graph.peek_derived("calls")
+        if resolver is not None:
+            rows[CALLS_SNAPSHOT] = resolver.snapshot()
+        return rows
+
+    def save_files(
+        self,
+        graph: CodeGraph,
+        fingerprints: Iterable[FileFingerprint],
+        reparsed: Iterable[str] = ()
+    ):
+        """
+        保存文件指纹及重新解析文件的索引数据
+
+        Args:
+            graph: 代码图
+            fingerprints: 需要更新的文件指纹
+            reparsed: 重新解析过的文件，其符号/边/导入会被整体替换
+        """
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO files (path, mtime_ns, size, hash) VALUES (?, ?, ?, ?)",
+                [(fp.path, fp.mtime_ns, fp.size, fp.hash) for fp in fingerprints]
+            )
+
+            reparsed = list(reparsed)
+            if reparsed:
+                conn.execute("DELETE FROM snapshot")
+            for file in reparsed:
+                self._delete_file_rows(conn, file)
+                conn.executemany(
+                    "INSERT OR REPLACE INTO symbols "
+                    "(key, file, name, type, line, end_line, signature, docstring, parent) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        (key, s.file, s.name, s.type, s.line, s.end_line,
+                         s.signature, s.docstring, s.parent)
+                        for key in graph.file_symbols.get(file, [])
+                        for s in (graph.symbols.get(key),) if s is not None
+                    ]
+                )
+                conn.executemany(
+                    "INSERT INTO edges (file, source, target, type) VALUES (?, ?, ?, ?)",
+                    [(file, e.source, e.target, e.type) for e in graph.get_file_edges(file)]
+                )
+                conn.executemany(
+                    "INSERT INTO imports (file, name) VALUES (?, ?)",
+                    [(file, name) for name in sorted(graph.imports_map.get(file, ()))]
+                )
+
+    def save_graph(self, graph: CodeGraph):
+        """用代码图的全部内容替换存储中的数据（不含文件指纹）"""
+        with self._connect() as conn:
+            for table in _DATA_TABLES:
+                conn.execute(f"DELETE FROM {table}")
+            conn.executemany(
+                "INSERT OR REPLACE INTO symbols "
+                "(key, file, name, type, line, end_line, signature, docstring, parent) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (key, s.file, s.name, s.type, s.line, s.end_line, s.signature, s.docstring, s.parent)
+                    for key, s in graph.symbols.items()
+                ]
+            )
+            conn.executemany(
+                "INSERT INTO edges (file, source, target, type) VALUES (?, ?, ?, ?)",
+                [(e.source.split("::", 1)[0], e.source, e.target, e.type) for e in graph.edges]
+            )
+            conn.executemany(
+                "INSERT INTO imports (file, name) VALUES (?, ?)",
+                [(file, name) for file, names in graph.imports_map.items() for name in sorted(names)]
+            )
+            conn.executemany(
+                "INSERT INTO snapshot (name, data) VALUES (?, ?)",
+                self._snapshot_rows(graph).items()
+            )
+
+    def remove_files(self, files: Iterable[str]):
+        """删除文件的指纹和索引数据"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM snapshot")
+            for file in files:
+                conn.execute("DELETE FROM files WHERE path = ?", (file,))
+                self._delete_file_rows(conn, file)
+
+    def clear(self):
+        """清空所有索引数据"""
+        with self._connect() as conn:
+            for table in _DATA_TABLES:
+                conn.execute(f"DELETE FROM {table}")
+
+    @staticmethod
+    def _delete_file_rows(conn: sqlite3.Connection, file: str):
+        conn.execute("DELETE FROM symbols WHERE file = ?", (file,))
+        conn.execute("DELETE FROM edges WHERE file = ?", (file,))
+        conn.execute("DELETE FROM imports WHERE file = ?", (file,))
+
+
+def open_workspace_store(workspace_path: str) -> Optional[IndexStore]:
+    """
+    打开工作区的索引存储
+
+    工作区不可写等情况下返回 None，调用方退化为纯内存索引
+    """
+    try:
+        return IndexStore.for_workspace(workspace_path)
+    except (OSError, sqlite3.Error) as e:
+        print(f"打开索引存储失败 {workspace_path}: {e}")
+        return None
@@ -5,9 +5,17 @@
 import os
 import ast
 import sys
-from typing import List, Set, Optional
+import hashlib
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Iterable, Iterator, List, Set, Optional, Tuple
 from pathlib import Path
-from .code_graph import CodeGraph, CodeSymbol, CodeEdge
+from .code_graph import CodeGraph, CodeSymbol
+from .index_store import IndexStore, FileFingerprint
+from .resolver import CallResolver
+from .workspace_snapshot import DEFAULT_IGNORE_DIRS, get_snapshot
 
 
 # Python 3.8 兼容：ast.unparse
@@ -38,6 +46,19 @@ else:
                 return "..."
 
 
+# 紧凑的解析结果（跨进程传输时避免序列化 dataclass）
+# 符号: (name, type, file, line, end_line, signature, docstring, parent)
+# 依赖边: (source, target, type)
+SymbolTuple = Tuple[str, str, str, int, int, Optional[str], Optional[str], Optional[str]]
+EdgeTuple = Tuple[str, str, str]
+ParsedFile = Tuple[List[SymbolTuple], List[EdgeTuple], List[str]]
+
+# 扫描任务: (绝对路径, 相对路径, 旧内容哈希)
+ScanJob = Tuple[str, str, Optional[str]]
+# 扫描结果: (相对路径, mtime_ns, 大小, 内容哈希, 内容是否变化, 解析结果, 错误信息)
+ScanResult = Tuple[str, int, int, str, bool, Optional[ParsedFile], Optional[str]]
+
+
 class CodeIndexer:
     """
     代码索引器
@@ -45,200 +66,422 @@ class CodeIndexer:
     扫描项目目录，解析 Python 文件，构建代码图
     """
     
-    # 忽略的目录
-    IGNORE_DIRS = {
-        '.git', '__pycache__', 'node_modules', '.venv', 'venv',
-        'dist', 'build', '.eggs', '*.egg-info', '.tox', '.mypy_cache'
-    }
+    # 默认忽略的目录（另按工作区中的 .gitignore / .ignore 过滤）
+    IGNORE_DIRS = DEFAULT_IGNORE_DIRS
     
     # 支持的文件扩展名
     SUPPORTED_EXTENSIONS = {'.py'}
     
-    def __init__(self, workspace_path: str):
+    # 待解析文件少于该数量时不启动进程池（进程启动开销大于收益）
+    PARALLEL_MIN_FILES = 64
+    
+    def __init__(
+        self,
+        workspace_path: str,
+        store: Optional[IndexStore] = None,
+        workers: int = 1,
+        chunk_size: int = 32
+    ):
         """
         初始化索引器
         
         Args:
             workspace_path: 工作区路径
+            store: 索引持久化存储（可选），提供后重启时可直接加载并增量更新
+            workers: 解析进程数，1 为单进程串行解析，0 表示使用全部 CPU 核心
+            chunk_size: 并行模式下每次分发给工作进程的文件数
         """
         self.workspace = Path(workspace_path).resolve()
-        self.graph = CodeGraph()
+        # 与内容索引、文件列表共用的工作区快照
+        self.snapshot = get_snapshot(str(self.workspace))
+        # 文件监听器在后台线程中更新索引，所有写操作串行执行；代码图共用该锁，读操作与更新互斥
+        self.lock = threading.RLock()
+        self.graph = CodeGraph(self.lock)
+        self.store = store
+        self.fingerprints: Dict[str, FileFingerprint] = {}
+        self.workers = workers if workers > 0 else (os.cpu_count() or 1)
+        self.chunk_size = max(1, chunk_size)
     
     def index(self, incremental: bool = False) -> CodeGraph:
         """
         索引整个项目
         
         Args:
-            incremental: 是否增量索引
+            incremental: 是否增量索引。增量模式下只重新解析指纹变化的文件，
+                并移除已变更或已删除文件的旧符号和依赖边
             
         Returns:
             构建的代码图
         """
-        if not incremental:
-            self.graph = CodeGraph()
-        
-        # 遍历所有 Python 文件
-        for file_path in self._iter_python_files():
-            try:
-                self._index_file(file_path)
-            except Exception as e:
-                print(f"索引文件失败 {file_path}: {e}")
-        
-        return self.graph
+        with self.lock:
+            cold = False
+            if not incremental:
+                self.graph = CodeGraph(self.lock)
+                self.fingerprints = {}
+                if self.store:
+                    self.store.clear()
+            elif self.store and not self.fingerprints:
+                # 冷启动：先从存储加载上次的索引结果（调用解析结果在快照有效时一并恢复）
+                self.graph = self.store.load_graph()
+                self.graph.lock = self.lock
+                self.fingerprints = self.store.load_fingerprints()
+                cold = True
+            calls_restored = self.graph.peek_derived("calls") is not None
+            
+            # 按 mtime/大小筛选出可能变化的文件
+            seen: Set[str] = set()
+            jobs: List[ScanJob] = []
+            for file_path in self._iter_python_files():
+                rel_path = self._rel_path(file_path)
+                seen.add(rel_path)
+                self._add_job(jobs, file_path, rel_path)
+            
+            removed = [f for f in self.fingerprints if f not in seen]
+            changed = self._apply_changes(jobs, removed)
+            if cold and (changed or not calls_restored):
+                # 存储有变化时快照已被清除：重新写入，下次冷启动无需重新解析全部调用
+                self._save_snapshot()
+            return self.graph
     
     def index_file(self, file_path: str) -> CodeGraph:
-        """索引单个文件"""
-        self._index_file(Path(file_path))
-        return self.graph
-    
-    def _iter_python_files(self):
-        """遍历所有 Python 文件"""
-        for root, dirs, files in os.walk(self.workspace):
-            # 过滤忽略的目录
-            dirs[:] = [d for d in dirs if d not in self.IGNORE_DIRS]
+        """索引单个文件（替换该文件原有的索引）"""
+        return self.update_paths([file_path])
+    
+    def update_paths(self, paths: Iterable[str]) -> CodeGraph:
+        """
+        按路径增量更新索引（供文件监听器调用）
+        
+        Args:
+            paths: 变更的文件或目录路径（绝对路径或相对工作区的路径）。
+                目录会被递归检查；不存在的路径视为已删除，其下所有文件的索引会被移除
+            
+        Returns:
+            更新后的代码图
+        """
+        with self.lock:
+            jobs: List[ScanJob] = []
+            removed: Set[str] = set()
+            queued: Set[str] = set()
+            
+            for raw_path in paths:
+                path = Path(raw_path)
+                if not path.is_absolute():
+                    path = self.workspace / path
+                try:
+                    rel_path = self._rel_path(path)
+                except ValueError:
+                    continue  # 工作区之外
+                if self._is_ignored(rel_path):
+                    continue
+                
+                prefix = "" if rel_path == "." else rel_path + os.sep
+                if path.is_dir():
+                    existing = set()
+                    for file_path in self._iter_python_files(path):
+                        file_rel = self._rel_path(file_path)
+                        existing.add(file_rel)
+                        if file_rel not in queued:
+                            queued.add(file_rel)
+                            self._add_job(jobs, file_path, file_rel)
+                    removed.update(
+                        f for f in self.fingerprints
+                        if f.startswith(prefix) and f not in existing
+                    )
+                elif path.is_file():
+                    if path.suffix in self.SUPPORTED_EXTENSIONS and rel_path not in queued:
+                        queued.add(rel_path)
+                        self._add_job(jobs, path, rel_path)
+                else:
+                    removed.update(
+                        f for f in self.fingerprints
+                        if f == rel_path or f.startswith(prefix)
+                    )
             
-            for file in files:
-                if Path(file).suffix in self.SUPPORTED_EXTENSIONS:
-                    yield Path(root) / file
+            self._apply_changes(jobs, sorted(removed - queued))
+            return self.graph
     
-    def _index_file(self, file_path: Path):
-        """索引单个文件"""
+    def _add_job(self, jobs: List[ScanJob], file_path: Path, rel_path: str):
+        """mtime/大小变化的文件加入扫描任务"""
         try:
-            content = file_path.read_text(encoding='utf-8')
-            tree = ast.parse(content, filename=str(file_path))
-        except (SyntaxError, UnicodeDecodeError):
+            stat = file_path.stat()
+        except OSError as e:
+            print(f"索引文件失败 {file_path}: {e}")
+            return
+        old = self.fingerprints.get(rel_path)
+        if old and old.same_stat(stat.st_mtime_ns, stat.st_size):
             return
+        jobs.append((str(file_path), rel_path, old.hash if old else None))
+    
+    def _apply_changes(self, jobs: List[ScanJob], removed: List[str]) -> bool:
+        """
+        执行扫描任务、移除已删除文件，并写入持久化存储
+        
+        Returns:
+            是否有文件重新解析或被移除
+        """
+        # 解析并按任务顺序合并，结果与串行解析一致
+        updated: List[FileFingerprint] = []
+        reparsed: List[str] = []
+        for result in self._scan_all(jobs):
+            fingerprint, changed = self._apply_scan(result)
+            if fingerprint:
+                updated.append(fingerprint)
+                if changed:
+                    reparsed.append(fingerprint.path)
         
-        rel_path = str(file_path.relative_to(self.workspace))
-        
-        # 第一遍：收集所有符号
-        for node in ast.walk(tree):
-            if isinstance(node, ast.FunctionDef):
-                self._add_function(node, rel_path)
-            elif isinstance(node, ast.AsyncFunctionDef):
-                self._add_function(node, rel_path, is_async=True)
-            elif isinstance(node, ast.ClassDef):
-                self._add_class(node, rel_path)
-            elif isinstance(node, (ast.Import, ast.ImportFrom)):
-                self._add_import(node, rel_path)
-        
-        # 第二遍：分析调用关系
-        analyzer = CallAnalyzer(rel_path, self.graph)
-        analyzer.visit(tree)
-    
-    def _add_function(self, node: ast.FunctionDef, file: str, is_async: bool = False):
-        """添加函数符号"""
-        # 构建签名
-        args = []
-        for arg in node.args.args:
-            arg_str = arg.arg
-            if arg.annotation:
-                arg_str += f": {ast_unparse(arg.annotation)}"
-            args.append(arg_str)
-        
-        signature = f"{'async ' if is_async else ''}def {node.name}({', '.join(args)})"
-        if node.returns:
-            signature += f" -> {ast_unparse(node.returns)}"
-        
-        symbol = CodeSymbol(
-            name=node.name,
-            type="function",
-            file=file,
-            line=node.lineno,
-            end_line=node.end_lineno or node.lineno,
-            signature=signature,
-            docstring=ast.get_docstring(node)
-        )
-        self.graph.add_symbol(symbol)
-    
-    def _add_class(self, node: ast.ClassDef, file: str):
-        """添加类符号"""
-        # 获取基类
+        # 移除已删除文件的索引
+        for rel_path in removed:
+            self.graph.remove_file(rel_path)
+            self.fingerprints.pop(rel_path, None)
+        
+        self._resolve_calls(reparsed + list(removed))
+        self._persist(updated, reparsed, removed)
+        return bool(reparsed or removed)
+    
+    def _resolve_calls(self, changed: List[str]):
+        """解析调用目标：首次全部解析，之后只重新解析受变更影响的调用"""
+        resolver = self.graph.peek_derived("calls")
+        if resolver is None:
+            self.graph.derived_index("calls", CallResolver)
+        elif changed:
+            resolver.refresh(changed)
+    
+    def _is_ignored(self, rel_path: str) -> bool:
+        """路径是否被忽略（默认忽略目录或 .gitignore 规则）"""
+        return self.snapshot.is_ignored(rel_path)
+    
+    def _rel_path(self, file_path: Path) -> str:
+        """计算相对工作区的路径"""
+        try:
+            return str(file_path.relative_to(self.workspace))
+        except ValueError:
+            return str(file_path.resolve().relative_to(self.workspace))
+    
+    def _iter_python_files(self, root_dir: Optional[Path] = None):
+        """遍历所有 Python 文件（来自工作区快照）"""
+        under = self._rel_path(root_dir) if root_dir else ""
+        return self.snapshot.iter_paths(under, self.SUPPORTED_EXTENSIONS)
+    
+    def _scan_all(self, jobs: List[ScanJob]) -> Iterator[ScanResult]:
+        """
+        执行扫描任务，按任务顺序产出结果
+        
+        文件足够多且配置了多个工作进程时使用进程池并行解析，
+        进程池不可用时退化为串行。工作进程以 spawn 方式启动：
+        索引通常在多线程的服务进程中进行，fork 会把其他线程持有的锁一并复制到子进程
+        """
+        done = 0
+        if self.workers > 1 and len(jobs) >= self.PARALLEL_MIN_FILES:
+            try:
+                with ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+                ) as pool:
+                    for result in pool.map(_scan_file, jobs, chunksize=self.chunk_size):
+                        done += 1
+                        yield result
+                return
+            except (OSError, BrokenProcessPool) as e:
+                print(f"并行索引不可用，改为串行: {e}")
+        
+        for job in jobs[done:]:
+            yield _scan_file(job)
+    
+    def _apply_scan(self, result: ScanResult) -> Tuple[Optional[FileFingerprint], bool]:
+        """
+        将扫描结果合并到代码图
+        
+        Returns:
+            (新指纹, 是否重新解析)；读取失败时指纹为 None
+        """
+        rel_path, mtime_ns, size, digest, changed, parsed, error = result
+        if error:
+            print(f"索引文件失败 {rel_path}: {error}")
+            return None, False
+        
+        fingerprint = FileFingerprint(path=rel_path, mtime_ns=mtime_ns, size=size, hash=digest)
+        self.fingerprints[rel_path] = fingerprint
+        
+        # 只是 touch 过，内容没变
+        if not changed:
+            return fingerprint, False
+        
+        self.graph.remove_file(rel_path)
+        if parsed:
+            symbols, edges, imports = parsed
+            for symbol in symbols:
+                self.graph.add_symbol(CodeSymbol(*symbol))
+            for edge in edges:
+                self.graph.link(*edge)
+            if imports:
+                self.graph.imports_map[rel_path].update(sys.intern(name) for name in imports)
+        return fingerprint, True
+    
+    def _persist(self, updated: List[FileFingerprint], reparsed: List[str], removed: List[str]):
+        """将变更写入持久化存储"""
+        if not self.store or not (updated or removed):
+            return
+        try:
+            if removed:
+                self.store.remove_files(removed)
+            if updated:
+                self.store.save_files(self.graph, updated, reparsed)
+        except Exception as e:
+            print(f"保存索引失败 {self.store.db_path}: {e}")
+    
+    def _save_snapshot(self):
+        """写入边存储和调用解析结果的快照"""
+        try:
+            self.store.save_snapshot(self.graph)
+        except Exception as e:
+            print(f"保存索引快照失败 {self.store.db_path}: {e}")
+
+
+def _scan_file(job: ScanJob) -> ScanResult:
+    """
+    读取、哈希并解析单个文件（可在工作进程中执行）
+    
+    内容哈希与旧哈希一致时跳过解析
+    """
+    path, rel_path, old_hash = job
+    try:
+        stat = os.stat(path)
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError as e:
+        return rel_path, 0, 0, "", False, None, str(e)
+    
+    digest = hashlib.sha1(data).hexdigest()
+    if digest == old_hash:
+        return rel_path, stat.st_mtime_ns, stat.st_size, digest, False, None, None
+    
+    return rel_path, stat.st_mtime_ns, stat.st_size, digest, True, parse_source(data, rel_path, path), None
+
+
+def parse_source(data: bytes, rel_path: str, filename: str = "<unknown>") -> Optional[ParsedFile]:
+    """
+    解析 Python 源码，提取符号、依赖边和导入
+    
+    Args:
+        data: 文件内容
+        rel_path: 相对工作区的路径（用作符号键前缀）
+        filename: 报错时显示的文件名
+        
+    Returns:
+        (符号列表, 依赖边列表, 导入列表)；无法解析时返回 None
+    """
+    try:
+        tree = ast.parse(data.decode('utf-8'), filename=filename)
+    except (SyntaxError, UnicodeDecodeError, ValueError):
+        return None
+    
+    visitor = _FileVisitor(rel_path)
+    visitor.visit(tree)
+    return visitor.symbols, visitor.edges, visitor.imports
+
+
+def _signature(node: ast.FunctionDef, is_async: bool) -> str:
+    """函数签名（位置参数及其注解、返回值注解）"""
+    args = []
+    for arg in node.args.args:
+        arg_str = arg.arg
+        if arg.annotation:
+            arg_str += f": {ast_unparse(arg.annotation)}"
+        args.append(arg_str)
+    
+    signature = f"{'async ' if is_async else ''}def {node.name}({', '.join(args)})"
+    if node.returns:
+        signature += f" -> {ast_unparse(node.returns)}"
+    return signature
+
+
+class _FileVisitor(ast.NodeVisitor):
+    """
+    单文件解析器
+    
+    一次遍历收集符号、导入和调用边。维护作用域栈：类体中直接定义的函数记为方法
+    （Class.method），嵌套定义使用限定名（Outer.Inner、outer.inner），
+    调用边归属于最内层的函数
+    """
+    
+    def __init__(self, file: str):
+        self.file = file
+        self.symbols: List[SymbolTuple] = []
+        self.edges: List[EdgeTuple] = []
+        self.imports: List[str] = []
+        # 作用域栈：(限定名, 是否为类)
+        self._scopes: List[Tuple[str, bool]] = []
+        # 当前所在函数的符号键（类体、模块顶层为 None）
+        self._function: Optional[str] = None
+    
+    def _qualify(self, name: str) -> Tuple[str, Optional[str]]:
+        """返回 (限定名, 所属作用域的限定名)"""
+        parent = self._scopes[-1][0] if self._scopes else None
+        return (f"{parent}.{name}" if parent else name), parent
+    
+    def _visit_scope(self, node, qualname: str, is_class: bool):
+        old_function = self._function
+        self._function = None if is_class else f"{self.file}::{qualname}"
+        self._scopes.append((qualname, is_class))
+        self.generic_visit(node)
+        self._scopes.pop()
+        self._function = old_function
+    
+    def visit_ClassDef(self, node: ast.ClassDef):
+        """访问类定义"""
+        qualname, parent = self._qualify(node.name)
         bases = [ast_unparse(base) for base in node.bases]
         signature = f"class {node.name}"
         if bases:
             signature += f"({', '.join(bases)})"
         
-        symbol = CodeSymbol(
-            name=node.name,
-            type="class",
-            file=file,
-            line=node.lineno,
-            end_line=node.end_lineno or node.lineno,
-            signature=signature,
-            docstring=ast.get_docstring(node)
-        )
-        self.graph.add_symbol(symbol)
-        
-        # 添加继承关系
+        self.symbols.append((
+            qualname, "class", self.file,
+            node.lineno, node.end_lineno or node.lineno,
+            signature, ast.get_docstring(node), parent
+        ))
+        
+        # 添加继承关系（* 表示需要解析）
         for base in bases:
-            self.graph.add_edge(CodeEdge(
-                source=f"{file}::{node.name}",
-                target=f"*::{base}",  # * 表示需要解析
-                type="inherits"
-            ))
-        
-        # 添加方法
-        for item in node.body:
-            if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef)):
-                method_symbol = CodeSymbol(
-                    name=f"{node.name}.{item.name}",
-                    type="method",
-                    file=file,
-                    line=item.lineno,
-                    end_line=item.end_lineno or item.lineno,
-                    signature=f"def {item.name}(...)",
-                    docstring=ast.get_docstring(item),
-                    parent=node.name
-                )
-                self.graph.add_symbol(method_symbol)
-    
-    def _add_import(self, node, file: str):
-        """添加导入"""
-        if isinstance(node, ast.Import):
-            for alias in node.names:
-                self.graph.imports_map[file].add(alias.name)
-        elif isinstance(node, ast.ImportFrom):
-            module = node.module or ""
-            for alias in node.names:
-                self.graph.imports_map[file].add(f"{module}.{alias.name}")
-
-
-class CallAnalyzer(ast.NodeVisitor):
-    """调用关系分析器"""
-    
-    def __init__(self, file: str, graph: CodeGraph):
-        self.file = file
-        self.graph = graph
-        self.current_function: Optional[str] = None
+            self.edges.append((f"{self.file}::{qualname}", f"*::{base}", "inherits"))
+        
+        self._visit_scope(node, qualname, True)
     
-    def visit_FunctionDef(self, node: ast.FunctionDef):
+    def visit_FunctionDef(self, node: ast.FunctionDef, is_async: bool = False):
         """访问函数定义"""
-        old_func = self.current_function
-        self.current_function = node.name
-        self.generic_visit(node)
-        self.current_function = old_func
+        qualname, parent = self._qualify(node.name)
+        is_method = bool(self._scopes) and self._scopes[-1][1]
+        self.symbols.append((
+            qualname, "method" if is_method else "function", self.file,
+            node.lineno, node.end_lineno or node.lineno,
+            _signature(node, is_async), ast.get_docstring(node), parent
+        ))
+        self._visit_scope(node, qualname, False)
     
     def visit_AsyncFunctionDef(self, node: ast.AsyncFunctionDef):
         """访问异步函数定义"""
-        old_func = self.current_function
-        self.current_function = node.name
-        self.generic_visit(node)
-        self.current_function = old_func
+        self.visit_FunctionDef(node, is_async=True)
+    
+    def visit_Import(self, node: ast.Import):
+        """访问 import 语句"""
+        for alias in node.names:
+            self.imports.append(alias.name)
+    
+    def visit_ImportFrom(self, node: ast.ImportFrom):
+        """访问 from ... import 语句"""
+        module = node.module or ""
+        for alias in node.names:
+            self.imports.append(f"{module}.{alias.name}")
     
     def visit_Call(self, node: ast.Call):
         """访问函数调用"""
-        if self.current_function:
+        if self._function:
             callee = self._get_call_name(node)
             if callee:
-                self.graph.add_edge(CodeEdge(
-                    source=f"{self.file}::{self.current_function}",
-                    target=f"*::{callee}",
-                    type="calls"
-                ))
+                self.edges.append((self._function, f"*::{callee}", "calls"))
         self.generic_visit(node)
     
-    def _get_call_name(self, node: ast.Call) -> Optional[str]:
+    @staticmethod
+    def _get_call_name(node: ast.Call) -> Optional[str]:
         """获取调用的函数名"""
         if isinstance(node.func, ast.Name):
             return node.func.id
@@ -0,0 +1,305 @@
+"""
+文件路径模糊查找
+在工作区快照的路径上做 fzf 风格的子序列匹配：每个字符一个位图（Python 大整数，第 i 位表示第 i 个路径
+含有该字符），查询时按位与得到候选，再对候选打分，用堆取前 k 个
+"""
+import heapq
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from .workspace_snapshot import MAX_SNAPSHOTS, WorkspaceSnapshot, get_snapshot
+
+
+# 打分参数（与 fzf 相同的量级）
+SCORE_MATCH = 16
+SCORE_GAP_START = -3
+SCORE_GAP_EXTENSION = -1
+# 路径段开头（/ 之后或路径开头）
+BONUS_SEGMENT = 9
+# _ - . 空格之后
+BONUS_BOUNDARY = 8
+# 驼峰（小写后的大写）和数字开头
+BONUS_CAMEL = 7
+# 连续匹配至少获得的加分
+BONUS_CONSECUTIVE = -(SCORE_GAP_START + SCORE_GAP_EXTENSION)
+# 查询首字符的加分倍数
+BONUS_FIRST_CHAR_MULTIPLIER = 2
+
+BOUNDARY_CHARS = frozenset('_-. ')
+
+# 每打分这么多个候选检查一次时间预算
+BUDGET_CHECK_INTERVAL = 256
+
+
+@dataclass
+class PathMatch:
+    """一个匹配的路径"""
+    __slots__ = ('path', 'score', 'positions')
+    path: str               # 相对工作区的路径
+    score: int
+    positions: List[int]    # 匹配字符在路径中的下标
+
+
+def _bonus(prev: str, ch: str) -> int:
+    """字符 ch（前一个字符为 prev）处的边界加分"""
+    if prev == '/':
+        return BONUS_SEGMENT
+    if prev in BOUNDARY_CHARS:
+        return BONUS_BOUNDARY
+    if ch.isupper() and prev.islower():
+        return BONUS_CAMEL
+    if ch.isdigit() and not prev.isdigit():
+        return BONUS_CAMEL
+    return 0
+
+
+def score_path(path: str, query: str, case_sensitive: bool = False) -> Optional[Tuple[int, List[int]]]:
+    """
+    子序列匹配并打分（fzf v1 算法），不匹配时返回 None
+
+    先从左向右贪心找到最早结束的匹配，再从结束处向左收紧起点，在得到的窗口内计算分数：
+    每个匹配字符得分并加上边界加分，连续匹配沿用该段首字符的加分，间隔按长度扣分
+
+    Args:
+        query: 查询（case_sensitive 为 False 时应已转为小写）
+    """
+    text = path if case_sensitive else path.lower()
+    pos = -1
+    for ch in query:
+        pos = text.find(ch, pos + 1)
+        if pos < 0:
+            return None
+    end = pos
+    for ch in reversed(query[:-1]):
+        pos = text.rfind(ch, 0, pos)
+    start = pos
+
+    score = 0
+    positions: List[int] = []
+    prev_pos = -1
+    chunk_bonus = 0
+    pos = start - 1
+    for i, ch in enumerate(query):
+        pos = text.find(ch, pos + 1, end + 1)
+        bonus = _bonus(path[pos - 1] if pos else '/', path[pos])
+        if pos == prev_pos + 1 and i:
+            # 连续匹配：保持该段开头的加分
+            chunk_bonus = max(chunk_bonus, bonus, BONUS_CONSECUTIVE)
+            bonus = chunk_bonus
+        else:
+            if i:
+                score += SCORE_GAP_START + SCORE_GAP_EXTENSION * (pos - prev_pos - 2)
+            chunk_bonus = bonus
+        score += SCORE_MATCH + (bonus * BONUS_FIRST_CHAR_MULTIPLIER if i == 0 else bonus)
+        positions.append(pos)
+        prev_pos = pos
+    return score, positions
+
+
+class PathIndex:
+    """
+    工作区路径的内存索引
+
+    路径取自 WorkspaceSnapshot（跳过隐藏文件），快照挂在 IndexWatcher 上时文件变化会改变其版本。
+    refresh() 在快照版本变化时增量同步：
+    删除的路径只清掉存活位图中的位，新增的路径追加编号并补到各字符位图；
+    墓碑过多时整体重建。整体重建时按文件名长度、路径长度排序编号，超出时间预算时优先打过分的是较短的路径
+    """
+
+    # 最多间隔这么久（秒）让快照 stat 一遍目录（发现监听器之外的变化）
+    REFRESH_INTERVAL = 2.0
+
+    def __init__(self, snapshot: WorkspaceSnapshot):
+        self.snapshot = snapshot
+        self.lock = threading.RLock()
+        self._paths: List[Optional[str]] = []
+        self._ids: Dict[str, int] = {}
+        # 字符 -> 路径中含有该字符的位图；文件名中含有该字符的位图
+        self._chars: Dict[str, int] = {}
+        self._name_chars: Dict[str, int] = {}
+        self._alive = 0
+        self._version: Optional[int] = None
+        self._refreshed = 0.0
+        self.rebuilds = 0
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    # ===== 同步 =====
+
+    def refresh(self, force: bool = False) -> 'PathIndex':
+        """与快照同步（快照本身最多每 REFRESH_INTERVAL 秒增量刷新一次）"""
+        with self.lock:
+            now = time.monotonic()
+            stale = force or now - self._refreshed >= self.REFRESH_INTERVAL
+            if stale:
+                self._refreshed = now
+            if not stale and self._version == self.snapshot.version:
+                return self
+            entries = self.snapshot.files(refresh=stale)
+            if self._version == self.snapshot.version:
+                return self
+            self._version = self.snapshot.version
+            self._sync([e.path for e in entries if not self._is_hidden(e.path)])
+        return self
+
+    def _sync(self, paths: List[str]):
+        current = set(paths)
+        removed = [path for path in self._ids if path not in current]
+        added = [path for path in paths if path not in self._ids]
+        tombstones = len(self._paths) - len(self._ids) + len(removed)
+        if not self._paths or len(removed) + len(added) > len(current) // 4 or tombstones > len(current):
+            self._rebuild(paths)
+            return
+        if removed:
+            # find() 在锁外按编号读取 _paths：墓碑写在副本上再整体替换（追加不改变已有编号，可原地进行）
+            slots = list(self._paths)
+            mask = bytearray((len(slots) + 7) // 8)
+            for path in removed:
+                i = self._ids.pop(path)
+                slots[i] = None
+                mask[i >> 3] |= 1 << (i & 7)
+            self._paths = slots
+            self._alive &= ~int.from_bytes(mask, 'little')
+        if added:
+            # 新增的位先按相对编号攒在小整数里，再整体移位合并，避免反复复制大整数
+            base = len(self._paths)
+            chars, name_chars = self._bitmaps(added)
+            for ch, bits in chars.items():
+                self._chars[ch] = self._chars.get(ch, 0) | (bits << base)
+            for ch, bits in name_chars.items():
+                self._name_chars[ch] = self._name_chars.get(ch, 0) | (bits << base)
+            for i, path in enumerate(added, base):
+                self._ids[path] = i
+            self._paths.extend(added)
+            self._alive |= ((1 << len(added)) - 1) << base
+
+    def _rebuild(self, paths: List[str]):
+        paths = sorted(paths, key=lambda p: (len(os.path.basename(p)), len(p), p))
+        self._paths = list(paths)
+        self._ids = {path: i for i, path in enumerate(paths)}
+        self._chars, self._name_chars = self._bitmaps(paths)
+        self._alive = (1 << len(paths)) - 1
+        self.rebuilds += 1
+
+    @staticmethod
+    def _bitmaps(paths: List[str]) -> Tuple[Dict[str, int], Dict[str, int]]:
+        """构建各字符的位图（先写 bytearray 再一次转换为整数）"""
+        size = (len(paths) + 7) // 8
+        chars: Dict[str, bytearray] = {}
+        name_chars: Dict[str, bytearray] = {}
+        for i, path in enumerate(paths):
+            byte, bit = i >> 3, 1 << (i & 7)
+            lower = path.lower()
+            for table, text in ((chars, lower), (name_chars, lower[lower.rfind('/') + 1:])):
+                for ch in set(text):
+                    bits = table.get(ch)
+                    if bits is None:
+                        bits = table[ch] = bytearray(size)
+                    bits[byte] |= bit
+        return (
+            {ch: int.from_bytes(bits, 'little') for ch, bits in chars.items()},
+            {ch: int.from_bytes(bits, 'little') for ch, bits in name_chars.items()},
+        )
+
+    @staticmethod
+    def _is_hidden(rel_path: str) -> bool:
+        # 快照中的路径统一以 / 分隔
+        return rel_path.startswith('.') or '/.' in rel_path
+
+    # ===== 查询 =====
+
+    def find(self, query: str, limit: int = 50, budget: Optional[float] = None) -> Tuple[List[PathMatch], bool]:
+        """
+        模糊查找路径
+
+        查询中的空白被忽略；含大写字母时区分大小写（smart case）。
+        所有查询字符都出现在文件名中的候选先打分，其余的后打分
+
+        Args:
+            query: 查询
+            limit: 最多返回的数量
+            budget: 打分的时间预算（秒），None 表示不限
+
+        Returns:
+            (按分数从高到低排列的匹配, 是否对所有候选都打了分)
+        """
+        query = ''.join(query.split())
+        case_sensitive = query != query.lower()
+        if not case_sensitive:
+            query = query.lower()
+        if not query or limit <= 0:
+            return [], True
+        deadline = time.monotonic() + budget if budget is not None else None
+
+        with self.lock:
+            paths = self._paths
+            candidates = self._alive
+            name_candidates = candidates
+            for ch in set(query.lower()):
+                candidates &= self._chars.get(ch, 0)
+                name_candidates &= self._name_chars.get(ch, 0)
+
+        # 小顶堆保留分数最高的 limit 个：(分数, -路径长度, -编号, 位置)，同分时短路径、小编号优先
+        heap: List[Tuple[int, int, int, List[int]]] = []
+        scored = 0
+        complete = True
+        for bits in (name_candidates, candidates & ~name_candidates):
+            if not bits:
+                continue
+            # 二进制串反转后下标即编号，用 str.find 跳到下一个置位
+            digits = bin(bits)[:1:-1]
+            i = digits.find('1')
+            while i >= 0:
+                if deadline is not None and scored % BUDGET_CHECK_INTERVAL == 0 and scored \
+                        and time.monotonic() >= deadline:
+                    complete = False
+                    break
+                scored += 1
+                path = paths[i]
+                result = score_path(path, query, case_sensitive)
+                if result is not None:
+                    item = (result[0], -len(path), -i, result[1])
+                    if len(heap) < limit:
+                        heapq.heappush(heap, item)
+                    elif item[:3] > heap[0][:3]:
+                        heapq.heapreplace(heap, item)
+                i = digits.find('1', i + 1)
+            if not complete:
+                break
+
+        return [
+            PathMatch(paths[-neg_id], score, positions)
+            for score, _, neg_id, positions in sorted(heap, key=lambda item: item[:3], reverse=True)
+        ], complete
+
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            return {
+                "paths": len(self._ids),
+                "slots": len(self._paths),
+                "rebuilds": self.rebuilds,
+            }
+
+
+_indexes: 'OrderedDict[str, PathIndex]' = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def get_path_index(workspace: str) -> PathIndex:
+    """进程内共享的路径索引（与工作区快照一一对应，最近最少使用的先淘汰）"""
+    snapshot = get_snapshot(workspace)
+    key = str(snapshot.workspace)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None or index.snapshot is not snapshot:
+            index = _indexes[key] = PathIndex(snapshot)
+            while len(_indexes) > MAX_SNAPSHOTS:
+                _indexes.popitem(last=False)
+        else:
+            _indexes.move_to_end(key)
+    return index.refresh()
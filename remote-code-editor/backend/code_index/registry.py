@@ -0,0 +1,426 @@
+"""
+代码索引注册表
+进程内按工作区缓存索引（代码图、搜索器、文件监听器），LRU 淘汰并受内存预算约束
+"""
+import sys
+import random
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set
+
+from .code_graph import CodeGraph
+from .content_index import ContentIndex
+from .indexer import CodeIndexer
+from .searcher import CodeSearcher
+from .watcher import IndexWatcher
+
+
+# 估算内存时每类对象的抽样数量
+SIZE_SAMPLE = 256
+# 容器中每条引用的开销（字节，按 64 位指针和字典槽位估算）
+REF_BYTES = 8
+DICT_SLOT_BYTES = 40
+
+
+def _sample(items: List[Any]) -> List[Any]:
+    if len(items) <= SIZE_SAMPLE:
+        return items
+    return random.Random(len(items)).sample(items, SIZE_SAMPLE)
+
+
+def _object_bytes(obj: Any) -> int:
+    """符号对象本身及其独有字符串属性（签名、文档）的大小"""
+    size = sys.getsizeof(obj)
+    for value in (obj.signature, obj.docstring):
+        if value is not None:
+            size += sys.getsizeof(value)
+    return size
+
+
+def estimate_graph_bytes(graph: CodeGraph) -> int:
+    """
+    估算代码图占用的内存（字节）
+
+    符号按抽样的平均大小外推（驻留的名称/文件字符串在符号间共享，只计入符号键），
+    边存储按数组实际大小计算；派生索引按其持有的条目数粗略计入。
+    遍历期间持有代码图的锁（文件监听线程会原地更新代码图）
+    """
+    with graph.lock:
+        return _estimate_graph_bytes(graph)
+
+
+def graph_version(graph: CodeGraph) -> tuple:
+    """代码图的变更标记：符号增删、边数或派生索引变化时改变（用于缓存内存估算）"""
+    with graph.lock:
+        return graph.generation, len(graph.edges), len(graph.derived_names())
+
+
+def _estimate_graph_bytes(graph: CodeGraph) -> int:
+    symbols = list(graph.symbols.items())
+    total = sum(graph.memory_usage().values())
+
+    if symbols:
+        sample = _sample(symbols)
+        per_symbol = sum(sys.getsizeof(k) + _object_bytes(s) for k, s in sample) / len(sample)
+        # symbols 字典槽位 + file_symbols 中的键引用
+        total += int(len(symbols) * (per_symbol + DICT_SLOT_BYTES + REF_BYTES))
+
+    for modules in graph.imports_map.values():
+        total += DICT_SLOT_BYTES + sum(sys.getsizeof(m) + REF_BYTES for m in modules)
+
+    # 派生索引（符号搜索、全文检索）：每个符号约若干个倒排/有序数组条目
+    total += len(graph.derived_names()) * len(symbols) * (DICT_SLOT_BYTES + 4 * REF_BYTES)
+    return total
+
+
+@dataclass
+class IndexEntry:
+    """注册表中单个工作区的索引"""
+    workspace: str
+    indexer: CodeIndexer
+    searcher: CodeSearcher
+    # 代码索引是否已构建（只请求了内容索引时为 False，索引器尚未挂到文件监听器上）
+    indexed: bool = True
+    watcher: Optional[IndexWatcher] = None
+    # 内容（全文）索引，首次请求时构建
+    content: Optional[ContentIndex] = None
+    size_bytes: int = 0
+    # 代码图的内存估算及估算时的变更标记（代码图未变化时不重新估算）
+    graph_bytes: int = 0
+    graph_version: Optional[tuple] = None
+    hits: int = 0
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    @property
+    def graph(self) -> CodeGraph:
+        return self.indexer.graph
+
+
+class IndexRegistry:
+    """
+    代码索引注册表
+
+    以解析后的工作区绝对路径为键缓存索引；超过数量上限或内存预算时按最近最少使用淘汰，
+    被淘汰的索引会停止文件监听（持久化存储仍保留，再次访问时可快速重建）
+    """
+
+    def __init__(
+        self,
+        indexer_factory: Callable[[str], CodeIndexer] = CodeIndexer,
+        content_factory: Callable[[str], ContentIndex] = ContentIndex,
+        max_entries: int = 8,
+        memory_budget: int = 0,
+        watch: bool = True,
+        watcher_options: Optional[Dict[str, Any]] = None
+    ):
+        """
+        初始化注册表
+
+        Args:
+            indexer_factory: 根据工作区路径创建索引器
+            content_factory: 根据工作区路径创建内容索引
+            max_entries: 最多缓存的工作区数量
+            memory_budget: 所有索引的内存预算（字节），0 表示不限制
+            watch: 是否为缓存的索引启动文件监听
+            watcher_options: 传给 IndexWatcher 的参数（debounce、poll_interval 等）
+        """
+        self.indexer_factory = indexer_factory
+        self.content_factory = content_factory
+        self.max_entries = max(1, max_entries)
+        self.memory_budget = memory_budget
+        self.watch = watch
+        self.watcher_options = watcher_options or {}
+
+        self._entries: 'OrderedDict[str, IndexEntry]' = OrderedDict()
+        self._building: Dict[str, threading.Lock] = {}
+        # 正在后台构建内容索引的工作区
+        self._content_builds: Set[str] = set()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def normalize(workspace: str) -> str:
+        """工作区路径规范化（注册表的键）"""
+        return str(Path(workspace).resolve())
+
+    def get(self, workspace: str) -> IndexEntry:
+        """
+        获取工作区索引，代码索引未构建时增量索引（优先从持久化存储加载）后加入缓存
+        """
+        key = self.normalize(workspace)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.indexed:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                entry.hits += 1
+                return entry
+            self.misses += 1
+
+        with self._build_lock(key):
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry.indexed:
+                    # 等到了其他线程构建的索引：同样算作命中（撤回上面计入的未命中）
+                    self._entries.move_to_end(key)
+                    self.misses -= 1
+                    self.hits += 1
+                    entry.hits += 1
+                    return entry
+
+            if entry is None:
+                indexer = self.indexer_factory(key)
+                indexer.index(incremental=True)
+                return self._add(key, indexer)
+            self._index_entry(entry)
+
+        key = self._account(entry)
+        with self._lock:
+            evicted = self._evict(key)
+        for old in evicted:
+            self._release(old)
+        return entry
+
+    @contextmanager
+    def _build_lock(self, key: str) -> Iterator[None]:
+        """同一工作区只构建一次，不同工作区可以并行构建"""
+        with self._lock:
+            build_lock = self._building.setdefault(key, threading.Lock())
+        try:
+            with build_lock:
+                yield
+        finally:
+            # 构建失败时也要移除，否则该工作区的构建锁会一直留在表中
+            with self._lock:
+                self._building.pop(key, None)
+
+    @staticmethod
+    def _index_entry(entry: IndexEntry):
+        """为只有内容索引的条目构建代码索引，并挂到该工作区的文件监听器上"""
+        indexer = entry.indexer
+        # 持有索引器的锁挂载：构建完成前到达的文件变化等构建结束后再应用
+        with indexer.lock:
+            indexer.index(incremental=True)
+            if entry.watcher is not None:
+                entry.watcher.attach(indexer)
+        with entry.lock:
+            entry.searcher = CodeSearcher(indexer.graph)
+            entry.indexed = True
+
+    def reindex(self, workspace: str, incremental: bool = True) -> IndexEntry:
+        """重新索引工作区（已缓存时原地更新，否则新建）"""
+        entry = self.get(workspace)
+        with entry.lock:
+            graph = entry.indexer.index(incremental=incremental)
+            if entry.searcher.graph is not graph:
+                entry.searcher = CodeSearcher(graph)
+        key = self._account(entry)
+        with self._lock:
+            evicted = self._evict(key)
+        for old in evicted:
+            self._release(old)
+        return entry
+
+    def content_index(self, workspace: str, wait: bool = True) -> Optional[ContentIndex]:
+        """
+        获取工作区的内容索引（首次调用时从工作区快照增量构建，不构建代码索引；
+        由该工作区的文件监听器保持更新）
+
+        Args:
+            wait: False 时不阻塞：尚未构建完成则在后台线程中构建并返回 None
+        """
+        key = self.normalize(workspace)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.content is not None:
+                self._entries.move_to_end(key)
+                return entry.content
+        if not wait:
+            self._build_content_async(key)
+            return None
+
+        with self._build_lock(key):
+            with self._lock:
+                entry = self._entries.get(key)
+            if entry is None:
+                entry = self._add(key, self.indexer_factory(key), indexed=False)
+            with entry.lock:
+                if entry.content is None:
+                    entry.content = self.content_factory(entry.workspace).index(incremental=True)
+                    if entry.watcher is not None:
+                        entry.watcher.attach(entry.content)
+        key = self._account(entry)
+        with self._lock:
+            evicted = self._evict(key)
+        for old in evicted:
+            self._release(old)
+        return entry.content
+
+    def _build_content_async(self, key: str):
+        with self._lock:
+            if key in self._content_builds:
+                return
+            self._content_builds.add(key)
+
+        def build():
+            try:
+                self.content_index(key)
+            except Exception as e:
+                print(f"后台构建内容索引失败 {key}: {e}")
+            finally:
+                with self._lock:
+                    self._content_builds.discard(key)
+
+        threading.Thread(target=build, name="content-index", daemon=True).start()
+
+    def peek(self, workspace: str) -> Optional[IndexEntry]:
+        """获取已缓存的索引（不构建、不影响 LRU 顺序和统计）"""
+        with self._lock:
+            return self._entries.get(self.normalize(workspace))
+
+    def invalidate(self, workspace: str) -> bool:
+        """移除工作区的缓存索引"""
+        with self._lock:
+            entry = self._entries.pop(self.normalize(workspace), None)
+        if entry is None:
+            return False
+        self._release(entry)
+        return True
+
+    def clear(self):
+        """移除所有缓存索引"""
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+        for entry in entries:
+            self._release(entry)
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存统计信息"""
+        with self._lock:
+            entries = list(self._entries.values())
+        for entry in entries:
+            self._account(entry)
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "memory_budget": self.memory_budget,
+                "total_bytes": sum(e.size_bytes for e in self._entries.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "evictions": self.evictions,
+                "workspaces": [
+                    {
+                        "workspace": e.workspace,
+                        "indexed": e.indexed,
+                        "files": len(e.graph.file_symbols),
+                        "symbols": len(e.graph.symbols),
+                        "edges": len(e.graph.edges),
+                        "bytes": e.size_bytes,
+                        "hits": e.hits,
+                        "watcher": e.watcher.backend_name if e.watcher else None,
+                        "content_files": e.content.stats()["files"] if e.content else None,
+                    }
+                    # 最近使用的在前
+                    for e in reversed(self._entries.values())
+                ],
+            }
+
+    def _add(self, key: str, indexer: CodeIndexer, indexed: bool = True) -> IndexEntry:
+        entry = IndexEntry(key, indexer, CodeSearcher(indexer.graph), indexed=indexed)
+        if self.watch:
+            watcher = IndexWatcher(indexer, **self.watcher_options)
+            if not indexed:
+                # 代码索引构建后再挂上（见 _index_entry），在此之前只维护快照和内容索引
+                watcher.detach(indexer)
+            # 工作区快照随保存通知更新文件的 stat 信息
+            entry.watcher = watcher.attach(indexer.snapshot).start()
+
+        self._account(entry)
+        with self._lock:
+            self._entries[key] = entry
+            evicted = self._evict(key)
+        for old in evicted:
+            self._release(old)
+        return entry
+
+    @staticmethod
+    def _account(entry: IndexEntry) -> str:
+        """
+        重新估算索引大小（文件监听会持续修改代码图；代码图未变化时沿用上次的估算）
+
+        估算需要持有代码图的锁，调用方不能持有 _lock，否则文件监听更新期间会阻塞整个注册表
+        """
+        graph = entry.graph
+        with graph.lock:
+            version = graph_version(graph)
+            if version != entry.graph_version:
+                entry.graph_bytes = estimate_graph_bytes(graph)
+                entry.graph_version = version
+        entry.size_bytes = entry.graph_bytes
+        if entry.content is not None:
+            entry.size_bytes += entry.content.memory_usage()
+        return entry.workspace
+
+    def _evict(self, keep: str) -> List[IndexEntry]:
+        """按 LRU 淘汰超出数量或内存预算的索引（不淘汰 keep），调用方需持有 _lock"""
+        evicted = []
+        while len(self._entries) > 1:
+            over_count = len(self._entries) > self.max_entries
+            over_budget = (
+                self.memory_budget > 0 and
+                sum(e.size_bytes for e in self._entries.values()) > self.memory_budget
+            )
+            if not over_count and not over_budget:
+                break
+            oldest = next(iter(self._entries))
+            if oldest == keep:
+                break
+            evicted.append(self._entries.pop(oldest))
+            self.evictions += 1
+        return evicted
+
+    @staticmethod
+    def _release(entry: IndexEntry):
+        if entry.watcher is not None:
+            entry.watcher.stop()
+            entry.watcher = None
+        if entry.content is not None:
+            entry.content.save()
+
+
+# 进程内共享的默认注册表
+_default_registry: Optional[IndexRegistry] = None
+_default_lock = threading.Lock()
+
+
+def default_registry() -> IndexRegistry:
+    """获取进程内共享的默认注册表（首次调用时按默认参数创建）"""
+    global _default_registry
+    
+    with _default_lock:
+        if _default_registry is None:
+            _default_registry = IndexRegistry()
+        return _default_registry
+
+
+def set_default_registry(registry: IndexRegistry):
+    """
+    替换默认注册表（服务层按配置创建注册表后调用，使各入口共用同一份常驻索引）
+    
+    原注册表中缓存的索引会被释放
+    """
+    global _default_registry
+    
+    with _default_lock:
+        old, _default_registry = _default_registry, registry
+    if old is not None and old is not registry:
+        old.clear()
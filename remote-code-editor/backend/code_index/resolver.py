@@ -0,0 +1,309 @@
+"""
+调用目标解析
+索引时把 *::name 形式的调用目标解析为具体的符号键：
+依次考虑所在类的方法、本模块的定义、导入的模块，最后按名称全局匹配；
+无法唯一确定时保留按可信度排序的候选列表
+"""
+import os
+import sys
+import json
+import heapq
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from .code_graph import CodeGraph, CodeSymbol, symbol_name_of
+
+
+# 每个调用保留的最多候选数
+MAX_CANDIDATES = 8
+
+
+def short_name(name: str) -> str:
+    """符号名的最后一段（Class.method -> method）"""
+    return name.rsplit(".", 1)[-1]
+
+
+def module_names(file: str) -> List[str]:
+    """
+    文件可能对应的模块名（所有后缀形式）
+
+    pkg/sub/mod.py -> pkg.sub.mod, sub.mod, mod；pkg/__init__.py -> pkg
+    """
+    path = file.replace(os.sep, "/")
+    if path.endswith(".py"):
+        path = path[:-3]
+    parts = [p for p in path.split("/") if p]
+    if parts and parts[-1] == "__init__":
+        parts.pop()
+    return [".".join(parts[i:]) for i in range(len(parts))]
+
+
+class CallResolver:
+    """
+    调用目标解析索引
+
+    挂在 CodeGraph 上作为派生索引：构建时解析全部调用边，之后由索引器在文件变更后调用
+    refresh()，只重新解析变更文件的调用以及被调用名称的定义发生变化的调用。
+    解析结果可以用 snapshot() 随边存储快照持久化，冷启动时由 restore() 恢复，无需重新解析
+    """
+
+    def __init__(
+        self,
+        graph: CodeGraph,
+        resolved: Optional[Dict[str, List[Tuple[str, Tuple[str, ...]]]]] = None
+    ):
+        """
+        Args:
+            graph: 代码图
+            resolved: 已有的解析结果（调用者 -> [(被调用名称, 候选符号键)]），None 时全部解析
+        """
+        self.graph = graph
+        # 符号名最后一段 -> 符号键（按添加顺序）
+        self._by_short_name: Dict[str, Dict[str, None]] = defaultdict(dict)
+        # 模块名（含后缀形式） -> 文件
+        self._modules: Dict[str, Set[str]] = defaultdict(set)
+        self._module_files: Set[str] = set()
+        # 调用者 -> [(被调用名称, 候选符号键)]
+        self._callees: Dict[str, List[Tuple[str, Tuple[str, ...]]]] = {}
+        # 候选符号键 -> 调用者
+        self._callers: Dict[str, Dict[str, None]] = defaultdict(dict)
+        # 文件 -> 其中已解析的调用者
+        self._by_file: Dict[str, Set[str]] = defaultdict(set)
+        # 定义发生变化、需要重新解析的名称
+        self._dirty_names: Set[str] = set()
+        # 每次 refresh() 后递增，供依赖解析结果的缓存判断是否失效
+        self.version = 0
+
+        for key, symbol in graph.symbols.items():
+            self._by_short_name[short_name(symbol.name)][key] = None
+        self._update_modules(graph.file_symbols)
+        if resolved is None:
+            self._resolve_files(list(graph.file_symbols))
+        else:
+            self._load(resolved)
+        self._dirty_names.clear()
+
+    # ===== 持久化 =====
+
+    def snapshot(self) -> bytes:
+        """解析结果的序列化形式"""
+        return json.dumps(
+            [[source, calls] for source, calls in self._callees.items()], ensure_ascii=False
+        ).encode('utf-8')
+
+    @classmethod
+    def restore(cls, graph: CodeGraph, data: bytes) -> 'CallResolver':
+        """
+        从 snapshot() 的结果恢复（代码图须与保存时一致）
+
+        Raises:
+            ValueError: 数据已损坏或引用了代码图中不存在的符号
+        """
+        intern = sys.intern
+        try:
+            resolved = {
+                intern(source): [
+                    (intern(name), tuple(intern(key) for key in candidates))
+                    for name, candidates in calls
+                ]
+                for source, calls in json.loads(data)
+            }
+        except TypeError as e:
+            raise ValueError(f"调用解析快照格式错误: {e}")
+        return cls(graph, resolved)
+
+    def _load(self, resolved: Dict[str, List[Tuple[str, Tuple[str, ...]]]]):
+        symbols = self.graph.symbols
+        for source, calls in resolved.items():
+            for _, candidates in calls:
+                for key in candidates:
+                    if key not in symbols:
+                        raise ValueError(f"调用解析快照与代码图不一致: {key}")
+                    self._callers[key][source] = None
+            self._callees[source] = calls
+            self._by_file[source.split("::", 1)[0]].add(source)
+
+    # ===== 增量维护 =====
+
+    def symbol_added(self, key: str, symbol: CodeSymbol):
+        """符号添加通知"""
+        name = short_name(symbol.name)
+        self._by_short_name[name][key] = None
+        self._dirty_names.add(name)
+
+    def symbol_removed(self, key: str, symbol: CodeSymbol):
+        """符号移除通知"""
+        name = short_name(symbol.name)
+        keys = self._by_short_name.get(name)
+        if keys is not None:
+            keys.pop(key, None)
+            if not keys:
+                del self._by_short_name[name]
+        self._dirty_names.add(name)
+
+    def refresh(self, files: Iterable[str]):
+        """
+        文件变更后重新解析
+
+        Args:
+            files: 重新解析或已删除的文件
+        """
+        files = set(files)
+        self.version += 1
+        self._update_modules(files)
+        self._resolve_files(files)
+
+        # 其他文件中调用了定义发生变化的名称的调用
+        dirty, self._dirty_names = self._dirty_names, set()
+        if dirty:
+            affected = set()
+            for name in dirty:
+                for edge in self.graph.in_edges_by_name.get(name, ()):
+                    if edge.type == "calls" and edge.source.split("::", 1)[0] not in files:
+                        affected.add(edge.source)
+            for source in affected:
+                self._resolve_source(source)
+
+    def _update_modules(self, files: Iterable[str]):
+        for file in files:
+            present = file in self.graph.file_symbols
+            if present == (file in self._module_files):
+                continue
+            for module in module_names(file):
+                if present:
+                    self._modules[module].add(file)
+                else:
+                    self._modules[module].discard(file)
+                    if not self._modules[module]:
+                        del self._modules[module]
+            if present:
+                self._module_files.add(file)
+            else:
+                self._module_files.discard(file)
+
+    def _resolve_files(self, files: Iterable[str]):
+        for file in files:
+            for source in self._by_file.pop(file, ()):
+                self._drop(source)
+            sources = {e.source: None for e in self.graph.get_file_edges(file) if e.type == "calls"}
+            for source in sources:
+                self._resolve_source(source)
+
+    def _drop(self, source: str):
+        for _, candidates in self._callees.pop(source, ()):
+            for key in candidates:
+                callers = self._callers.get(key)
+                if callers is not None:
+                    callers.pop(source, None)
+                    if not callers:
+                        del self._callers[key]
+
+    def _resolve_source(self, source: str):
+        """重新解析某个调用者的所有调用"""
+        self._drop(source)
+        file = source.split("::", 1)[0]
+        calls = []
+        seen = set()
+        for edge in self.graph.out_edges.get(source, ()):
+            if edge.type != "calls":
+                continue
+            name = symbol_name_of(edge.target)
+            if name in seen:
+                continue
+            seen.add(name)
+            candidates = tuple(self.resolve(source, name))
+            calls.append((name, candidates))
+            for key in candidates:
+                self._callers[key][source] = None
+        if calls:
+            self._callees[source] = calls
+            self._by_file[file].add(source)
+
+    # ===== 解析 =====
+
+    def resolve(self, source: str, name: str) -> List[str]:
+        """
+        解析调用目标
+
+        Args:
+            source: 调用者符号键（file::func 或 file::Class.method）
+            name: 被调用的名称
+
+        Returns:
+            按可信度排序的候选符号键
+        """
+        symbols = self.graph.symbols
+        file, qualname = source.split("::", 1)
+        ranked: Dict[str, None] = {}
+
+        # 1. 所在类的方法（self.name()）
+        if "." in qualname:
+            key = f"{file}::{qualname.rsplit('.', 1)[0]}.{name}"
+            if key in symbols:
+                ranked[key] = None
+
+        # 2. 本模块的函数/类
+        key = f"{file}::{name}"
+        if key in symbols:
+            ranked[key] = None
+
+        # 3. 导入的模块中的定义（from mod import name / import mod; mod.name()）
+        for module in self._imported_modules(file, name):
+            for target_file in self._module_files_for(module, file):
+                key = f"{target_file}::{name}"
+                if key in symbols:
+                    ranked[key] = None
+
+        # 4. 按名称全局匹配：同文件、同目录优先，函数/类优先于方法
+        if len(ranked) < MAX_CANDIDATES:
+            directory = os.path.dirname(file)
+            others = heapq.nsmallest(
+                MAX_CANDIDATES - len(ranked),
+                (k for k in self._by_short_name.get(name, ()) if k not in ranked),
+                key=lambda k: (
+                    not k.startswith(f"{file}::"),
+                    os.path.dirname(k.split("::", 1)[0]) != directory,
+                    symbols[k].type == "method",
+                )
+            )
+            for key in others:
+                ranked[key] = None
+
+        return list(ranked)[:MAX_CANDIDATES]
+
+    def _imported_modules(self, file: str, name: str) -> List[str]:
+        """文件中可能提供 name 的导入模块"""
+        modules = []
+        for imported in self.graph.imports_map.get(file, ()):
+            if imported.endswith(f".{name}"):
+                modules.append(imported[:-len(name) - 1])
+            elif imported in self._modules:
+                modules.append(imported)
+        return modules
+
+    def _module_files_for(self, module: str, importer: str) -> List[str]:
+        """模块对应的文件，优先与导入者同目录（相对导入）的文件"""
+        if not module:
+            return []
+        files = self._modules.get(module, ())
+        if len(files) <= 1:
+            return list(files)
+        directory = os.path.dirname(importer)
+        return sorted(files, key=lambda f: (not f.startswith(directory), len(f), f))
+
+    # ===== 查询 =====
+
+    def callees(self, source: str) -> List[Tuple[str, Tuple[str, ...]]]:
+        """调用者的所有调用：[(被调用名称, 候选符号键)]"""
+        return list(self._callees.get(source, ()))
+
+    def callers(self, key: str) -> List[str]:
+        """可能调用某符号的调用者"""
+        return list(self._callers.get(key, ()))
+
+    def definitions(self, name: str) -> List[str]:
+        """名称为 name 或以 .name 结尾的符号键"""
+        return [
+            key for key in self._by_short_name.get(short_name(name), ())
+            if self.graph.symbols[key].name == name or self.graph.symbols[key].name.endswith(f".{name}")
+        ]
@@ -3,9 +3,23 @@
 提供基于代码图的智能搜索功能
 """
 import re
-from typing import List, Dict, Any, Optional
+import functools
+from typing import List, Dict, Any, Iterable, Optional
 from dataclasses import dataclass
 from .code_graph import CodeGraph, CodeSymbol
+from .symbol_index import SymbolIndex, name_initials
+from .text_index import BM25Index
+from .resolver import CallResolver
+from .call_graph import CallGraphIndex
+
+
+def _locked(method):
+    """查询期间持有代码图的锁：文件监听线程会原地更新代码图及其派生索引"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.graph.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
 
 
 @dataclass
@@ -50,47 +64,37 @@ class CodeSearcher:
         Returns:
             搜索结果列表
         """
-        results = []
-        query_lower = query.lower()
+        return self.search_symbols([query], symbol_type, limit)[query]
+    
+    @_locked
+    def search_symbols(
+        self,
+        queries: Iterable[str],
+        symbol_type: Optional[str] = None,
+        limit: int = 20
+    ) -> Dict[str, List[SearchResult]]:
+        """
+        批量搜索符号（一次调用查询多个名称，共用同一个符号索引）
         
-        for key, symbol in self.graph.symbols.items():
-            # 类型过滤
-            if symbol_type and symbol.type != symbol_type:
-                continue
-            
-            name_lower = symbol.name.lower()
-            score = 0
-            match_type = ""
-            
-            # 精确匹配
-            if name_lower == query_lower:
-                score = 100
-                match_type = "exact"
-            # 前缀匹配
-            elif name_lower.startswith(query_lower):
-                score = 80
-                match_type = "prefix"
-            # 包含匹配
-            elif query_lower in name_lower:
-                score = 60
-                match_type = "contains"
-            # 模糊匹配（首字母）
-            elif self._fuzzy_match(query_lower, name_lower):
-                score = 40
-                match_type = "fuzzy"
-            else:
-                continue
+        Args:
+            queries: 搜索词列表（重复的只查询一次）
+            symbol_type: 符号类型过滤 (function/class/method)
+            limit: 每个搜索词的最大返回数量
             
-            results.append(SearchResult(
-                symbol=symbol,
-                score=score,
-                match_type=match_type
-            ))
-        
-        # 按分数排序
-        results.sort(key=lambda r: r.score, reverse=True)
-        return results[:limit]
+        Returns:
+            搜索词 -> 搜索结果列表
+        """
+        index = self.graph.derived_index("symbols", SymbolIndex)
+        symbols = self.graph.symbols
+        return {
+            query: [
+                SearchResult(symbol=symbols[key], score=score, match_type=match_type)
+                for key, score, match_type in index.search(query, symbol_type, limit)
+            ]
+            for query in dict.fromkeys(queries)
+        }
     
+    @_locked
     def search_definition(self, name: str) -> List[CodeSymbol]:
         """
         搜索定义位置
@@ -101,12 +105,19 @@ class CodeSearcher:
         Returns:
             定义符号列表
         """
-        definitions = []
-        for key, symbol in self.graph.symbols.items():
-            if symbol.name == name or symbol.name.endswith(f".{name}"):
-                definitions.append(symbol)
-        return definitions
+        return [self.graph.symbols[key] for key in self._calls().definitions(name)]
     
+    def _calls(self) -> CallResolver:
+        """调用目标解析索引（索引时已构建，这里只是取出）"""
+        return self.graph.derived_index("calls", CallResolver)
+    
+    def _symbol_keys(self, name: str) -> List[str]:
+        """符号名或完整符号键对应的符号键"""
+        if "::" in name:
+            return [name] if name in self.graph.symbols else []
+        return self._calls().definitions(name)
+    
+    @_locked
     def search_references(self, name: str) -> List[Dict[str, Any]]:
         """
         搜索引用
@@ -119,17 +130,24 @@ class CodeSearcher:
         """
         return self.graph.find_references(name)
     
+    @_locked
     def search_callers(self, func_name: str) -> List[Dict[str, Any]]:
         """
         搜索调用者
         
         Args:
-            func_name: 函数名
+            func_name: 函数名、限定名（Class.method）或完整符号键
             
         Returns:
-            调用者信息列表
+            调用者信息列表；能找到定义时按索引时解析的调用目标匹配，
+            否则（如外部函数）按被调用名称匹配
         """
-        callers = self.graph.find_callers(func_name)
+        keys = self._symbol_keys(func_name)
+        if keys:
+            resolver = self._calls()
+            callers = list(dict.fromkeys(caller for key in keys for caller in resolver.callers(key)))
+        else:
+            callers = self.graph.find_callers(func_name)
         results = []
         
         for caller_key in callers:
@@ -144,42 +162,44 @@ class CodeSearcher:
         
         return results
     
+    @_locked
     def search_callees(self, func_name: str) -> List[Dict[str, Any]]:
         """
         搜索被调用函数
         
         Args:
-            func_name: 函数名
+            func_name: 函数名或完整符号键
             
         Returns:
-            被调用函数信息列表
+            被调用函数信息列表；调用目标在索引时已解析，
+            无法唯一确定时 candidates 中按可信度列出全部候选符号键
         """
-        callees = self.graph.find_callees(func_name)
+        resolver = self._calls()
         results = []
         
-        for callee_key in callees:
-            # 尝试解析通配符
-            name = callee_key.split("::")[-1]
-            definitions = self.search_definition(name)
-            
-            if definitions:
-                for d in definitions:
+        for source in self._symbol_keys(func_name):
+            for name, candidates in resolver.callees(source):
+                if candidates:
+                    symbol = self.graph.symbols[candidates[0]]
                     results.append({
-                        "name": d.name,
-                        "file": d.file,
-                        "line": d.line,
-                        "type": d.type
+                        "name": symbol.name,
+                        "file": symbol.file,
+                        "line": symbol.line,
+                        "type": symbol.type,
+                        "key": candidates[0],
+                        "candidates": list(candidates)
+                    })
+                else:
+                    results.append({
+                        "name": name,
+                        "file": "external",
+                        "line": 0,
+                        "type": "unknown"
                     })
-            else:
-                results.append({
-                    "name": name,
-                    "file": "external",
-                    "line": 0,
-                    "type": "unknown"
-                })
         
         return results
     
+    @_locked
     def search_in_file(self, file: str) -> List[CodeSymbol]:
         """
         获取文件中的所有符号
@@ -192,6 +212,7 @@ class CodeSearcher:
         """
         return self.graph.get_file_symbols(file)
     
+    @_locked
     def get_file_outline(self, file: str) -> Dict[str, Any]:
         """
         获取文件大纲
@@ -228,7 +249,7 @@ class CodeSearcher:
                             "line": s.line
                         })
                 outline["classes"].append(class_info)
-            elif symbol.type == "function":
+            elif symbol.type == "function" and symbol.parent is None:
                 outline["functions"].append({
                     "name": symbol.name,
                     "line": symbol.line,
@@ -243,54 +264,40 @@ class CodeSearcher:
         获取调用图
         
         Args:
-            func_name: 起始函数名
+            func_name: 起始函数名或完整符号键
             depth: 深度
             
         Returns:
-            调用图结构
+            调用图结构（沿索引时解析出的最可信调用目标展开，递归调用标记为 cycle）
+        """
+        return self.get_call_graphs([func_name], depth)[func_name]
+    
+    @_locked
+    def get_call_graphs(self, func_names: Iterable[str], depth: int = 2) -> Dict[str, Dict[str, Any]]:
         """
-        visited = set()
+        批量获取调用图（重叠的子图只计算一次，并在请求之间缓存）
         
-        def build_tree(name: str, current_depth: int) -> Dict[str, Any]:
-            if current_depth > depth or name in visited:
-                return {"name": name, "calls": []}
-            
-            visited.add(name)
-            callees = self.search_callees(name)
+        Args:
+            func_names: 起始函数名或完整符号键列表
+            depth: 深度
             
-            return {
-                "name": name,
-                "calls": [
-                    build_tree(c["name"], current_depth + 1)
-                    for c in callees
-                    if c["name"] not in visited
-                ]
-            }
-        
-        return build_tree(func_name, 0)
+        Returns:
+            函数名 -> 调用图结构
+        """
+        index = self.graph.derived_index("call_graph", CallGraphIndex)
+        return index.trees(
+            ((name, self._symbol_keys(name)) for name in dict.fromkeys(func_names)),
+            depth
+        )
     
     def _fuzzy_match(self, query: str, target: str) -> bool:
         """模糊匹配（驼峰/下划线首字母）"""
-        # 提取目标的首字母
-        initials = ""
-        prev_lower = True
-        for c in target:
-            if c == '_':
-                prev_lower = True
-            elif c.isupper() and prev_lower:
-                initials += c.lower()
-                prev_lower = False
-            elif prev_lower and c.isalpha():
-                initials += c.lower()
-                prev_lower = c.islower()
-            else:
-                prev_lower = c.islower()
-        
-        return query in initials
+        return query in name_initials(target)
     
+    @_locked
     def semantic_search(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
         """
-        语义搜索（基于文档字符串）
+        语义搜索（基于名称、文档字符串和签名的 BM25 全文检索）
         
         Args:
             query: 搜索词
@@ -299,44 +306,30 @@ class CodeSearcher:
         Returns:
             搜索结果
         """
+        index = self.graph.derived_index("fulltext", BM25Index)
         results = []
-        query_lower = query.lower()
         
-        for key, symbol in self.graph.symbols.items():
-            score = 0
-            
-            # 检查名称
-            if query_lower in symbol.name.lower():
-                score += 50
-            
-            # 检查文档字符串
-            if symbol.docstring:
-                if query_lower in symbol.docstring.lower():
-                    score += 30
-            
-            # 检查签名
-            if symbol.signature and query_lower in symbol.signature.lower():
-                score += 20
-            
-            if score > 0:
-                results.append({
-                    "name": symbol.name,
-                    "type": symbol.type,
-                    "file": symbol.file,
-                    "line": symbol.line,
-                    "score": score,
-                    "docstring": symbol.docstring
-                })
+        for key, score in index.search(query, limit):
+            symbol = self.graph.symbols[key]
+            results.append({
+                "name": symbol.name,
+                "type": symbol.type,
+                "file": symbol.file,
+                "line": symbol.line,
+                "score": round(score, 4),
+                "docstring": symbol.docstring
+            })
         
-        results.sort(key=lambda r: r["score"], reverse=True)
-        return results[:limit]
+        return results
 
 
 # ===== 便捷函数 =====
+# 通过进程内共享的索引注册表提供服务：首次调用时（从持久化存储）加载索引，
+# 之后由文件监听保持最新，每次查询只访问常驻内存的索引
 
-def create_searcher(workspace_path):
+def create_searcher(workspace_path) -> CodeSearcher:
     """
-    创建代码搜索器（自动索引）
+    获取工作区的代码搜索器（共享的常驻索引，未缓存时自动索引）
     
     Args:
         workspace_path: 工作区路径
@@ -344,11 +337,21 @@ def create_searcher(workspace_path):
     Returns:
         CodeSearcher 实例
     """
-    from .indexer import CodeIndexer
+    from .registry import default_registry
     
-    indexer = CodeIndexer(workspace_path)
-    graph = indexer.index()
-    return CodeSearcher(graph)
+    return default_registry().get(str(workspace_path)).searcher
+
+
+def search_result_dict(result: SearchResult) -> Dict[str, Any]:
+    """搜索结果转换为字典"""
+    return {
+        "name": result.symbol.name,
+        "type": result.symbol.type,
+        "file": result.symbol.file,
+        "line": result.symbol.line,
+        "signature": result.symbol.signature,
+        "match_type": result.match_type
+    }
 
 
 def search(symbol_name: str, workspace_path = None) -> List[Dict[str, Any]]:
@@ -362,26 +365,32 @@ def search(symbol_name: str, workspace_path = None) -> List[Dict[str, Any]]:
     Returns:
         搜索结果列表
     """
+    return search_many([symbol_name], workspace_path).get(symbol_name, [])
+
+
+def search_many(symbol_names: Iterable[str], workspace_path = None) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    批量搜索符号（便捷函数）
+    
+    Args:
+        symbol_names: 符号名称列表
+        workspace_path: 工作区路径
+    
+    Returns:
+        符号名称 -> 搜索结果列表
+    """
     if workspace_path is None:
-        return []
+        return {}
     
     try:
         searcher = create_searcher(workspace_path)
-        results = searcher.search_symbol(symbol_name)
-        
-        return [
-            {
-                "name": r.symbol.name,
-                "type": r.symbol.type,
-                "file": r.symbol.file,
-                "line": r.symbol.line,
-                "signature": r.symbol.signature,
-                "match_type": r.match_type
-            }
-            for r in results
-        ]
+        return {
+            name: [search_result_dict(r) for r in results]
+            for name, results in searcher.search_symbols(symbol_names).items()
+        }
     except Exception as e:
-        return []
+        print(f"搜索符号失败 {workspace_path}: {e}")
+        return {}
 
 
 def get_references(file_path: str, symbol_name: str, workspace_path = None) -> List[Dict[str, Any]]:
@@ -406,13 +415,14 @@ def get_references(file_path: str, symbol_name: str, workspace_path = None) -> L
         # 过滤当前文件的引用
         return [
             {
-                "name": r["name"],
+                "name": symbol_name,
                 "file": r["file"],
                 "line": r["line"],
-                "context": r.get("context", "")
+                "type": r["type"]
             }
             for r in refs
             if file_path in r.get("file", "")
         ]
     except Exception as e:
+        print(f"获取引用失败 {workspace_path}: {e}")
         return []
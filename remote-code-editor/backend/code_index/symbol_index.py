@@ -0,0 +1,220 @@
+"""
+符号名搜索索引
+为符号搜索预先构建：小写名称有序数组（前缀二分查找）、三元组倒排索引（包含匹配）
+以及驼峰/下划线首字母表（模糊匹配），查询结果通过有界堆取前 k 个
+"""
+import re
+import heapq
+import itertools
+from bisect import bisect_left, insort
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from .code_graph import CodeGraph, CodeSymbol
+
+
+# 匹配分数（与匹配类型一一对应，按优先级排列）
+EXACT_SCORE = 100
+PREFIX_SCORE = 80
+CONTAINS_SCORE = 60
+FUZZY_SCORE = 40
+
+# 单词切分：HTTPServer -> HTTP, Server；getUserName -> get, User, Name
+_WORD_RE = re.compile(r'[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+')
+
+
+def split_identifier(name: str) -> List[str]:
+    """按驼峰/下划线拆分标识符（保留原始大小写）"""
+    return _WORD_RE.findall(name)
+
+
+def name_initials(name: str) -> str:
+    """提取驼峰/下划线命名中每个单词的首字母（小写）"""
+    return "".join(word[0].lower() for word in split_identifier(name) if word[0].isalpha())
+
+
+def trigrams(text: str) -> Set[str]:
+    """提取字符串的所有三元组"""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class _Entry:
+    """单个符号的索引条目"""
+    __slots__ = ('seq', 'key', 'name', 'type')
+
+    def __init__(self, seq: int, key: str, name: str, type: str):
+        self.seq = seq          # 插入序号，同分结果按插入顺序排列
+        self.key = key
+        self.name = name        # 小写名称
+        self.type = type
+
+
+class SymbolIndex:
+    """
+    符号名搜索索引
+
+    挂在 CodeGraph 上作为派生索引，随符号增删增量维护。
+    三元组和首字母表以去重后的名称为单位建立，同名符号（如 __init__、run）只计算一次
+    """
+
+    def __init__(self, graph: CodeGraph):
+        self._seq = itertools.count()
+        self._entries: Dict[str, _Entry] = {}
+        # 小写名称 -> 符号键
+        self._by_name: Dict[str, Set[str]] = {}
+        # (小写名称, 序号, 符号键) 有序数组
+        self._sorted: List[Tuple[str, int, str]] = []
+        # 三元组 -> 小写名称
+        self._trigrams: Dict[str, Set[str]] = defaultdict(set)
+        # 首字母 -> 原始名称；原始名称 -> 符号键
+        self._initials: Dict[str, Set[str]] = defaultdict(set)
+        self._by_raw_name: Dict[str, Set[str]] = {}
+
+        for key, symbol in graph.symbols.items():
+            self._add(key, symbol)
+        self._sorted = sorted((e.name, e.seq, e.key) for e in self._entries.values())
+
+    # ===== 增量维护 =====
+
+    def symbol_added(self, key: str, symbol: CodeSymbol):
+        """符号添加通知"""
+        entry = self._add(key, symbol)
+        insort(self._sorted, (entry.name, entry.seq, key))
+
+    def symbol_removed(self, key: str, symbol: CodeSymbol):
+        """符号移除通知"""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+
+        item = (entry.name, entry.seq, key)
+        pos = bisect_left(self._sorted, item)
+        if pos < len(self._sorted) and self._sorted[pos] == item:
+            del self._sorted[pos]
+
+        if self._discard(self._by_name, entry.name, key):
+            for gram in trigrams(entry.name):
+                self._discard(self._trigrams, gram, entry.name)
+        if self._discard(self._by_raw_name, symbol.name, key):
+            self._discard(self._initials, name_initials(symbol.name), symbol.name)
+
+    def _add(self, key: str, symbol: CodeSymbol) -> _Entry:
+        raw_name = symbol.name
+        name = raw_name.lower()
+        entry = _Entry(next(self._seq), key, name, symbol.type)
+        self._entries[key] = entry
+
+        keys = self._by_name.get(name)
+        if keys is None:
+            keys = self._by_name[name] = set()
+            tri = self._trigrams
+            for gram in trigrams(name):
+                tri[gram].add(name)
+        keys.add(key)
+
+        keys = self._by_raw_name.get(raw_name)
+        if keys is None:
+            keys = self._by_raw_name[raw_name] = set()
+            self._initials[name_initials(raw_name)].add(raw_name)
+        keys.add(key)
+        return entry
+
+    @staticmethod
+    def _discard(index: Dict[str, Set[str]], value: str, item: str) -> bool:
+        """从倒排表中移除一项，返回该值的倒排表是否因此变空"""
+        items = index.get(value)
+        if items is None:
+            return False
+        items.discard(item)
+        if not items:
+            del index[value]
+            return True
+        return False
+
+    # ===== 查询 =====
+
+    def search(
+        self,
+        query: str,
+        symbol_type: Optional[str] = None,
+        limit: int = 20
+    ) -> List[Tuple[str, int, str]]:
+        """
+        搜索符号
+
+        依次取精确、前缀、包含、首字母模糊匹配，同一档内按插入顺序排列，
+        凑够 limit 个即停止
+
+        Returns:
+            [(符号键, 分数, 匹配类型)]
+        """
+        q = query.lower()
+        if limit <= 0 or not q:
+            return []
+
+        # 查询过短无法使用三元组时，包含匹配按插入顺序扫描，可直接截断
+        short = len(q) < 3
+        results: List[Tuple[str, int, str]] = []
+        tiers = (
+            (EXACT_SCORE, "exact", self._exact_candidates, False),
+            (PREFIX_SCORE, "prefix", self._prefix_candidates, False),
+            (CONTAINS_SCORE, "contains",
+             self._scan_contains_candidates if short else self._contains_candidates, short),
+            (FUZZY_SCORE, "fuzzy", self._fuzzy_candidates, False),
+        )
+        for score, match_type, candidates, ordered in tiers:
+            remaining = limit - len(results)
+            if remaining <= 0:
+                break
+            entries = (
+                e for e in candidates(q)
+                if not symbol_type or e.type == symbol_type
+            )
+            if ordered:
+                top = itertools.islice(entries, remaining)
+            else:
+                top = heapq.nsmallest(remaining, entries, key=lambda e: e.seq)
+            for entry in top:
+                results.append((entry.key, score, match_type))
+
+        return results
+
+    def _exact_candidates(self, q: str) -> Iterable[_Entry]:
+        return [self._entries[k] for k in self._by_name.get(q, ())]
+
+    def _entries_of(self, index: Dict[str, Set[str]], names: Iterable[str]) -> Iterable[_Entry]:
+        for name in names:
+            for key in index[name]:
+                yield self._entries[key]
+
+    def _prefix_candidates(self, q: str) -> Iterable[_Entry]:
+        start = bisect_left(self._sorted, (q,))
+        for pos in range(start, len(self._sorted)):
+            name, _, key = self._sorted[pos]
+            if not name.startswith(q):
+                break
+            if name != q:
+                yield self._entries[key]
+
+    def _scan_contains_candidates(self, q: str) -> Iterable[_Entry]:
+        # 条目按插入顺序存放，产出顺序即结果顺序
+        return (
+            e for e in self._entries.values()
+            if q in e.name and not e.name.startswith(q)
+        )
+
+    def _contains_candidates(self, q: str) -> Iterable[_Entry]:
+        postings = sorted((self._trigrams.get(g, set()) for g in trigrams(q)), key=len)
+        names = postings[0].intersection(*postings[1:])
+        return self._entries_of(
+            self._by_name,
+            (n for n in names if q in n and not n.startswith(q))
+        )
+
+    def _fuzzy_candidates(self, q: str) -> Iterable[_Entry]:
+        for initials, raw_names in self._initials.items():
+            if q in initials:
+                yield from self._entries_of(
+                    self._by_raw_name,
+                    (n for n in raw_names if q not in n.lower())
+                )
@@ -0,0 +1,143 @@
+"""
+全文检索索引
+对符号名称、文档字符串和签名分字段建立倒排索引，按 BM25 打分排序
+"""
+import re
+import math
+import heapq
+from collections import defaultdict, Counter
+from typing import Dict, List, Tuple
+
+from .code_graph import CodeGraph, CodeSymbol
+from .symbol_index import split_identifier
+
+
+# BM25 参数
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# 字段及权重：名称命中比文档和签名命中更重要
+FIELD_WEIGHTS = {
+    "name": 3.0,
+    "docstring": 1.0,
+    "signature": 1.5,
+}
+
+# 标识符 / 数字 / 中日韩文字
+_TOKEN_RE = re.compile(r'[A-Za-z_][A-Za-z0-9_]*|\d+|[\u3400-\u9fff\uf900-\ufaff]+')
+_CJK_RE = re.compile(r'[\u3400-\u9fff\uf900-\ufaff]')
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    分词
+
+    标识符按驼峰/下划线拆分（getUserName -> get, user, name），并保留整体作为一个词；
+    中文按相邻二字切分
+    """
+    tokens = []
+    for match in _TOKEN_RE.finditer(text):
+        token = match.group()
+        if _CJK_RE.match(token):
+            if len(token) == 1:
+                tokens.append(token)
+            else:
+                tokens.extend(token[i:i + 2] for i in range(len(token) - 1))
+            continue
+
+        parts = [p.lower() for p in split_identifier(token)]
+        tokens.extend(parts)
+        whole = token.lower().strip('_')
+        if len(parts) > 1 and whole:
+            tokens.append(whole)
+    return tokens
+
+
+class _FieldIndex:
+    """单个字段的倒排索引"""
+
+    def __init__(self):
+        self.postings: Dict[str, Dict[str, int]] = defaultdict(dict)  # 词 -> {符号键: 词频}
+        self.lengths: Dict[str, int] = {}                              # 符号键 -> 字段长度
+        self.total_length = 0
+
+    def add(self, key: str, tokens: List[str]):
+        if not tokens:
+            return
+        for term, tf in Counter(tokens).items():
+            self.postings[term][key] = tf
+        self.lengths[key] = len(tokens)
+        self.total_length += len(tokens)
+
+    def remove(self, key: str, tokens: List[str]):
+        if key not in self.lengths:
+            return
+        for term in set(tokens):
+            docs = self.postings.get(term)
+            if docs is not None:
+                docs.pop(key, None)
+                if not docs:
+                    del self.postings[term]
+        self.total_length -= self.lengths.pop(key)
+
+
+class BM25Index:
+    """
+    符号全文检索索引
+
+    挂在 CodeGraph 上作为派生索引，随符号增删增量维护
+    """
+
+    def __init__(self, graph: CodeGraph):
+        self.fields: Dict[str, _FieldIndex] = {name: _FieldIndex() for name in FIELD_WEIGHTS}
+        self.doc_count = 0
+        for key, symbol in graph.symbols.items():
+            self.symbol_added(key, symbol)
+
+    @staticmethod
+    def _field_tokens(symbol: CodeSymbol) -> Dict[str, List[str]]:
+        return {
+            "name": tokenize(symbol.name),
+            "docstring": tokenize(symbol.docstring or ""),
+            "signature": tokenize(symbol.signature or ""),
+        }
+
+    def symbol_added(self, key: str, symbol: CodeSymbol):
+        """符号添加通知"""
+        for field, tokens in self._field_tokens(symbol).items():
+            self.fields[field].add(key, tokens)
+        self.doc_count += 1
+
+    def symbol_removed(self, key: str, symbol: CodeSymbol):
+        """符号移除通知"""
+        for field, tokens in self._field_tokens(symbol).items():
+            self.fields[field].remove(key, tokens)
+        self.doc_count -= 1
+
+    def search(self, query: str, limit: int = 10) -> List[Tuple[str, float]]:
+        """
+        检索
+
+        Returns:
+            [(符号键, BM25 分数)]，按分数降序
+        """
+        terms = set(tokenize(query))
+        if not terms or self.doc_count <= 0:
+            return []
+
+        scores: Dict[str, float] = defaultdict(float)
+        for field, weight in FIELD_WEIGHTS.items():
+            index = self.fields[field]
+            if not index.lengths:
+                continue
+            avg_length = index.total_length / len(index.lengths)
+            for term in terms:
+                docs = index.postings.get(term)
+                if not docs:
+                    continue
+                idf = math.log(1 + (self.doc_count - len(docs) + 0.5) / (len(docs) + 0.5))
+                for key, tf in docs.items():
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * index.lengths[key] / avg_length)
+                    scores[key] += weight * idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+        return heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
@@ -0,0 +1,375 @@
+"""
+索引文件监听
+监听工作区文件变化，去抖后只重新索引被改动的文件，保持内存中的代码图实时更新。
+Linux 下使用 inotify，其他平台退化为按 mtime 轮询
+"""
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import threading
+import ctypes
+import ctypes.util
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from .indexer import CodeIndexer
+from .workspace_snapshot import IGNORE_FILES, walk_workspace
+
+
+# inotify 事件掩码
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+
+_WATCH_MASK = (
+    IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE |
+    IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+)
+_EVENT_HEADER = struct.Struct('iIII')
+
+
+class _InotifyBackend:
+    """
+    基于 inotify 的事件源（仅 Linux）
+
+    只监听未被忽略的目录（与工作区快照相同的 .gitignore / .ignore 规则）；
+    规则文件变化后重新遍历所在目录，补充监听重新包含的子目录
+    """
+
+    def __init__(self, root: Path, is_ignored: Callable[[str, bool], bool]):
+        """
+        Args:
+            root: 工作区根目录
+            is_ignored: (相对工作区的路径, 是否为目录) -> 是否被忽略
+        """
+        libc_name = ctypes.util.find_library('c') or 'libc.so.6'
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self._root = root
+        self._is_ignored = is_ignored
+        self._watches: Dict[int, Path] = {}
+
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | getattr(os, 'O_CLOEXEC', 0))
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        try:
+            self._watch_tree(root)
+        except OSError:
+            self.close()
+            raise
+
+    def _watch_tree(self, root: Path):
+        """递归添加目录监听（跳过被忽略的目录，已监听的目录重复添加无副作用）"""
+        under = os.path.relpath(root, self._root)
+        for key, _, _ in walk_workspace(self._root, "" if under == os.curdir else under):
+            dirpath = self._root / key if key else self._root
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(dirpath), _WATCH_MASK)
+            if wd < 0:
+                err = ctypes.get_errno()
+                if err in (errno.ENOSPC, errno.ENOMEM):
+                    raise OSError(err, "inotify 监听数量已达上限")
+                continue  # 目录已被删除或无权限
+            self._watches[wd] = dirpath
+
+    def poll(self, timeout: float) -> Tuple[List[str], bool]:
+        """
+        等待事件
+
+        Returns:
+            (变更路径列表, 是否需要全量重新扫描)
+        """
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return [], False
+
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return [], False
+
+        paths: List[str] = []
+        rescan = False
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                rescan = True
+                continue
+            if mask & IN_IGNORED:
+                self._watches.pop(wd, None)
+                continue
+
+            directory = self._watches.get(wd)
+            if directory is None:
+                continue
+            path = directory / os.fsdecode(name) if name else directory
+            if name and self._is_ignored(os.path.relpath(path, self._root), bool(mask & IN_ISDIR)):
+                continue
+            paths.append(str(path))
+
+            # 新建/移入的目录需要补充监听；忽略规则变化后重新包含的目录也是
+            if name and mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                target = path
+            elif name and os.fsdecode(name) in IGNORE_FILES:
+                target = directory
+            else:
+                continue
+            try:
+                self._watch_tree(target)
+            except OSError:
+                rescan = True
+
+        return paths, rescan
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+class _PollingBackend:
+    """按固定间隔触发增量扫描（依赖索引器的 mtime/大小指纹判断变化）"""
+
+    def __init__(self, interval: float):
+        self._interval = interval
+        self._next_scan = time.monotonic() + interval
+
+    def poll(self, timeout: float) -> Tuple[List[str], bool]:
+        time.sleep(timeout)
+        now = time.monotonic()
+        if now >= self._next_scan:
+            self._next_scan = now + self._interval
+            return [], True
+        return [], False
+
+    def close(self):
+        pass
+
+
+class IndexWatcher:
+    """
+    索引文件监听器
+
+    在后台线程中收集文件变化事件，最后一个事件之后静默 debounce 秒再统一更新索引；
+    保存文件的调用方也可以通过 notify() 直接通知，无需等待文件系统事件
+    """
+
+    # 事件循环的最长等待时间（秒）
+    TICK = 0.1
+
+    def __init__(
+        self,
+        indexer: CodeIndexer,
+        debounce: float = 0.3,
+        poll_interval: float = 5.0,
+        use_inotify: bool = True
+    ):
+        """
+        初始化监听器
+
+        Args:
+            indexer: 要保持更新的索引器（其代码图会被原地更新）
+            debounce: 去抖时间（秒）
+            poll_interval: 轮询模式下的扫描间隔（秒）
+            use_inotify: 是否优先使用 inotify
+        """
+        self.indexer = indexer
+        self.workspace = indexer.workspace
+        # 需要随文件变化更新的索引（需提供 update_paths() 和 index(incremental=True)）
+        self.targets: List = [indexer]
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify
+        self.backend_name = ""
+
+        self._pending: Set[str] = set()
+        self._rescan = False
+        self._last_event = 0.0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._backend = None
+
+    def start(self) -> 'IndexWatcher':
+        """启动后台监听线程"""
+        if self._thread is not None:
+            return self
+
+        self._backend = self._create_backend()
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name=f"index-watcher:{self.workspace.name}", daemon=True
+        )
+        self._thread.start()
+        _register(self)
+        return self
+
+    def stop(self):
+        """停止监听并处理剩余事件"""
+        _unregister(self)
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        if self._backend is not None:
+            self._backend.close()
+            self._backend = None
+        self.flush()
+
+    def attach(self, target) -> 'IndexWatcher':
+        """追加一个随文件变化更新的索引（如内容索引），与代码索引共用事件源和去抖"""
+        with self._lock:
+            if target not in self.targets:
+                self.targets = self.targets + [target]
+        return self
+
+    def detach(self, target) -> 'IndexWatcher':
+        """移除随文件变化更新的索引"""
+        with self._lock:
+            self.targets = [t for t in self.targets if t is not target]
+        return self
+
+    def notify(self, path: str):
+        """通知某个路径已变化"""
+        with self._lock:
+            self._pending.add(str(path))
+            self._last_event = time.monotonic()
+
+    def flush(self):
+        """立即处理所有待更新的路径"""
+        with self._lock:
+            paths, self._pending = self._pending, set()
+            rescan, self._rescan = self._rescan, False
+            targets = self.targets
+
+        if not (rescan or paths):
+            return
+        # 文件系统事件（保存通知已在 notify_file_changed 中立即分发过，重复失效无副作用）
+        _notify_listeners([Path(p) for p in sorted(paths)])
+        for target in targets:
+            try:
+                if rescan:
+                    target.index(incremental=True)
+                else:
+                    target.update_paths(sorted(paths))
+            except Exception as e:
+                print(f"更新索引失败 {self.workspace}: {e}")
+
+    def _create_backend(self):
+        if self.use_inotify and sys.platform.startswith('linux'):
+            try:
+                backend = _InotifyBackend(self.workspace, self.indexer.snapshot.is_ignored)
+                self.backend_name = "inotify"
+                return backend
+            except (OSError, AttributeError) as e:
+                print(f"inotify 不可用，改为轮询: {e}")
+        self.backend_name = "polling"
+        return _PollingBackend(self.poll_interval)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                paths, rescan = self._backend.poll(self.TICK)
+            except (OSError, ValueError) as e:
+                if self._stop.is_set():
+                    break
+                # 事件源失效（如 inotify 描述符出错）：改为轮询，并全量扫描一次补上可能丢失的事件
+                print(f"文件监听出错，改为轮询 {self.workspace}: {e}")
+                self._backend.close()
+                self._backend = _PollingBackend(self.poll_interval)
+                self.backend_name = "polling"
+                paths, rescan = [], True
+
+            if paths or rescan:
+                with self._lock:
+                    self._pending.update(paths)
+                    self._rescan = self._rescan or rescan
+                    self._last_event = time.monotonic()
+
+            with self._lock:
+                due = (
+                    (self._pending or self._rescan)
+                    and time.monotonic() - self._last_event >= self.debounce
+                )
+            if due:
+                self.flush()
+
+
+# ===== 全局通知 =====
+
+_watchers: List[IndexWatcher] = []
+_watchers_lock = threading.Lock()
+
+# 变更监听函数：参数为变化的绝对路径（保存通知和文件系统事件都会触发）
+_listeners: List[Callable[[Path], None]] = []
+
+
+def add_change_listener(listener: Callable[[Path], None]):
+    """注册变更监听函数（如目录列表缓存的失效）"""
+    with _watchers_lock:
+        if listener not in _listeners:
+            _listeners.append(listener)
+
+
+def remove_change_listener(listener: Callable[[Path], None]):
+    with _watchers_lock:
+        if listener in _listeners:
+            _listeners.remove(listener)
+
+
+def _notify_listeners(paths: Iterable[Path]):
+    with _watchers_lock:
+        listeners = list(_listeners)
+    for listener in listeners:
+        for path in paths:
+            try:
+                listener(path)
+            except Exception as e:
+                print(f"变更监听函数执行失败 {path}: {e}")
+
+
+def _register(watcher: IndexWatcher):
+    with _watchers_lock:
+        if watcher not in _watchers:
+            _watchers.append(watcher)
+
+
+def _unregister(watcher: IndexWatcher):
+    with _watchers_lock:
+        if watcher in _watchers:
+            _watchers.remove(watcher)
+
+
+def notify_file_changed(path) -> None:
+    """
+    通知文件已变化（保存/写入/删除/重命名后调用）
+
+    路径所在工作区的所有监听器都会收到通知
+    """
+    try:
+        resolved = Path(path).resolve()
+    except OSError:
+        return
+
+    _notify_listeners([resolved])
+    with _watchers_lock:
+        watchers = list(_watchers)
+    for watcher in watchers:
+        try:
+            resolved.relative_to(watcher.workspace)
+        except ValueError:
+            continue
+        watcher.notify(str(resolved))
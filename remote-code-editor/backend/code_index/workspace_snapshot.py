@@ -0,0 +1,554 @@
+"""
+工作区文件快照
+用 os.scandir 遍历工作区并按 .gitignore / .ignore 规则过滤，缓存每个目录的文件列表和 stat 信息。
+再次刷新时只重新列出 mtime 变化的目录（忽略规则文件变化时重新过滤其下的整个子树），
+代码索引、内容索引和工作区文件列表共用同一份快照
+"""
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+from .index_store import INDEX_DIR_NAME
+
+
+# 默认忽略的目录（优先级最低，可被 .gitignore 中的 ! 规则重新包含）
+DEFAULT_IGNORE_DIRS = frozenset({
+    '.git', '.hg', '.svn', '__pycache__', 'node_modules', '.venv', 'venv',
+    'dist', 'build', '.eggs', '*.egg-info', '.tox', '.mypy_cache',
+    '.idea', '.vscode', INDEX_DIR_NAME
+})
+
+# 读取忽略规则的文件（后者优先）
+IGNORE_FILES = ('.gitignore', '.ignore')
+
+# 目录 mtime 距列出时间小于该值（纳秒）时，下次刷新仍重新列出（文件系统时间戳精度有限）
+RACY_NS = 2 * 10**9
+
+# 进程内最多缓存的快照数
+MAX_SNAPSHOTS = 16
+
+
+def _translate(pattern: str) -> str:
+    """gitignore 通配符转换为正则（* 和 ? 不匹配 /，** 可跨目录）"""
+    out: List[str] = []
+    i, n = 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if c == '*':
+            if pattern.startswith('**', i) and (i == 0 or pattern[i - 1] == '/'):
+                if i + 2 == n:
+                    out.append('.*')
+                    i += 2
+                    continue
+                if pattern[i + 2] == '/':
+                    out.append('(?:.*/)?')
+                    i += 3
+                    continue
+            while i < n and pattern[i] == '*':
+                i += 1
+            out.append('[^/]*')
+            continue
+        if c == '?':
+            out.append('[^/]')
+        elif c == '[':
+            j = i + 1
+            if j < n and pattern[j] in '!^':
+                j += 1
+            if j < n and pattern[j] == ']':
+                j += 1
+            j = pattern.find(']', j)
+            if j < 0:
+                out.append(re.escape(c))
+            else:
+                body = pattern[i + 1:j].replace('\\', '\\\\')
+                if body[:1] in ('!', '^'):
+                    body = '^' + body[1:]
+                out.append('[' + body + ']')
+                i = j
+        elif c == '\\' and i + 1 < n:
+            i += 1
+            out.append(re.escape(pattern[i]))
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return ''.join(out)
+
+
+def compile_glob(pattern: str) -> re.Pattern:
+    """相对路径通配符编译为匹配整个路径的正则（* 和 ? 不匹配 /，** 可跨目录）"""
+    return re.compile(_translate(pattern.lstrip('/')) + r'\Z', re.DOTALL)
+
+
+class IgnoreRule:
+    """单条忽略规则"""
+    __slots__ = ('regex', 'negate', 'dir_only', 'anchored', 'literal')
+
+    def __init__(self, regex: re.Pattern, negate: bool, dir_only: bool, anchored: bool, literal: Optional[str] = None):
+        self.regex = regex
+        self.negate = negate
+        self.dir_only = dir_only
+        # 含 / 的规则相对规则文件所在目录匹配，否则匹配任意层级的文件名
+        self.anchored = anchored
+        # 不含通配符时为规则本身
+        self.literal = literal
+
+
+class IgnoreRules:
+    """一个目录下的忽略规则（gitignore 语法，后出现的规则优先）"""
+
+    def __init__(self, rules: List[IgnoreRule]):
+        self.rules = rules
+        # 没有 ! 规则时与顺序无关：不含通配符的文件名规则改用集合判断
+        self._names: Optional[Set[str]] = None
+        self._dir_names: Set[str] = set()
+        self._patterns = rules
+        if not any(rule.negate for rule in rules):
+            self._names = set()
+            self._patterns = []
+            for rule in rules:
+                if rule.literal is not None and not rule.anchored:
+                    (self._dir_names if rule.dir_only else self._names).add(rule.literal)
+                else:
+                    self._patterns.append(rule)
+
+    @classmethod
+    def parse(cls, lines: Iterable[str]) -> 'IgnoreRules':
+        rules: List[IgnoreRule] = []
+        for line in lines:
+            line = line.rstrip('\n').rstrip('\r')
+            if not line or line.startswith('#'):
+                continue
+            # 末尾未转义的空格无效
+            stripped = line.rstrip(' ')
+            if stripped.endswith('\\') and len(stripped) < len(line):
+                stripped += ' '
+            line = stripped
+            negate = line.startswith('!')
+            if negate:
+                line = line[1:]
+            elif line.startswith('\\!') or line.startswith('\\#'):
+                line = line[1:]
+            dir_only = line.endswith('/')
+            line = line.rstrip('/')
+            if not line:
+                continue
+            anchored = '/' in line
+            line = line.lstrip('/')
+            try:
+                regex = re.compile(_translate(line), re.DOTALL)
+            except re.error:
+                continue
+            literal = line if not any(c in line for c in '*?[\\') else None
+            rules.append(IgnoreRule(regex, negate, dir_only, anchored, literal))
+        return cls(rules)
+
+    @classmethod
+    def load(cls, directory: Union[str, Path]) -> Optional['IgnoreRules']:
+        """读取目录下的 .gitignore / .ignore，没有规则时返回 None"""
+        lines: List[str] = []
+        for name in IGNORE_FILES:
+            try:
+                with open(os.path.join(directory, name), 'r', encoding='utf-8', errors='ignore') as f:
+                    lines.extend(f)
+            except OSError:
+                continue
+        rules = cls.parse(lines)
+        return rules if rules.rules else None
+
+    def match(self, rel_path: str, is_dir: bool) -> Optional[bool]:
+        """
+        路径（相对规则所在目录，/ 分隔）是否被忽略
+
+        Returns:
+            True 忽略，False 被 ! 规则重新包含，None 没有规则匹配
+        """
+        name = rel_path.rpartition('/')[2]
+        if self._names is not None and (name in self._names or (is_dir and name in self._dir_names)):
+            return True
+        for rule in reversed(self._patterns):
+            if rule.dir_only and not is_dir:
+                continue
+            if rule.regex.fullmatch(rel_path if rule.anchored else name):
+                return not rule.negate
+        return None
+
+
+DEFAULT_RULES = IgnoreRules.parse(f"{name}/" for name in sorted(DEFAULT_IGNORE_DIRS))
+
+# 规则栈: [(规则所在目录的相对路径（/ 分隔）, 规则)]，由外到内
+RuleStack = List[Tuple[str, IgnoreRules]]
+
+
+def _is_ignored(stack: RuleStack, rel_path: str, is_dir: bool) -> bool:
+    for base, rules in reversed(stack):
+        result = rules.match(rel_path[len(base) + 1:] if base else rel_path, is_dir)
+        if result is not None:
+            return result
+    return False
+
+
+def walk_workspace(
+    workspace: Union[str, Path], under: str = ""
+) -> Iterator[Tuple[str, List[str], List[str]]]:
+    """
+    按忽略规则逐个目录遍历（先序，名称排序），产出 (目录相对路径, 子目录名, 文件名)
+
+    与快照使用相同的规则但不缓存，随取随列：适合只需遍历一次、不应等待整个快照建好的场景。
+    与 os.walk 相同，可在产出后原地修改子目录名列表以跳过部分子目录
+    """
+    root = Path(workspace)
+    under = os.path.normpath(under) if under else ""
+    if under == ".":
+        under = ""
+    stack: RuleStack = [("", DEFAULT_RULES)]
+    parts = Path(under).parts
+    for i in range(len(parts)):
+        parent = '/'.join(parts[:i])
+        rules = IgnoreRules.load(root / parent if parent else root)
+        if rules is not None:
+            stack.append((parent, rules))
+
+    pending: List[Tuple[str, RuleStack]] = [(under, stack)]
+    while pending:
+        key, stack = pending.pop()
+        abs_dir = root / key if key else root
+        entries = []
+        try:
+            with os.scandir(abs_dir) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            entries.append((entry.name, True))
+                        elif entry.is_file():
+                            entries.append((entry.name, False))
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+
+        posix_key = key.replace(os.sep, '/')
+        if any(name in IGNORE_FILES for name, is_dir in entries if not is_dir):
+            rules = IgnoreRules.load(abs_dir)
+            if rules is not None:
+                stack = stack + [(posix_key, rules)]
+        base = posix_key + '/' if key else ''
+        dirs = sorted(name for name, is_dir in entries if is_dir and not _is_ignored(stack, base + name, True))
+        files = sorted(name for name, is_dir in entries if not is_dir and not _is_ignored(stack, base + name, False))
+        yield key, dirs, files
+        pending.extend((os.path.join(key, name) if key else name, stack) for name in reversed(dirs))
+
+
+@dataclass
+class FileEntry:
+    """快照中的文件"""
+    __slots__ = ('path', 'size', 'mtime_ns')
+    path: str       # 相对工作区的路径
+    size: int
+    mtime_ns: int
+
+
+@dataclass
+class _DirEntry:
+    mtime_ns: int
+    # 列出目录的时间；与目录 mtime 相差不足 RACY_NS 时，之后同一时钟刻度内的变化可能没有改变 mtime
+    listed_ns: int
+    # 目录下忽略规则文件的 mtime（规则变化时需要重新过滤子树）
+    rule_mtimes: Tuple[int, ...]
+    rules: Optional[IgnoreRules]
+    files: Dict[str, FileEntry] = field(default_factory=dict)
+    dirs: List[str] = field(default_factory=list)
+
+
+class WorkspaceSnapshot:
+    """
+    工作区文件快照
+
+    每个未被忽略的目录缓存一次 scandir 的结果。files() 先做增量刷新：
+    逐个 stat 已知目录，只有 mtime 变化的目录才重新列出；目录中文件内容被修改（目录 mtime 不变）时
+    其 stat 信息由 update_paths() 更新，可挂到 IndexWatcher 上随文件变化维护
+    """
+
+    def __init__(self, workspace_path: str):
+        self.workspace = Path(workspace_path).resolve()
+        self.lock = threading.RLock()
+        self._dirs: Dict[str, _DirEntry] = {}
+        self.refreshes = 0
+        self.listed_dirs = 0
+        # 目录列表变化时递增；listing() 按 (目录, 版本) 复用上次排好序的结果
+        self.version = 0
+        self._sorted: Optional[Tuple[str, int, Tuple[FileEntry, ...], Tuple[str, ...]]] = None
+
+    # ===== 查询 =====
+
+    def files(self, under: str = "", refresh: bool = True) -> List[FileEntry]:
+        """
+        目录下（递归）未被忽略的文件，按路径排序
+
+        Args:
+            under: 相对工作区的目录（"" 表示整个工作区）
+            refresh: 是否先增量刷新该目录
+        """
+        return list(self.listing(under, refresh)[0])
+
+    def listing(self, under: str = "", refresh: bool = True) -> Tuple[Tuple[FileEntry, ...], Tuple[str, ...]]:
+        """
+        同 files()，另外返回对应的路径（均为按路径排序的元组，按快照版本缓存，可直接二分查找）
+
+        Args:
+            under: 相对工作区的目录（"" 表示整个工作区）
+            refresh: 是否先增量刷新该目录
+        """
+        under = self._normalize(under)
+        with self.lock:
+            if refresh or under not in self._dirs:
+                self.refresh(under)
+            if self._sorted is not None and self._sorted[:2] == (under, self.version):
+                return self._sorted[2], self._sorted[3]
+            entries: List[FileEntry] = []
+            pending = [under]
+            while pending:
+                key = pending.pop()
+                directory = self._dirs.get(key)
+                if directory is None:
+                    continue
+                entries.extend(directory.files.values())
+                pending.extend(os.path.join(key, name) if key else name for name in directory.dirs)
+            entries.sort(key=lambda e: e.path)
+            self._sorted = (under, self.version, tuple(entries), tuple(e.path for e in entries))
+            return self._sorted[2], self._sorted[3]
+
+    def iter_paths(self, under: str = "", suffixes: Optional[Iterable[str]] = None) -> Iterator[Path]:
+        """目录下（递归）未被忽略的文件的绝对路径，可按扩展名过滤"""
+        suffixes = tuple(suffixes) if suffixes else None
+        for entry in self.files(under):
+            if suffixes is None or entry.path.endswith(suffixes):
+                yield self.workspace / entry.path
+
+    def is_ignored(self, rel_path: str, is_dir: Optional[bool] = None) -> bool:
+        """
+        路径（相对工作区）是否被忽略（自身或任一上级目录匹配忽略规则）
+
+        Args:
+            is_dir: 路径是否为目录，None 时按文件系统判断
+        """
+        parts = Path(rel_path).parts
+        if not parts or parts == ('.',):
+            return False
+        if is_dir is None:
+            is_dir = (self.workspace / rel_path).is_dir()
+        stack: RuleStack = [("", DEFAULT_RULES)]
+        with self.lock:
+            for i, name in enumerate(parts):
+                parent = '/'.join(parts[:i])
+                rules = self._rules_for(parent)
+                if rules is not None:
+                    stack.append((parent, rules))
+                last = i == len(parts) - 1
+                if _is_ignored(stack, '/'.join(parts[:i + 1]), is_dir if last else True):
+                    return True
+        return False
+
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            return {
+                "dirs": len(self._dirs),
+                "files": sum(len(d.files) for d in self._dirs.values()),
+                "refreshes": self.refreshes,
+                "listed_dirs": self.listed_dirs,
+            }
+
+    # ===== 刷新 =====
+
+    def refresh(self, under: str = "", recursive: bool = True) -> 'WorkspaceSnapshot':
+        """
+        增量刷新目录：只重新列出 mtime 或忽略规则变化的目录
+
+        Args:
+            under: 相对工作区的目录
+            recursive: 是否同时刷新子目录（忽略规则变化时总是刷新）
+        """
+        under = self._normalize(under)
+        with self.lock:
+            self.refreshes += 1
+            if under and self.is_ignored(under, is_dir=True):
+                self._drop(under)
+                return self
+            stack: RuleStack = [("", DEFAULT_RULES)]
+            parts = Path(under).parts if under else ()
+            for i in range(len(parts)):
+                parent = '/'.join(parts[:i])
+                rules = self._rules_for(parent)
+                if rules is not None:
+                    stack.append((parent, rules))
+            self._refresh_dir(under, stack, force=False, recursive=recursive)
+        return self
+
+    def index(self, incremental: bool = True) -> 'WorkspaceSnapshot':
+        """全量刷新（IndexWatcher 的目标接口）"""
+        with self.lock:
+            if not incremental:
+                self._dirs.clear()
+            return self.refresh()
+
+    def update_paths(self, paths: Iterable[str]) -> 'WorkspaceSnapshot':
+        """按路径更新（IndexWatcher 的目标接口）：文件更新 stat，目录递归刷新"""
+        with self.lock:
+            for raw_path in paths:
+                path = Path(raw_path)
+                if not path.is_absolute():
+                    path = self.workspace / path
+                try:
+                    rel_path = str(path.relative_to(self.workspace))
+                except ValueError:
+                    continue
+                rel_path = self._normalize(rel_path)
+                parent_key = os.path.dirname(rel_path)
+                if path.is_dir() or not rel_path:
+                    self.refresh(rel_path)
+                elif parent_key in self._dirs:
+                    # 新建/删除文件会改变目录 mtime，只刷新所在目录本身；修改文件只更新 stat
+                    self.refresh(parent_key, recursive=False)
+                    directory = self._dirs.get(parent_key)
+                    entry = directory.files.get(path.name) if directory else None
+                    if entry is not None:
+                        try:
+                            stat = path.stat()
+                        except OSError:
+                            continue
+                        entry.size, entry.mtime_ns = stat.st_size, stat.st_mtime_ns
+        return self
+
+    def _refresh_dir(self, key: str, stack: RuleStack, force: bool, recursive: bool = True):
+        abs_dir = self.workspace / key if key else self.workspace
+        try:
+            dir_stat = os.stat(abs_dir)
+        except OSError:
+            self._drop(key)
+            return
+
+        cached = self._dirs.get(key)
+        rule_mtimes = self._rule_mtimes(abs_dir, cached) if cached else ()
+        if (
+            cached is None or force
+            or cached.mtime_ns != dir_stat.st_mtime_ns
+            or cached.listed_ns - cached.mtime_ns < RACY_NS
+            or cached.rule_mtimes != rule_mtimes
+        ):
+            directory = self._list_dir(key, abs_dir, dir_stat.st_mtime_ns, stack)
+            # 忽略规则变化后，子目录即使 mtime 不变也要重新过滤
+            force = force or (cached is not None and cached.rule_mtimes != directory.rule_mtimes)
+            if cached is not None:
+                for name in set(cached.dirs) - set(directory.dirs):
+                    self._drop(os.path.join(key, name) if key else name)
+            self._dirs[key] = directory
+        else:
+            directory = cached
+
+        if not recursive and not force:
+            return
+        if directory.rules is not None:
+            stack = stack + [(key.replace(os.sep, '/'), directory.rules)]
+        for name in directory.dirs:
+            self._refresh_dir(os.path.join(key, name) if key else name, stack, force)
+
+    def _list_dir(self, key: str, abs_dir: Path, mtime_ns: int, stack: RuleStack) -> _DirEntry:
+        self.listed_dirs += 1
+        self.version += 1
+        listed_ns = time.time_ns()
+        entries = []
+        rule_mtimes = []
+        try:
+            with os.scandir(abs_dir) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            entries.append((entry, True))
+                        elif entry.is_file():
+                            if entry.name in IGNORE_FILES:
+                                rule_mtimes.append((entry.name, entry.stat().st_mtime_ns))
+                            entries.append((entry, False))
+                    except OSError:
+                        continue
+        except OSError:
+            pass
+
+        # 只有存在规则文件的目录才需要读取
+        rules = IgnoreRules.load(abs_dir) if rule_mtimes else None
+        directory = _DirEntry(mtime_ns, listed_ns, tuple(m for _, m in sorted(rule_mtimes)), rules)
+        posix_key = key.replace(os.sep, '/')
+        if rules is not None:
+            stack = stack + [(posix_key, rules)]
+        base = posix_key + '/' if key else ''
+        prefix = key + os.sep if key else ''
+        for entry, is_dir in entries:
+            if _is_ignored(stack, base + entry.name, is_dir):
+                continue
+            if is_dir:
+                directory.dirs.append(entry.name)
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            directory.files[entry.name] = FileEntry(prefix + entry.name, stat.st_size, stat.st_mtime_ns)
+        directory.dirs.sort()
+        return directory
+
+    @staticmethod
+    def _rule_mtimes(abs_dir: Path, cached: _DirEntry) -> Tuple[int, ...]:
+        """已知的忽略规则文件的当前 mtime（新建/删除规则文件会改变目录 mtime）"""
+        if not cached.rule_mtimes:
+            return ()
+        mtimes = []
+        for name in IGNORE_FILES:
+            try:
+                mtimes.append(os.stat(abs_dir / name).st_mtime_ns)
+            except OSError:
+                continue
+        return tuple(mtimes)
+
+    def _rules_for(self, key: str) -> Optional[IgnoreRules]:
+        """目录（/ 分隔的相对路径）的忽略规则，未缓存时从磁盘读取"""
+        key = key.replace('/', os.sep)
+        cached = self._dirs.get(key)
+        if cached is not None:
+            return cached.rules
+        return IgnoreRules.load(self.workspace / key if key else self.workspace)
+
+    def _drop(self, key: str):
+        """移除目录及其子目录的缓存"""
+        self.version += 1
+        if not key:
+            self._dirs.clear()
+            return
+        prefix = key + os.sep
+        for dir_key in [k for k in self._dirs if k == key or k.startswith(prefix)]:
+            del self._dirs[dir_key]
+
+    @staticmethod
+    def _normalize(rel_path: str) -> str:
+        rel_path = os.path.normpath(rel_path) if rel_path else ""
+        return "" if rel_path == "." else rel_path
+
+
+_snapshots: 'OrderedDict[str, WorkspaceSnapshot]' = OrderedDict()
+_snapshots_lock = threading.Lock()
+
+
+def get_snapshot(workspace: str) -> WorkspaceSnapshot:
+    """进程内共享的工作区快照（按解析后的路径缓存，最近最少使用的先淘汰）"""
+    key = str(Path(workspace).resolve())
+    with _snapshots_lock:
+        snapshot = _snapshots.get(key)
+        if snapshot is None:
+            snapshot = _snapshots[key] = WorkspaceSnapshot(key)
+            while len(_snapshots) > MAX_SNAPSHOTS:
+                _snapshots.popitem(last=False)
+        else:
+            _snapshots.move_to_end(key)
+        return snapshot
@@ -132,6 +132,29 @@ ZHIPU_API_KEY = os.getenv('ZHIPU_API_KEY', '')
 # GitHub访问令牌
 GITHUB_TOKEN = os.getenv('GITHUB_TOKEN', '')
 
+# 代码索引并行解析进程数（默认 1 为串行，0 表示使用全部 CPU 核心）及每批分发的文件数
+CODE_INDEX_WORKERS = int(os.getenv('CODE_INDEX_WORKERS', '1'))
+CODE_INDEX_CHUNK_SIZE = int(os.getenv('CODE_INDEX_CHUNK_SIZE', '32'))
+
+# 文件变化后更新索引的去抖时间（秒），以及无 inotify 时的轮询间隔（秒）
+CODE_INDEX_WATCH_DEBOUNCE = float(os.getenv('CODE_INDEX_WATCH_DEBOUNCE', '0.3'))
+CODE_INDEX_POLL_INTERVAL = float(os.getenv('CODE_INDEX_POLL_INTERVAL', '5'))
+
+# 进程内最多缓存的工作区索引数量，以及所有索引的内存预算（MB，0 表示不限制）
+CODE_INDEX_MAX_WORKSPACES = int(os.getenv('CODE_INDEX_MAX_WORKSPACES', '8'))
+CODE_INDEX_MEMORY_BUDGET_MB = int(os.getenv('CODE_INDEX_MEMORY_BUDGET_MB', '512'))
+
+# 是否为内容搜索构建三元组索引（设置工作区时在后台构建；关闭时内容搜索直接扫描工作区文件）
+CONTENT_INDEX_ENABLED = os.getenv('CONTENT_INDEX_ENABLED', 'False').lower() == 'true'
+
+# 内容搜索的扫描线程数、单次搜索的时间预算（秒）和最多返回的匹配数
+SEARCH_WORKERS = int(os.getenv('SEARCH_WORKERS', '4'))
+SEARCH_TIMEOUT = float(os.getenv('SEARCH_TIMEOUT', '10'))
+SEARCH_MAX_RESULTS = int(os.getenv('SEARCH_MAX_RESULTS', '2000'))
+
+# 文件模糊查找的打分时间预算（毫秒），超出时返回已打分候选中的最佳结果
+FILE_FIND_BUDGET_MS = float(os.getenv('FILE_FIND_BUDGET_MS', '8'))
+
 # 日志配置
 LOGGING = {
     'version': 1,
@@ -10,6 +10,8 @@ from pathlib import Path
 from typing import Dict, List, Any, Optional
 from django.conf import settings
 
+from code_index.watcher import notify_file_changed
+
 
 # Agent 工具定义（智谱 AI function calling 格式）
 AGENT_TOOLS = [
@@ -197,9 +199,14 @@ AGENT_TOOLS = [
                     "symbol_name": {
                         "type": "string",
                         "description": "要搜索的符号名称"
+                    },
+                    "symbol_names": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "批量搜索的符号名称列表（可选，一次查询多个符号）"
                     }
                 },
-                "required": ["symbol_name"]
+                "required": []
             }
         }
     },
@@ -278,12 +285,17 @@ AGENT_TOOLS = [
                         "type": "string",
                         "description": "函数名称"
                     },
+                    "function_names": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "批量获取调用图的函数名称列表（可选，一次获取多个函数的调用图）"
+                    },
                     "depth": {
                         "type": "integer",
                         "description": "调用深度（默认2）"
                     }
                 },
-                "required": ["function_name"]
+                "required": []
             }
         }
     },
@@ -435,7 +447,10 @@ class AgentToolExecutor:
                     arguments.get("verbose", True)
                 )
             elif tool_name == "search_symbol":
-                return await self._search_symbol(arguments.get("symbol_name", ""))
+                return await self._search_symbol(
+                    arguments.get("symbol_name", ""),
+                    arguments.get("symbol_names")
+                )
             elif tool_name == "get_code_references":
                 return await self._get_code_references(
                     arguments.get("file_path", ""),
@@ -453,7 +468,8 @@ class AgentToolExecutor:
             elif tool_name == "get_call_graph":
                 return await self._get_call_graph(
                     arguments.get("function_name", ""),
-                    arguments.get("depth", 2)
+                    arguments.get("depth", 2),
+                    arguments.get("function_names")
                 )
             elif tool_name == "get_file_outline":
                 return await self._get_file_outline(arguments.get("path", ""))
@@ -515,6 +531,7 @@ class AgentToolExecutor:
             
             # 写入文件
             file_path.write_text(content, encoding='utf-8')
+            notify_file_changed(file_path)
             logger.info(f"[Agent Tool] 文件写入成功 | 路径: {file_path}, 大小: {len(content)}字节")
             
             # 验证文件确实被创建
@@ -579,76 +596,28 @@ class AgentToolExecutor:
     
     async def _search_content(self, query: str, file_pattern: Optional[str] = None) -> Dict[str, Any]:
         """搜索内容"""
-        import re
+        from services.search_service import build_pattern, search_workspace
         
         try:
             if not query:
                 return {"success": False, "error": "搜索内容不能为空"}
             
-            results = []
-            ignore_dirs = {'.git', '__pycache__', 'node_modules', '.venv', 'venv', 'dist', 'build'}
-            
-            def should_skip_file(file_path: Path) -> bool:
-                """判断是否跳过文件"""
-                # 跳过二进制文件
-                binary_extensions = {'.pyc', '.exe', '.dll', '.so', '.bin', '.png', '.jpg', '.gif', '.pdf'}
-                if file_path.suffix.lower() in binary_extensions:
-                    return True
-                # 跳过大文件
-                if file_path.stat().st_size > 512 * 1024:  # 512KB
-                    return True
-                return False
-            
-            def matches_pattern(file_path: Path) -> bool:
-                """判断文件是否匹配模式"""
-                if not file_pattern:
-                    return True
-                import fnmatch
-                return fnmatch.fnmatch(file_path.name, file_pattern)
-            
-            for root, dirs, files in os.walk(self.workspace):
-                # 过滤目录
-                dirs[:] = [d for d in dirs if d not in ignore_dirs and not d.startswith('.')]
-                
-                for file in files:
-                    if file.startswith('.'):
-                        continue
-                    
-                    file_path = Path(root) / file
-                    
-                    if should_skip_file(file_path):
-                        continue
-                    
-                    if not matches_pattern(file_path):
-                        continue
-                    
-                    try:
-                        content = file_path.read_text(encoding='utf-8', errors='ignore')
-                        matches = []
-                        
-                        for i, line in enumerate(content.split('\n'), 1):
-                            if re.search(query, line, re.IGNORECASE):
-                                matches.append({
-                                    "line": i,
-                                    "content": line.strip()[:200]
-                                })
-                                if len(matches) >= 5:  # 每个文件最多5个匹配
-                                    break
-                        
-                        if matches:
-                            rel_path = str(file_path.relative_to(self.workspace))
-                            results.append({
-                                "file": rel_path,
-                                "matches": matches
-                            })
-                            
-                            if len(results) >= 20:  # 最多20个文件
-                                break
-                    except Exception:
-                        continue
-                
-                if len(results) >= 20:
-                    break
+            pattern = build_pattern(query, regex=True)
+            found = search_workspace(
+                str(self.workspace),
+                pattern,
+                max_files=20,  # 最多20个文件
+                max_matches_per_file=5,  # 每个文件最多5个匹配
+                file_pattern=file_pattern,
+                max_file_size=512 * 1024  # 512KB
+            )
+            results = [
+                {
+                    "file": result["file"],
+                    "matches": [{"line": m.line, "content": m.text} for m in result["matches"]]
+                }
+                for result in found
+            ]
             
             return {
                 "success": True,
@@ -748,6 +717,7 @@ class AgentToolExecutor:
                 shutil.rmtree(file_path)
             else:
                 file_path.unlink()
+            notify_file_changed(file_path)
             
             return {
                 "success": True,
@@ -806,22 +776,34 @@ class AgentToolExecutor:
         except Exception as e:
             return {"success": False, "error": str(e)}
     
-    async def _search_symbol(self, symbol_name: str) -> Dict[str, Any]:
-        """搜索代码符号"""
+    async def _search_symbol(self, symbol_name: str, symbol_names: Optional[List[str]] = None) -> Dict[str, Any]:
+        """搜索代码符号（symbol_names 不为空时批量搜索）"""
         try:
-            if not symbol_name:
+            batched = bool(symbol_names)
+            names = list(dict.fromkeys(n for n in [symbol_name, *(symbol_names or [])] if n))
+            if not names:
                 return {"success": False, "error": "符号名称不能为空"}
             
-            from code_index.searcher import CodeSearcher
+            from code_index.searcher import search_result_dict
             
-            searcher = CodeSearcher(self.workspace)
-            results = searcher.search(symbol_name)
+            searcher = await self._get_searcher()
+            results = {
+                name: [search_result_dict(r) for r in matches]
+                for name, matches in searcher.search_symbols(names).items()
+            }
             
+            if not batched:
+                return {
+                    "success": True,
+                    "symbol": symbol_name,
+                    "results": results[symbol_name],
+                    "count": len(results[symbol_name])
+                }
             return {
                 "success": True,
-                "symbol": symbol_name,
+                "symbols": names,
                 "results": results,
-                "count": len(results)
+                "count": sum(len(r) for r in results.values())
             }
         except ImportError as e:
             return {"success": False, "error": f"搜索模块导入失败: {str(e)}"}
@@ -834,10 +816,7 @@ class AgentToolExecutor:
             if not file_path or not symbol_name:
                 return {"success": False, "error": "文件路径和符号名称不能为空"}
             
-            from code_index.searcher import CodeSearcher
-            
-            graph = await self._get_code_graph()
-            searcher = CodeSearcher(graph)
+            searcher = await self._get_searcher()
             references = searcher.search_references(symbol_name)
             
             return {
@@ -882,29 +861,27 @@ class AgentToolExecutor:
         except Exception as e:
             return {"success": False, "error": str(e)}
     
-    # 缓存索引图
-    _code_graph_cache = None
-    
     async def _get_code_graph(self):
-        """获取或创建代码图"""
-        if self._code_graph_cache is None:
-            from code_index.indexer import CodeIndexer
-            indexer = CodeIndexer(str(self.workspace))
-            self._code_graph_cache = indexer.index()
-        return self._code_graph_cache
+        """获取工作区代码图（进程内按工作区缓存，并随文件修改实时更新）"""
+        from services.code_index_service import get_workspace_index
+        
+        return get_workspace_index(str(self.workspace)).graph
+    
+    async def _get_searcher(self):
+        """获取工作区的常驻代码搜索器"""
+        from services.code_index_service import get_workspace_index
+        
+        return get_workspace_index(str(self.workspace)).searcher
     
     async def _index_workspace(self, path: str = "") -> Dict[str, Any]:
         """索引工作区"""
         try:
-            target_path = self.workspace if not path else self._resolve_path(path)
-            
-            from code_index.indexer import CodeIndexer
+            from services.code_index_service import get_index_registry
             
-            indexer = CodeIndexer(str(target_path))
-            graph = indexer.index()
+            target_path = self.workspace if not path else self._resolve_path(path)
             
-            # 更新缓存
-            self._code_graph_cache = graph
+            # 已缓存的索引原地增量更新
+            graph = get_index_registry().reindex(str(target_path)).graph
             
             return {
                 "success": True,
@@ -917,19 +894,27 @@ class AgentToolExecutor:
         except Exception as e:
             return {"success": False, "error": str(e)}
     
-    async def _get_call_graph(self, function_name: str, depth: int = 2) -> Dict[str, Any]:
-        """获取调用图"""
+    async def _get_call_graph(self, function_name: str, depth: int = 2,
+                              function_names: Optional[List[str]] = None) -> Dict[str, Any]:
+        """获取调用图（function_names 不为空时批量获取）"""
         try:
-            from code_index.searcher import CodeSearcher
+            names = list(dict.fromkeys(n for n in [function_name, *(function_names or [])] if n))
+            if not names:
+                return {"success": False, "error": "函数名称不能为空"}
             
-            graph = await self._get_code_graph()
-            searcher = CodeSearcher(graph)
-            call_graph = searcher.get_call_graph(function_name, depth)
+            searcher = await self._get_searcher()
+            call_graphs = searcher.get_call_graphs(names, depth)
             
+            if not function_names:
+                return {
+                    "success": True,
+                    "function": function_name,
+                    "call_graph": call_graphs[function_name]
+                }
             return {
                 "success": True,
-                "function": function_name,
-                "call_graph": call_graph
+                "functions": names,
+                "call_graphs": call_graphs
             }
         except ImportError as e:
             return {"success": False, "error": f"搜索模块导入失败: {str(e)}"}
@@ -942,10 +927,7 @@ class AgentToolExecutor:
             if not path:
                 return {"success": False, "error": "文件路径不能为空"}
             
-            from code_index.searcher import CodeSearcher
-            
-            graph = await self._get_code_graph()
-            searcher = CodeSearcher(graph)
+            searcher = await self._get_searcher()
             outline = searcher.get_file_outline(path)
             
             return {
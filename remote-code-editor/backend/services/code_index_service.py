@@ -0,0 +1,74 @@
+"""
+代码索引服务模块
+提供进程内共享的代码索引注册表（按工作区缓存，供 Agent 接口和 Agent 工具共用）
+"""
+import threading
+from typing import Optional
+
+from django.conf import settings
+
+from code_index.content_index import ContentIndex
+from code_index.indexer import CodeIndexer
+from code_index.index_store import open_workspace_store
+from code_index.registry import IndexEntry, IndexRegistry, set_default_registry
+
+
+_registry: Optional[IndexRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def create_indexer(workspace: str) -> CodeIndexer:
+    """创建带持久化存储和并行配置的索引器"""
+    return CodeIndexer(
+        workspace,
+        store=open_workspace_store(workspace),
+        workers=getattr(settings, 'CODE_INDEX_WORKERS', 1),
+        chunk_size=getattr(settings, 'CODE_INDEX_CHUNK_SIZE', 32)
+    )
+
+
+def create_content_index(workspace: str) -> ContentIndex:
+    """创建持久化到工作区索引目录的内容索引"""
+    return ContentIndex.for_workspace(
+        workspace,
+        max_file_size=getattr(settings, 'CONTENT_INDEX_MAX_FILE_SIZE', 16 * 1024 * 1024)
+    )
+
+
+def get_index_registry() -> IndexRegistry:
+    """获取进程内共享的索引注册表（首次调用时按配置创建）"""
+    global _registry
+    
+    with _registry_lock:
+        if _registry is None:
+            _registry = IndexRegistry(
+                indexer_factory=create_indexer,
+                content_factory=create_content_index,
+                max_entries=getattr(settings, 'CODE_INDEX_MAX_WORKSPACES', 8),
+                memory_budget=getattr(settings, 'CODE_INDEX_MEMORY_BUDGET_MB', 512) * 1024 * 1024,
+                watcher_options={
+                    "debounce": getattr(settings, 'CODE_INDEX_WATCH_DEBOUNCE', 0.3),
+                    "poll_interval": getattr(settings, 'CODE_INDEX_POLL_INTERVAL', 5.0),
+                }
+            )
+            # code_index 的便捷函数（search()/get_references()）也使用这份注册表
+            set_default_registry(_registry)
+        return _registry
+
+
+def get_workspace_index(workspace: str) -> IndexEntry:
+    """获取工作区索引（未缓存时自动构建）"""
+    return get_index_registry().get(workspace)
+
+
+def get_content_index(workspace: str, wait: bool = True) -> Optional[ContentIndex]:
+    """
+    获取工作区内容索引（未缓存时自动构建；wait 为 False 时改为后台构建，未就绪返回 None）
+
+    未开启 CONTENT_INDEX_ENABLED 时只返回已构建的索引，不触发构建
+    """
+    registry = get_index_registry()
+    if not getattr(settings, 'CONTENT_INDEX_ENABLED', False):
+        entry = registry.peek(workspace)
+        return entry.content if entry is not None else None
+    return registry.content_index(workspace, wait=wait)
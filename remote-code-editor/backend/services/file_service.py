@@ -3,14 +3,25 @@
 提供文件系统操作的核心逻辑
 """
 import os
+import re
+import mmap
+import stat
+import time
 import base64
+import bisect
+import hashlib
+import threading
 import aiofiles
 import asyncio
+from collections import OrderedDict
+from dataclasses import dataclass
 from pathlib import Path
 from datetime import datetime
-from typing import List, Optional, Dict, Union
+from typing import Any, List, Optional, Dict, Tuple, Union
 from pathvalidate import sanitize_filename
 
+from code_index.watcher import add_change_listener, notify_file_changed
+
 
 # 二进制文件扩展名
 BINARY_EXTENSIONS = {
@@ -24,11 +35,534 @@ BINARY_EXTENSIONS = {
 }
 
 
+# 文本文件依次尝试的编码（latin-1 总能解码，作为最后的兜底）
+TEXT_ENCODINGS = ('utf-8', 'gbk', 'gb2312', 'latin-1')
+
+# 字节顺序标记 -> 编码（UTF-32 的 BOM 以 UTF-16 的为前缀，需先检查）
+BOMS = (
+    (b'\xff\xfe\x00\x00', 'utf-32'),
+    (b'\x00\x00\xfe\xff', 'utf-32'),
+    (b'\xef\xbb\xbf', 'utf-8'),
+    (b'\xff\xfe', 'utf-16'),
+    (b'\xfe\xff', 'utf-16'),
+)
+
+# 最多缓存的文件编码检测结果数
+MAX_ENCODING_CACHE = 4096
+
+# 不超过该大小的二进制文件在 read_file 中以 base64 内联返回，更大的只返回元数据（内容通过原始字节接口获取）
+INLINE_BINARY_LIMIT = 256 * 1024
+
+# 行偏移索引每个检查点覆盖的字节数
+LINE_INDEX_CHUNK = 64 * 1024
+
+# 最多缓存的行偏移索引数
+MAX_LINE_INDEXES = 64
+
+
 def is_binary_file(path: Path) -> bool:
     """检查文件是否为二进制文件"""
     return path.suffix.lower() in BINARY_EXTENSIONS
 
 
+def decode_text(data: bytes, encoding: Optional[str] = None) -> Tuple[str, str]:
+    """
+    在已读入的字节上检测编码并解码，返回 (文本, 编码)
+    
+    依次为：BOM；纯 ASCII（最常见，无需逐字节校验）和 UTF-8；其余 TEXT_ENCODINGS。
+    UTF-8 的 BOM 保留在文本中，保存时原样写回
+    
+    Args:
+        encoding: 先尝试的编码（如缓存的上次检测结果），失败时重新检测
+    """
+    if encoding is not None:
+        try:
+            return data.decode(encoding), encoding
+        except UnicodeDecodeError:
+            pass
+    for bom, bom_encoding in BOMS:
+        if data.startswith(bom):
+            try:
+                return data.decode(bom_encoding), bom_encoding
+            except UnicodeDecodeError:
+                break
+    if data.isascii():
+        return data.decode('ascii'), 'utf-8'
+    for candidate in TEXT_ENCODINGS[:-1]:
+        try:
+            return data.decode(candidate), candidate
+        except UnicodeDecodeError:
+            continue
+    return data.decode(TEXT_ENCODINGS[-1]), TEXT_ENCODINGS[-1]
+
+
+class EncodingCache:
+    """
+    文件编码检测结果缓存
+    
+    按文件绝对路径记录 (mtime_ns, 大小, 编码)，文件未变化时直接按缓存的编码解码
+    """
+    
+    def __init__(self, max_files: int = MAX_ENCODING_CACHE):
+        self.max_files = max_files
+        self._entries: 'OrderedDict[str, Tuple[int, int, str]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, path: Path, file_stat: os.stat_result) -> Optional[str]:
+        key = str(path)
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None and cached[:2] == (file_stat.st_mtime_ns, file_stat.st_size):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return cached[2]
+            self.misses += 1
+            return None
+    
+    def put(self, path: Path, file_stat: os.stat_result, encoding: str):
+        key = str(path)
+        with self._lock:
+            self._entries[key] = (file_stat.st_mtime_ns, file_stat.st_size, encoding)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_files:
+                self._entries.popitem(last=False)
+    
+    def invalidate(self, path: Path):
+        with self._lock:
+            self._entries.pop(str(path), None)
+    
+    def decode(self, path: Path, file_stat: os.stat_result, data: bytes) -> Tuple[str, str]:
+        """解码文件内容（data 须为整个文件），并记录检测到的编码"""
+        cached = self.get(path, file_stat)
+        content, encoding = decode_text(data, cached)
+        if encoding != cached:
+            self.put(path, file_stat, encoding)
+        return content, encoding
+
+
+class LineIndex:
+    """
+    文件的换行偏移索引（稀疏）
+    
+    每 LINE_INDEX_CHUNK 字节记录一次此前的换行数，构建时只在 mmap 上按块计数，不把文件解码成字符串。
+    定位某行时二分到所在的块，再在块内用 find 找到对应的换行
+    """
+    
+    def __init__(self, mtime_ns: int, size: int, counts: List[int], newlines: int, trailing: bool):
+        self.mtime_ns = mtime_ns
+        self.size = size
+        # counts[k]: 偏移 k * LINE_INDEX_CHUNK 之前的换行数
+        self.counts = counts
+        self.newlines = newlines
+        # 最后一行没有换行符
+        self.trailing = trailing
+    
+    @classmethod
+    def build(cls, buf: mmap.mmap, mtime_ns: int) -> 'LineIndex':
+        size = len(buf)
+        counts: List[int] = []
+        newlines = 0
+        for start in range(0, size, LINE_INDEX_CHUNK):
+            counts.append(newlines)
+            newlines += buf[start:start + LINE_INDEX_CHUNK].count(b'\n')
+        return cls(mtime_ns, size, counts, newlines, size > 0 and buf[size - 1:size] != b'\n')
+    
+    @property
+    def total_lines(self) -> int:
+        return self.newlines + (1 if self.trailing else 0)
+    
+    def line_offset(self, buf: mmap.mmap, line: int) -> int:
+        """第 line 行（从 0 开始）开头的字节偏移，超出最后一行时为文件大小"""
+        if line <= 0:
+            return 0
+        if line > self.newlines:
+            return self.size
+        # 第 line 个换行所在的块
+        chunk = bisect.bisect_left(self.counts, line) - 1
+        pos = chunk * LINE_INDEX_CHUNK - 1
+        for _ in range(line - self.counts[chunk]):
+            pos = buf.find(b'\n', pos + 1)
+        return pos + 1
+
+
+_line_indexes: 'OrderedDict[str, LineIndex]' = OrderedDict()
+_line_indexes_lock = threading.Lock()
+
+
+def get_line_index(path: Path, buf: mmap.mmap, file_stat: os.stat_result) -> LineIndex:
+    """文件的行偏移索引（按 mtime 和大小判断是否有效，最近最少使用的先淘汰）"""
+    key = str(path)
+    with _line_indexes_lock:
+        index = _line_indexes.get(key)
+        if index is not None and (index.mtime_ns, index.size) == (file_stat.st_mtime_ns, file_stat.st_size):
+            _line_indexes.move_to_end(key)
+            return index
+    index = LineIndex.build(buf, file_stat.st_mtime_ns)
+    with _line_indexes_lock:
+        _line_indexes[key] = index
+        _line_indexes.move_to_end(key)
+        while len(_line_indexes) > MAX_LINE_INDEXES:
+            _line_indexes.popitem(last=False)
+    return index
+
+
+@dataclass
+class _Listing:
+    mtime_ns: int
+    listed_ns: int
+    items: List[dict]
+    # 重新列出且内容变化时更新（用作目录树响应的 ETag）
+    generation: int = 0
+
+
+class DirectoryCache:
+    """
+    目录列表缓存
+    
+    按目录绝对路径缓存 list_directory 的结果（含子目录是否为空）。列表中的路径相对于工作区，
+    同一目录在嵌套的工作区中结果不同，因此每个目录下再按工作区分别缓存。命中时只 stat 目录本身：
+    目录 mtime 变化、刚修改过（时间戳精度内）或超过 MAX_AGE 时重新列出。
+    保存/创建/删除等操作和文件系统事件通过 add_change_listener 使对应目录及其上级失效
+    """
+    
+    # 最多缓存的目录数
+    MAX_DIRS = 4096
+    
+    # 缓存的最长有效期（秒），兜底目录内文件被原地修改（目录 mtime 不变）的情况
+    MAX_AGE = 30.0
+    
+    # 目录 mtime 距列出时间小于该值（纳秒）时不信任缓存
+    RACY_NS = 2 * 10**9
+    
+    def __init__(self):
+        # 目录绝对路径 -> 工作区绝对路径 -> 列表（按目录淘汰）
+        self._entries: 'OrderedDict[str, Dict[str, _Listing]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+    
+    def list(self, path: Path, workspace: Path) -> List[dict]:
+        """
+        列出目录（跳过隐藏文件），目录在前、按名称排序
+        
+        Raises:
+            FileNotFoundError / NotADirectoryError
+        """
+        return list(self._get(path, workspace).items)
+    
+    def generation(self, path: Path, workspace: Path) -> int:
+        """目录当前列表的代数：列表（含文件大小、修改时间）变化后不同"""
+        return self._get(path, workspace).generation
+    
+    def _get(self, path: Path, workspace: Path) -> _Listing:
+        key = str(path)
+        root = str(workspace)
+        dir_stat = os.stat(key)
+        if not stat.S_ISDIR(dir_stat.st_mode):
+            raise NotADirectoryError(key)
+        
+        with self._lock:
+            cached = self._entries.get(key, {}).get(root)
+            if cached is not None and self._valid(cached, dir_stat.st_mtime_ns):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return cached
+            self.misses += 1
+        
+        listed_ns = time.time_ns()
+        items = self._scan(path, workspace)
+        with self._lock:
+            if cached is not None and cached.items == items:
+                # 内容没有变化：沿用原来的代数
+                generation = cached.generation
+            else:
+                self._generation += 1
+                generation = self._generation
+            listing = _Listing(dir_stat.st_mtime_ns, listed_ns, items, generation)
+            self._entries.setdefault(key, {})[root] = listing
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.MAX_DIRS:
+                self._entries.popitem(last=False)
+        return listing
+    
+    def invalidate(self, path: Path):
+        """路径变化：失效其所在目录（列表变化）及上级目录（所在目录是否为空可能变化）"""
+        path = Path(path)
+        with self._lock:
+            for key in (str(path), str(path.parent), str(path.parent.parent)):
+                for cached in self._entries.get(key, {}).values():
+                    # 保留旧列表：重新列出后内容相同时沿用代数
+                    cached.mtime_ns = -1
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def _valid(self, cached: _Listing, mtime_ns: int) -> bool:
+        return (
+            cached.mtime_ns == mtime_ns
+            and cached.listed_ns - mtime_ns >= self.RACY_NS
+            and time.time_ns() - cached.listed_ns < self.MAX_AGE * 1e9
+        )
+    
+    def _scan(self, path: Path, workspace: Path) -> List[dict]:
+        dirs: List[dict] = []
+        files: List[dict] = []
+        with os.scandir(path) as entries:
+            for entry in entries:
+                # 跳过隐藏文件
+                if entry.name.startswith('.'):
+                    continue
+                try:
+                    is_dir = entry.is_dir()
+                    item_info = {
+                        "name": entry.name,
+                        "path": str(Path(entry.path).relative_to(workspace)),
+                        "is_dir": is_dir
+                    }
+                    if is_dir:
+                        item_info["is_empty"] = self._is_empty(entry.path, workspace)
+                        dirs.append(item_info)
+                    elif entry.is_file():
+                        entry_stat = entry.stat()
+                        item_info["size"] = entry_stat.st_size
+                        item_info["modified"] = datetime.fromtimestamp(entry_stat.st_mtime).isoformat()
+                        files.append(item_info)
+                    else:
+                        files.append(item_info)
+                except OSError:
+                    continue
+        dirs.sort(key=lambda item: item["name"].lower())
+        files.sort(key=lambda item: item["name"].lower())
+        return dirs + files
+    
+    def _is_empty(self, path: str, workspace: Path) -> bool:
+        """文件夹是否为空（只检查非隐藏文件；在该工作区下已缓存且有效时直接使用缓存）"""
+        with self._lock:
+            cached = self._entries.get(path, {}).get(str(workspace))
+        if cached is not None:
+            try:
+                if self._valid(cached, os.stat(path).st_mtime_ns):
+                    return not cached.items
+            except OSError:
+                return True
+        try:
+            with os.scandir(path) as entries:
+                return not any(not entry.name.startswith('.') for entry in entries)
+        except OSError:
+            return True  # 无权限时视为空
+
+
+class VersionConflictError(Exception):
+    """补丁的基准版本与文件当前内容不一致（文件已被其他途径修改）"""
+    
+    def __init__(self, current_version: str):
+        super().__init__("文件已被修改，请重新加载后再保存")
+        self.current_version = current_version
+
+
+def content_version(content: str) -> str:
+    """文本内容的版本（UTF-8 编码后的 SHA-256），客户端以此作为补丁的基准版本"""
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def _normalize_newlines(text: str) -> str:
+    """与文本模式读取一致：统一换行符为 \\n"""
+    if '\r' in text:
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+    return text
+
+
+def apply_text_edits(text: str, edits: List[Dict[str, Any]]) -> str:
+    """
+    应用一组文本编辑
+    
+    每个编辑为 {"start", "end", "text"}：把基准文本中 [start, end) 替换为 text，
+    偏移按 Unicode 字符计，均相对于同一基准文本，不能重叠
+    
+    Raises:
+        ValueError: 编辑格式错误、越界或重叠
+    """
+    try:
+        parsed = sorted(
+            ((int(edit['start']), int(edit['end']), str(edit.get('text', ''))) for edit in edits),
+            key=lambda edit: edit[:2]
+        )
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("编辑格式错误，应为 {start, end, text}")
+    
+    pieces: List[str] = []
+    pos = 0
+    for start, end, new_text in parsed:
+        if start < pos or end < start or end > len(text):
+            raise ValueError(f"编辑范围无效或重叠: [{start}, {end})")
+        pieces.append(text[pos:start])
+        pieces.append(new_text)
+        pos = end
+    pieces.append(text[pos:])
+    return ''.join(pieces)
+
+
+_HUNK_RE = re.compile(r'^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@')
+
+
+def apply_unified_diff(text: str, diff: str) -> str:
+    """
+    应用单个文件的统一格式差异（diff -u / git diff）
+    
+    第一个 @@ 之前的文件头被忽略；上下文和删除行必须与基准文本完全一致
+    
+    Raises:
+        ValueError: 无法解析或与基准文本不符
+    """
+    lines = text.splitlines(keepends=True)
+    diff_lines = _normalize_newlines(diff).splitlines(keepends=True)
+    i = 0
+    while i < len(diff_lines) and not diff_lines[i].startswith('@@'):
+        i += 1
+    if i == len(diff_lines):
+        raise ValueError("补丁中没有 @@ 块")
+    
+    output: List[str] = []
+    pos = 0
+    while i < len(diff_lines):
+        match = _HUNK_RE.match(diff_lines[i])
+        if not match:
+            raise ValueError(f"无法解析补丁第 {i + 1} 行")
+        old_start = int(match.group(1))
+        old_left = int(match.group(2) or 1)
+        new_left = int(match.group(4) or 1)
+        # 旧文件行数为 0 时，起始行号表示在该行之后插入
+        hunk_start = old_start - 1 if old_left else old_start
+        if hunk_start < pos or hunk_start > len(lines):
+            raise ValueError(f"补丁块位置无效: {diff_lines[i].strip()}")
+        output.extend(lines[pos:hunk_start])
+        pos = hunk_start
+        i += 1
+        
+        # 先收集本块的 (标记, 内容)，"\\ No newline at end of file" 去掉前一行的换行符
+        ops: List[Tuple[str, str]] = []
+        while old_left > 0 or new_left > 0:
+            if i >= len(diff_lines):
+                raise ValueError("补丁块不完整")
+            line = diff_lines[i]
+            i += 1
+            tag, body = (' ', line) if line == '\n' else (line[:1], line[1:])
+            if tag == ' ':
+                old_left -= 1
+                new_left -= 1
+            elif tag == '-':
+                old_left -= 1
+            elif tag == '+':
+                new_left -= 1
+            else:
+                raise ValueError(f"无法解析补丁第 {i} 行")
+            ops.append((tag, body))
+            if i < len(diff_lines) and diff_lines[i].startswith('\\'):
+                ops[-1] = (tag, body[:-1] if body.endswith('\n') else body)
+                i += 1
+        if old_left < 0 or new_left < 0:
+            raise ValueError("补丁块行数与 @@ 头不符")
+        
+        for tag, body in ops:
+            if tag == '+':
+                output.append(body)
+                continue
+            if pos >= len(lines) or lines[pos] != body:
+                raise ValueError(f"补丁与第 {pos + 1} 行不符")
+            if tag == ' ':
+                output.append(body)
+            pos += 1
+    
+    output.extend(lines[pos:])
+    return ''.join(output)
+
+
+# 创建临时文件时最多尝试的文件名数
+TEMP_ATTEMPTS = 100
+
+
+def _create_temp(path: Path) -> Tuple[int, str]:
+    """
+    在同目录下创建临时文件，返回 (文件描述符, 路径)
+
+    与 mkstemp 不同，权限按 0o666 交给内核套用进程 umask，结果与直接 open 新建文件一致
+    （不需要调用 os.umask() 读取 umask，它会短暂修改整个进程的 umask）
+    """
+    flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0) | getattr(os, 'O_CLOEXEC', 0)
+    for _ in range(TEMP_ATTEMPTS):
+        tmp_path = str(path.parent / f'.{path.name}.{os.urandom(4).hex()}.tmp')
+        try:
+            return os.open(tmp_path, flags, 0o666), tmp_path
+        except FileExistsError:
+            continue
+    raise FileExistsError(f"无法创建临时文件: {path}")
+
+
+def write_atomic(path: Path, content: str):
+    """
+    原子地写入文本文件：写入同目录下的临时文件并 fsync，再用 os.replace 替换
+    
+    中途崩溃时原文件保持完整，不会被截断。替换后是一个新的 inode：保留原文件的权限位，
+    并尽量保留属主（没有权限 chown 时属主变为当前进程的用户）。
+    原文件有多个硬链接时替换会断开链接，因此改为原地写入（不具备原子性）
+    """
+    try:
+        original = os.stat(path)
+    except FileNotFoundError:
+        original = None
+    if original is not None and original.st_nlink > 1:
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        return
+    
+    fd, tmp_path = _create_temp(path)
+    try:
+        # 文本模式写入，换行符与原来直接写入时一致
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        if original is not None:
+            os.chmod(tmp_path, stat.S_IMODE(original.st_mode))
+            if hasattr(os, 'chown'):
+                try:
+                    os.chown(tmp_path, original.st_uid, original.st_gid)
+                except PermissionError:
+                    pass
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    
+    # 替换操作本身持久化到目录（Windows 不支持打开目录）
+    if os.name != 'nt':
+        dir_fd = os.open(path.parent, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        except OSError:
+            pass
+        finally:
+            os.close(dir_fd)
+
+
+# 进程内共享的目录列表缓存（按目录和工作区的绝对路径缓存，切换工作区不会取到其他工作区的相对路径）
+directory_cache = DirectoryCache()
+add_change_listener(directory_cache.invalidate)
+
+# 进程内共享的文件编码缓存
+encoding_cache = EncodingCache()
+add_change_listener(encoding_cache.invalidate)
+
+
 class FileService:
     """文件服务类"""
     
@@ -107,51 +641,30 @@ class FileService:
         
         path = self._resolve_path(relative_path)
         
-        if not path.exists():
+        try:
+            return directory_cache.list(path, self.workspace)
+        except FileNotFoundError:
             raise FileNotFoundError(f"目录不存在: {relative_path}")
-        
-        if not path.is_dir():
+        except NotADirectoryError:
             raise NotADirectoryError(f"路径不是目录: {relative_path}")
-        
-        items = []
-        for item in sorted(path.iterdir(), key=lambda x: (not x.is_dir(), x.name.lower())):
-            # 跳过隐藏文件
-            if item.name.startswith('.'):
-                continue
-            
-            item_info = {
-                "name": item.name,
-                "path": str(item.relative_to(self.workspace)),
-                "is_dir": item.is_dir()
-            }
-            
-            if item.is_file():
-                stat = item.stat()
-                item_info["size"] = stat.st_size
-                item_info["modified"] = datetime.fromtimestamp(stat.st_mtime).isoformat()
-            elif item.is_dir():
-                # 检查文件夹是否为空（只检查非隐藏文件）
-                try:
-                    has_visible_content = any(
-                        not child.name.startswith('.') for child in item.iterdir()
-                    )
-                    item_info["is_empty"] = not has_visible_content
-                except PermissionError:
-                    item_info["is_empty"] = True  # 无权限时视为空
-            
-            items.append(item_info)
-        
-        return items
     
-    async def read_file(self, relative_path: str) -> Dict[str, Union[str, bool]]:
+    def directory_generation(self, relative_path: str) -> int:
         """
-        读取文件内容
+        目录列表的代数（列表缓存重新列出该目录时变化），用于条件请求
         
-        Args:
-            relative_path: 相对路径
+        Raises:
+            ValueError / FileNotFoundError / NotADirectoryError
+        """
+        return directory_cache.generation(self._resolve_path(relative_path), self.workspace)
+    
+    def resolve_file(self, relative_path: str) -> Path:
+        """
+        解析相对路径为已存在文件的绝对路径
         
-        Returns:
-            包含内容、是否为二进制、文件类型等信息的字典
+        Raises:
+            FileNotFoundError: 文件不存在或工作区未设置
+            IsADirectoryError: 路径是目录
+            ValueError: 路径越出工作目录
         """
         if not self.workspace:
             raise FileNotFoundError("工作区未设置")
@@ -164,6 +677,21 @@ class FileService:
         if path.is_dir():
             raise IsADirectoryError(f"路径是目录: {relative_path}")
         
+        return path
+    
+    async def read_file(self, relative_path: str) -> Dict[str, Union[str, bool]]:
+        """
+        读取文件内容
+        
+        Args:
+            relative_path: 相对路径
+        
+        Returns:
+            包含内容、是否为二进制、文件类型等信息的字典；
+            超过 INLINE_BINARY_LIMIT 的二进制文件 content 为 None
+        """
+        path = self.resolve_file(relative_path)
+        
         # 检查是否为二进制文件
         is_binary = is_binary_file(path)
         
@@ -171,43 +699,80 @@ class FileService:
         lock = self._get_file_lock(path)
         async with lock:
             if is_binary:
-                # 二进制文件：读取并转为 base64
-                async with aiofiles.open(path, mode='rb') as f:
-                    content = await f.read()
+                size = path.stat().st_size
+                content = None
+                if size <= INLINE_BINARY_LIMIT:
+                    # 小的二进制文件：读取并转为 base64
+                    async with aiofiles.open(path, mode='rb') as f:
+                        content = base64.b64encode(await f.read()).decode('utf-8')
                 return {
-                    'content': base64.b64encode(content).decode('utf-8'),
+                    'content': content,
                     'is_binary': True,
                     'mime_type': self._get_mime_type(path),
-                    'size': len(content)
+                    'size': size
                 }
             else:
-                # 文本文件：尝试多种编码
-                encodings = ['utf-8', 'gbk', 'gb2312', 'latin-1']
-                last_error = None
-                
-                for encoding in encodings:
-                    try:
-                        async with aiofiles.open(path, mode='r', encoding=encoding) as f:
-                            content = await f.read()
-                        return {
-                            'content': content,
-                            'is_binary': False,
-                            'encoding': encoding
-                        }
-                    except UnicodeDecodeError as e:
-                        last_error = e
-                        continue
-                
-                # 如果所有编码都失败，作为二进制处理
+                # 文本文件：只读取一次，在内存中检测编码
                 async with aiofiles.open(path, mode='rb') as f:
-                    content = await f.read()
+                    file_stat = os.fstat(f.fileno())
+                    data = await f.read()
+                content, encoding = encoding_cache.decode(path, file_stat, data)
+                content = _normalize_newlines(content)
                 return {
-                    'content': base64.b64encode(content).decode('utf-8'),
-                    'is_binary': True,
-                    'mime_type': 'application/octet-stream',
-                    'size': len(content)
+                    'content': content,
+                    'is_binary': False,
+                    'encoding': encoding,
+                    'version': content_version(content)
                 }
     
+    async def read_lines(self, relative_path: str, start_line: int = 1, line_count: int = 1000) -> Dict[str, Union[str, int]]:
+        """
+        按行读取文本文件的一段（大文件无需整体读入）
+        
+        通过 mmap 和缓存的行偏移索引定位，只解码窗口内的字节
+        
+        Args:
+            relative_path: 相对路径
+            start_line: 起始行号（从 1 开始）
+            line_count: 行数
+        
+        Returns:
+            content（保留原有换行符）、start_line、end_line、total_lines、size、encoding
+        
+        Raises:
+            ValueError: 二进制文件
+        """
+        path = self.resolve_file(relative_path)
+        if is_binary_file(path):
+            raise ValueError(f"二进制文件不支持按行读取: {relative_path}")
+        
+        start = max(start_line, 1) - 1
+        lock = self._get_file_lock(path)
+        async with lock:
+            with open(path, 'rb') as f:
+                file_stat = os.fstat(f.fileno())
+                if file_stat.st_size == 0:
+                    data, total_lines, end = b'', 0, 0
+                else:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                        index = get_line_index(path, buf, file_stat)
+                        total_lines = index.total_lines
+                        start = min(start, total_lines)
+                        end = min(start + max(line_count, 0), total_lines)
+                        data = buf[index.line_offset(buf, start):index.line_offset(buf, end)]
+        
+        # 窗口只是文件的一部分，优先使用整个文件检测过的编码，不把窗口的检测结果写入缓存
+        content, encoding = decode_text(data, encoding_cache.get(path, file_stat))
+        return {
+            'content': content,
+            'is_binary': False,
+            'encoding': encoding,
+            'start_line': start + 1,
+            'end_line': end,
+            'total_lines': total_lines,
+            'size': file_stat.st_size
+        }
+    
     def _get_mime_type(self, path: Path) -> str:
         """获取文件的 MIME 类型"""
         ext = path.suffix.lower()
@@ -225,13 +790,16 @@ class FileService:
         }
         return mime_types.get(ext, 'application/octet-stream')
     
-    async def save_file(self, relative_path: str, content: str) -> None:
+    async def save_file(self, relative_path: str, content: str) -> str:
         """
-        保存文件内容
+        保存文件内容（原子替换）
         
         Args:
             relative_path: 相对路径
             content: 文件内容
+        
+        Returns:
+            保存后的内容版本
         """
         if not self.workspace:
             raise PermissionError("工作区未设置")
@@ -244,8 +812,59 @@ class FileService:
         # 使用文件锁
         lock = self._get_file_lock(path)
         async with lock:
-            async with aiofiles.open(path, mode='w', encoding='utf-8') as f:
-                await f.write(content)
+            write_atomic(path, content)
+        
+        # 通知代码索引更新
+        notify_file_changed(path)
+        return content_version(_normalize_newlines(content))
+    
+    async def patch_file(
+        self,
+        relative_path: str,
+        base_version: str,
+        edits: Optional[List[Dict[str, Any]]] = None,
+        diff: Optional[str] = None
+    ) -> Dict[str, Union[str, int]]:
+        """
+        按补丁保存文件：只需上传修改的部分
+        
+        补丁相对于 base_version（read_file 返回的 version）对应的内容；
+        文件当前内容与之不一致时拒绝保存
+        
+        Args:
+            relative_path: 相对路径
+            base_version: 基准版本
+            edits: 文本编辑列表（见 apply_text_edits）
+            diff: 统一格式差异（见 apply_unified_diff），与 edits 二选一
+        
+        Returns:
+            version（保存后的版本）和 size（字符数）
+        
+        Raises:
+            VersionConflictError: 基准版本不是文件当前版本
+            ValueError: 补丁无效
+        """
+        path = self.resolve_file(relative_path)
+        if is_binary_file(path):
+            raise ValueError(f"二进制文件不支持补丁保存: {relative_path}")
+        if (edits is None) == (diff is None):
+            raise ValueError("edits 和 diff 必须提供且只能提供一个")
+        
+        lock = self._get_file_lock(path)
+        async with lock:
+            with open(path, 'rb') as f:
+                file_stat = os.fstat(f.fileno())
+                data = f.read()
+            text = _normalize_newlines(encoding_cache.decode(path, file_stat, data)[0])
+            current_version = content_version(text)
+            if current_version != base_version:
+                raise VersionConflictError(current_version)
+            
+            text = apply_text_edits(text, edits) if edits is not None else apply_unified_diff(text, diff)
+            write_atomic(path, text)
+        
+        notify_file_changed(path)
+        return {'version': content_version(text), 'size': len(text)}
     
     async def create(self, relative_path: str, is_dir: bool = False) -> str:
         """
@@ -277,6 +896,7 @@ class FileService:
         else:
             path.parent.mkdir(parents=True, exist_ok=True)
             path.touch()
+        notify_file_changed(path)
         
         return str(path.relative_to(self.workspace))
     
@@ -310,6 +930,8 @@ class FileService:
             raise FileExistsError(f"目标名称已存在: {new_name}")
         
         old_path.rename(new_path)
+        notify_file_changed(old_path)
+        notify_file_changed(new_path)
         
         return str(new_path.relative_to(self.workspace))
     
@@ -334,6 +956,7 @@ class FileService:
             shutil.rmtree(path)
         else:
             path.unlink()
+        notify_file_changed(path)
     
     async def exists(self, relative_path: str) -> bool:
         """
@@ -382,5 +1005,6 @@ class FileService:
         else:
             target_path.parent.mkdir(parents=True, exist_ok=True)
             shutil.copy2(source_path, target_path)
+        notify_file_changed(target_path)
 
         return str(target_path.relative_to(self.workspace))
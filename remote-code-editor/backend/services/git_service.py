@@ -14,6 +14,11 @@ from git import Repo, GitCommandError, InvalidGitRepositoryError
 from git.exc import NoSuchPathError
 from django.conf import settings
 
+from code_index.workspace_snapshot import DEFAULT_RULES, IgnoreRules
+
+
+# 搜索仓库时额外跳过的目录（虚拟环境和构建输出，不在默认忽略目录中）
+EXTRA_IGNORE_DIRS = frozenset({'env', 'target'})
 
 class GitService:
     """Git服务类"""
@@ -502,13 +507,19 @@ class GitService:
                         except Exception:
                             pass
                     
-                    # 递归搜索子目录
-                    for item in path.iterdir():
-                        if item.is_dir() and not item.name.startswith('.'):
-                            # 跳过一些常见的非代码目录
-                            if item.name in ['node_modules', '__pycache__', 'venv', '.venv', 'env', 'build', 'dist', 'target']:
-                                continue
-                            find_git_repos(item, depth + 1, max_depth)
+                    # 递归搜索子目录（scandir 直接给出类型，无需逐个 stat）
+                    with os.scandir(path) as entries:
+                        subdirs = [
+                            entry.name for entry in entries
+                            if not entry.name.startswith('.') and entry.is_dir(follow_symlinks=False)
+                        ]
+                    # 跳过与工作区快照相同的默认忽略目录、额外忽略的目录，以及当前目录 .gitignore 中忽略的目录
+                    rules = IgnoreRules.load(path)
+                    for name in sorted(subdirs):
+                        if name in EXTRA_IGNORE_DIRS or DEFAULT_RULES.match(name, True) or \
+                                (rules and rules.match(name, True)):
+                            continue
+                        find_git_repos(path / name, depth + 1, max_depth)
                 
                 except (PermissionError, OSError):
                     pass
@@ -0,0 +1,397 @@
+"""
+内容搜索服务模块
+工作区全文搜索的共享逻辑（供搜索接口和 Agent 工具共用）：
+先由内容索引（三元组倒排表）得到候选文件，再用编译好的正则逐个确认；
+内容索引尚未建好时在后台构建，本次搜索按忽略规则逐个目录扫描全部文件
+"""
+import fnmatch
+import mmap
+import os
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, AnyStr, Deque, Dict, Iterable, Iterator, List, Optional, Pattern, Tuple
+
+from django.conf import settings
+
+from code_index.content_index import SNIFF_BYTES, is_binary, query_plan
+from code_index.workspace_snapshot import walk_workspace
+from services.code_index_service import get_content_index
+
+
+# 匹配行内容的最大显示长度
+MAX_LINE_LENGTH = 200
+
+# 不小于该大小的文件通过 mmap 搜索，不整体读入内存
+MMAP_THRESHOLD = 1024 * 1024
+
+
+@dataclass
+class ContentMatch:
+    """单个匹配"""
+    line: int
+    column: int
+    text: str
+
+
+def build_pattern(
+    query: str,
+    regex: bool = False,
+    case_sensitive: bool = False,
+    whole_word: bool = False
+) -> Pattern:
+    """
+    根据搜索选项编译正则
+
+    Raises:
+        re.error: 正则表达式无效
+    """
+    pattern = query if regex else re.escape(query)
+    if whole_word:
+        pattern = r'\b(?:' + pattern + r')\b'
+    # 在整个文件内容上匹配，^ 和 $ 仍按行
+    flags = re.MULTILINE | (0 if case_sensitive else re.IGNORECASE)
+    return re.compile(pattern, flags)
+
+
+@lru_cache(maxsize=32)
+def _bytes_pattern(pattern: Pattern) -> Optional[Pattern]:
+    r"""
+    str 正则对应的 bytes 正则（用于 mmap 的大文件），无法转换时返回 None
+
+    bytes 正则的 \w、\b 和忽略大小写只作用于 ASCII 字符
+    """
+    try:
+        return re.compile(pattern.pattern.encode('utf-8'), pattern.flags & ~re.UNICODE)
+    except re.error:
+        return None
+
+
+def _is_hidden(rel_path: str) -> bool:
+    """以 . 开头的文件（与原先的搜索一致，.github 等目录下的文件照常搜索；忽略的目录由工作区规则排除）"""
+    return os.path.basename(rel_path).startswith('.')
+
+
+def _scan(buf: AnyStr, pattern: Pattern, max_matches: int) -> List[ContentMatch]:
+    """
+    用 finditer 扫描整个缓冲区（str、bytes 或 mmap），每行只取第一个匹配
+
+    行号由相邻两个匹配之间的换行数累加得到，只统计到最后一个需要的匹配为止
+    """
+    newline = '\n' if isinstance(buf, str) else b'\n'
+    # mmap 没有 count()，切片后统计
+    count = buf.count if not isinstance(buf, mmap.mmap) else (lambda sub, start, end: buf[start:end].count(sub))
+    matches: List[ContentMatch] = []
+    line, counted = 1, 0
+    next_line = 0
+    for found in pattern.finditer(buf):
+        start = found.start()
+        if start < next_line:
+            continue
+        line += count(newline, counted, start)
+        counted = start
+        line_start = buf.rfind(newline, 0, start) + 1
+        line_end = buf.find(newline, start)
+        if line_end < 0:
+            line_end = len(buf)
+        text = buf[line_start:line_end]
+        if not isinstance(text, str):
+            text = text.decode('utf-8', errors='ignore')
+        matches.append(ContentMatch(line, start - line_start + 1, text.strip()[:MAX_LINE_LENGTH]))
+        if len(matches) >= max_matches:
+            break
+        next_line = line_end + 1
+    return matches
+
+
+def search_file(path: Path, pattern: Pattern, max_matches: int) -> List[ContentMatch]:
+    """
+    在单个文件中搜索（跳过含 NUL 字节的二进制文件）
+
+    小文件解码后整体匹配；大文件通过 mmap 用 bytes 正则匹配，列号为字节偏移
+    """
+    try:
+        with open(path, 'rb') as f:
+            if is_binary(f.read(SNIFF_BYTES)):
+                return []
+            f.seek(0)
+            if os.fstat(f.fileno()).st_size >= MMAP_THRESHOLD:
+                raw_pattern = _bytes_pattern(pattern)
+                if raw_pattern is not None:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                        return _scan(buf, raw_pattern, max_matches)
+            return _scan(f.read().decode('utf-8', errors='ignore'), pattern, max_matches)
+    except (OSError, ValueError):
+        return []
+
+
+class SearchJob:
+    """
+    一次内容搜索
+
+    候选文件交给线程池扫描，run() 按路径顺序逐个产出有匹配的文件，首批结果无需等待全部扫描完。
+    cancel() 可从任意线程调用（如用户输入了新的查询），尚未开始的文件不再扫描；
+    达到结果数预算或超出时间预算时提前结束
+    """
+
+    # 等待扫描结果时检查取消和超时的间隔（秒）
+    POLL_INTERVAL = 0.05
+
+    def __init__(
+        self,
+        workspace: str,
+        pattern: Pattern,
+        max_files: Optional[int] = None,
+        max_matches_per_file: int = 10,
+        max_results: Optional[int] = None,
+        timeout: Optional[float] = None,
+        workers: int = 4,
+        file_pattern: Optional[str] = None,
+        max_file_size: Optional[int] = None,
+        include_hidden: bool = False,
+        search_id: Optional[str] = None
+    ):
+        """
+        初始化搜索
+
+        Args:
+            workspace: 工作区路径
+            pattern: build_pattern() 编译的正则
+            max_files: 最多返回的文件数
+            max_matches_per_file: 每个文件最多返回的匹配数
+            max_results: 所有文件合计最多返回的匹配数
+            timeout: 时间预算（秒）
+            workers: 扫描线程数
+            file_pattern: 文件名通配符（如 *.py）
+            max_file_size: 跳过超过该大小的文件（字节）
+            include_hidden: 是否搜索以 . 开头的文件
+            search_id: 搜索 ID（用于取消），默认随机生成
+        """
+        self.id = search_id or uuid.uuid4().hex
+        self.workspace = workspace
+        self.pattern = pattern
+        self.max_files = max_files
+        self.max_matches_per_file = max_matches_per_file
+        self.max_results = max_results
+        self.timeout = timeout
+        self.workers = max(1, workers)
+        self.file_pattern = file_pattern
+        self.max_file_size = max_file_size
+        self.include_hidden = include_hidden
+
+        self._cancelled = threading.Event()
+        # 取消或已结束：工作线程跳过尚未开始的文件
+        self._stopped = threading.Event()
+        self.files = 0
+        self.matches = 0
+        self.scanned = 0
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        """取消搜索"""
+        self._cancelled.set()
+        self._stopped.set()
+
+    def _candidates(self, paths: Iterable[str]) -> Iterator[str]:
+        for rel_path in paths:
+            if not self.include_hidden and _is_hidden(rel_path):
+                continue
+            if self.file_pattern and not fnmatch.fnmatch(Path(rel_path).name, self.file_pattern):
+                continue
+            yield rel_path
+
+    def _walk(self, root: Path) -> Iterator[str]:
+        """内容索引就绪前的候选：工作区中全部未被忽略的文件（随取随列，受时间预算和取消约束）"""
+        for key, _, files in walk_workspace(root):
+            for name in files:
+                yield os.path.join(key, name) if key else name
+
+    def _search(self, path: Path) -> List[ContentMatch]:
+        if self._stopped.is_set():
+            return []
+        if self.max_file_size is not None:
+            try:
+                if path.stat().st_size > self.max_file_size:
+                    return []
+            except OSError:
+                return []
+        return search_file(path, self.pattern, self.max_matches_per_file)
+
+    def run(self) -> Iterator[Dict]:
+        """
+        执行搜索，逐个产出事件:
+            {"type": "file", "file": 相对路径, "matches": [ContentMatch]}
+            {"type": "done", "status": completed/truncated/timeout/cancelled,
+             "files", "matches", "scanned", "elapsed_ms"}（最后一个）
+
+        生成器提前关闭时停止扫描
+        """
+        started = time.monotonic()
+        deadline = started + self.timeout if self.timeout else None
+        status = "completed"
+        with _jobs_lock:
+            _active_jobs[self.id] = self
+
+        # 不等待内容索引构建（首次构建要读取整个工作区，不受本次搜索的预算约束；
+        # 未开启 CONTENT_INDEX_ENABLED 时不会构建，直接扫描工作区文件）
+        index = get_content_index(self.workspace, wait=False)
+        if index is not None:
+            root = index.workspace
+            candidates = self._candidates(index.candidates(query_plan(self.pattern.pattern, self.pattern.flags)))
+        else:
+            root = Path(self.workspace).resolve()
+            candidates = self._candidates(self._walk(root))
+        pending: Deque[Tuple[str, Future]] = deque()
+        executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="search")
+        try:
+            while True:
+                # 保持少量文件在途，取消后不会留下大量排队的任务
+                while len(pending) < self.workers * 2 and not self._stopped.is_set():
+                    rel_path = next(candidates, None)
+                    if rel_path is None:
+                        break
+                    pending.append((rel_path, executor.submit(self._search, root / rel_path)))
+                if not pending:
+                    break
+
+                rel_path, future = pending.popleft()
+                while not future.done() and not self._cancelled.is_set():
+                    if deadline is not None and time.monotonic() >= deadline:
+                        break
+                    wait([future], timeout=self.POLL_INTERVAL)
+                if self._cancelled.is_set():
+                    status = "cancelled"
+                    break
+                if not future.done():
+                    status = "timeout"
+                    break
+
+                self.scanned += 1
+                matches = future.result()
+                if matches:
+                    if self.max_results is not None:
+                        matches = matches[:self.max_results - self.matches]
+                    self.files += 1
+                    self.matches += len(matches)
+                    yield {"type": "file", "file": rel_path, "matches": matches}
+                    if (self.max_files is not None and self.files >= self.max_files) or \
+                            (self.max_results is not None and self.matches >= self.max_results):
+                        status = "truncated"
+                        break
+                if deadline is not None and time.monotonic() >= deadline:
+                    if pending or next(candidates, None) is not None:
+                        status = "timeout"
+                    break
+        finally:
+            self._stopped.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+            with _jobs_lock:
+                _active_jobs.pop(self.id, None)
+
+        yield {
+            "type": "done",
+            "status": status,
+            "files": self.files,
+            "matches": self.matches,
+            "scanned": self.scanned,
+            "elapsed_ms": round((time.monotonic() - started) * 1000, 1),
+        }
+
+
+# 正在进行的搜索: ID -> SearchJob
+_active_jobs: Dict[str, SearchJob] = {}
+_jobs_lock = threading.Lock()
+
+
+def cancel_search(search_id: str) -> bool:
+    """按 ID 取消正在进行的搜索，返回是否找到"""
+    with _jobs_lock:
+        job = _active_jobs.get(search_id)
+    if job is None:
+        return False
+    job.cancel()
+    return True
+
+
+def create_search_job(workspace: str, query: str, options: Dict[str, Any], search_id: Optional[str] = None) -> SearchJob:
+    """
+    根据搜索接口的选项创建搜索（默认预算取自配置）
+
+    Args:
+        options: regex、caseSensitive、wholeWord、filePattern、maxResults、timeout
+
+    Raises:
+        re.error: 正则表达式无效
+    """
+    pattern = build_pattern(
+        query,
+        options.get('regex', False),
+        options.get('caseSensitive', False),
+        options.get('wholeWord', False)
+    )
+    max_results = getattr(settings, 'SEARCH_MAX_RESULTS', 2000)
+    timeout = getattr(settings, 'SEARCH_TIMEOUT', 10.0)
+    return SearchJob(
+        workspace,
+        pattern,
+        max_results=min(int(options.get('maxResults') or max_results), max_results),
+        timeout=min(float(options.get('timeout') or timeout), timeout),
+        workers=getattr(settings, 'SEARCH_WORKERS', 4),
+        file_pattern=options.get('filePattern') or None,
+        search_id=search_id
+    )
+
+
+def event_to_json(event: Dict) -> Dict:
+    """将搜索事件转换为接口格式（匹配为 line/column/lineContent）"""
+    if event["type"] != "file":
+        return event
+    return {
+        "type": "file",
+        "file": event["file"],
+        "matches": [
+            {"line": m.line, "column": m.column, "lineContent": m.text}
+            for m in event["matches"]
+        ],
+    }
+
+
+def search_workspace(
+    workspace: str,
+    pattern: Pattern,
+    max_files: int = 50,
+    max_matches_per_file: int = 10,
+    file_pattern: Optional[str] = None,
+    max_file_size: Optional[int] = None,
+    include_hidden: bool = False,
+    timeout: Optional[float] = None
+) -> List[Dict]:
+    """
+    在工作区中搜索内容，等待搜索结束后一次返回（参数见 SearchJob）
+
+    Returns:
+        [{"file": 相对路径, "matches": [ContentMatch]}]，按路径排序
+    """
+    job = SearchJob(
+        workspace,
+        pattern,
+        max_files=max_files,
+        max_matches_per_file=max_matches_per_file,
+        timeout=timeout,
+        file_pattern=file_pattern,
+        max_file_size=max_file_size,
+        include_hidden=include_hidden
+    )
+    return [
+        {"file": event["file"], "matches": event["matches"]}
+        for event in job.run() if event["type"] == "file"
+    ]
@@ -0,0 +1,1054 @@
+"""
+代码索引单元测试
+"""
+import os
+import re
+import errno
+import time
+import threading
+import tempfile
+import pytest
+from pathlib import Path
+
+# 添加父目录到路径
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from code_index.code_graph import CodeGraph, CodeSymbol, CodeEdge
+from code_index import indexer as indexer_module
+from code_index.indexer import CodeIndexer
+from code_index.index_store import IndexStore
+from code_index.searcher import CodeSearcher
+from code_index.text_index import tokenize
+from code_index.watcher import IndexWatcher, notify_file_changed
+from code_index.registry import IndexRegistry, estimate_graph_bytes
+from code_index.content_index import ContentIndex, query_plan
+from code_index.workspace_snapshot import IgnoreRules, WorkspaceSnapshot, compile_glob, walk_workspace
+from code_index.path_index import PathIndex, score_path
+
+
+@pytest.fixture
+def temp_workspace():
+    """创建临时工作目录"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        yield Path(tmpdir)
+
+
+def write(workspace: Path, rel_path: str, content: str):
+    """写入文件并推进 mtime，避免同一时钟刻度内的修改被忽略"""
+    path = workspace / rel_path
+    path.parent.mkdir(parents=True, exist_ok=True)
+    existed = path.exists()
+    old_mtime = path.stat().st_mtime_ns if existed else 0
+    path.write_text(content, encoding='utf-8')
+    if existed:
+        os.utime(path, ns=(old_mtime + 10**9, old_mtime + 10**9))
+
+
+class TestIncrementalIndex:
+    """增量索引与持久化测试类"""
+
+    def test_incremental_drops_stale_symbols(self, temp_workspace):
+        """测试增量索引移除已变更/已删除文件的旧符号"""
+        write(temp_workspace, "a.py", "def old_func():\n    helper()\n")
+        write(temp_workspace, "b.py", "def keep():\n    pass\n")
+
+        indexer = CodeIndexer(str(temp_workspace))
+        graph = indexer.index()
+        assert graph.get_symbol("a.py", "old_func") is not None
+
+        write(temp_workspace, "a.py", "def new_func():\n    pass\n")
+        (temp_workspace / "b.py").unlink()
+        graph = indexer.index(incremental=True)
+
+        assert graph.get_symbol("a.py", "old_func") is None
+        assert graph.get_symbol("a.py", "new_func") is not None
+        assert graph.get_symbol("b.py", "keep") is None
+        assert graph.find_callees("old_func") == []
+
+    def test_incremental_skips_unchanged_files(self, temp_workspace, monkeypatch):
+        """测试指纹未变化的文件不会重新解析"""
+        write(temp_workspace, "a.py", "def f():\n    pass\n")
+        indexer = CodeIndexer(str(temp_workspace))
+        indexer.index()
+
+        parsed = []
+        original = indexer_module.parse_source
+        monkeypatch.setattr(indexer_module, "parse_source",
+                            lambda data, rel_path, *args: (parsed.append(rel_path), original(data, rel_path))[1])
+
+        indexer.index(incremental=True)
+        assert parsed == []
+
+        # 只 touch 不修改内容，也不需要重新解析
+        stat = (temp_workspace / "a.py").stat()
+        os.utime(temp_workspace / "a.py", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        indexer.index(incremental=True)
+        assert parsed == []
+
+    def test_store_reload_after_restart(self, temp_workspace, monkeypatch):
+        """测试重启后从存储加载并只解析变更的文件"""
+        write(temp_workspace, "a.py", "class A:\n    def m(self):\n        g()\n")
+        write(temp_workspace, "b.py", "def g():\n    pass\n")
+
+        store = IndexStore.for_workspace(str(temp_workspace))
+        first = CodeIndexer(str(temp_workspace), store=store).index(incremental=True)
+
+        # 模拟重启：新的索引器只解析变更的 b.py
+        write(temp_workspace, "b.py", "def g2():\n    pass\n")
+        indexer = CodeIndexer(str(temp_workspace), store=IndexStore.for_workspace(str(temp_workspace)))
+        parsed = []
+        original = indexer_module.parse_source
+        monkeypatch.setattr(indexer_module, "parse_source",
+                            lambda data, rel_path, *args: (parsed.append(rel_path), original(data, rel_path))[1])
+        graph = indexer.index(incremental=True)
+
+        assert parsed == ["b.py"]
+        assert set(graph.file_symbols["a.py"]) == set(first.file_symbols["a.py"])
+        assert graph.get_symbol("a.py", "A.m").parent == "A"
+        assert graph.get_symbol("b.py", "g") is None
+        assert graph.get_symbol("b.py", "g2") is not None
+        assert len(graph.edges) == len(graph.get_file_edges("a.py"))
+
+    def test_call_resolution_restored_after_restart(self, temp_workspace, monkeypatch):
+        """测试重启后从存储恢复调用解析结果，只重新解析受变更影响的调用"""
+        from code_index.resolver import CallResolver
+
+        write(temp_workspace, "a.py", "from b import g\n\ndef f():\n    g()\n\ndef h():\n    f()\n")
+        write(temp_workspace, "b.py", "def g():\n    pass\n")
+        CodeIndexer(str(temp_workspace), store=IndexStore.for_workspace(str(temp_workspace))).index(incremental=True)
+
+        resolved = []
+        original = CallResolver._resolve_source
+        monkeypatch.setattr(CallResolver, "_resolve_source",
+                            lambda self, source: (resolved.append(source), original(self, source))[1])
+
+        def restart():
+            store = IndexStore.for_workspace(str(temp_workspace))
+            return CodeSearcher(CodeIndexer(str(temp_workspace), store=store).index(incremental=True))
+
+        searcher = restart()
+        assert resolved == []
+        assert [c["name"] for c in searcher.search_callers("g")] == ["f"]
+        assert [c["key"] for c in searcher.search_callees("h")] == ["a.py::f"]
+
+        # 被调用的定义变化：只重新解析相关的调用，新的结果同样写入快照
+        write(temp_workspace, "b.py", "def g2():\n    pass\n")
+        searcher = restart()
+        assert resolved == ["a.py::f"]
+        assert [c["file"] for c in searcher.search_callees("f")] == ["external"]
+        resolved.clear()
+        assert [c["file"] for c in restart().search_callees("f")] == ["external"]
+        assert resolved == []
+
+
+class TestParallelIndex:
+    """并行索引测试类"""
+
+    def test_parallel_matches_serial(self, temp_workspace):
+        """测试多进程索引结果与串行一致"""
+        for i in range(20):
+            write(temp_workspace, f"pkg{i % 3}/mod{i}.py", (
+                f"import os\nfrom pkg.mod{i} import thing\n\n"
+                f"class C{i}(Base):\n    \"\"\"类 {i}\"\"\"\n"
+                f"    def run(self):\n        helper_{i}()\n\n"
+                f"def helper_{i}(x: int) -> int:\n    return os.getpid()\n"
+            ))
+        write(temp_workspace, "broken.py", "def (:\n")
+
+        serial = CodeIndexer(str(temp_workspace)).index()
+
+        parallel_indexer = CodeIndexer(str(temp_workspace), workers=2, chunk_size=3)
+        parallel_indexer.PARALLEL_MIN_FILES = 0
+        parallel = parallel_indexer.index()
+
+        assert parallel.to_dict() == serial.to_dict()
+        assert dict(parallel.imports_map) == dict(serial.imports_map)
+        assert parallel_indexer.fingerprints.keys() == {
+            str(p.relative_to(temp_workspace)) for p in temp_workspace.rglob("*.py")
+        }
+
+
+class TestParseSource:
+    """单文件解析测试类"""
+
+    def test_scoped_symbols_and_calls(self):
+        """测试一次遍历产出限定名符号，方法不重复记录，调用归属最内层函数"""
+        source = (
+            "import os\n"
+            "class A(Base):\n"
+            "    x = f()\n"
+            "    def m(self, a: int) -> int:\n"
+            "        g()\n"
+            "        def inner():\n"
+            "            h()\n"
+            "    class N:\n"
+            "        async def run(self):\n"
+            "            from pkg import k\n"
+            "            k()\n"
+            "def top():\n"
+            "    os.path.join()\n"
+        )
+        symbols, edges, imports = indexer_module.parse_source(source.encode(), "a.py")
+
+        assert [(s[0], s[1], s[7]) for s in symbols] == [
+            ("A", "class", None),
+            ("A.m", "method", "A"),
+            ("A.m.inner", "function", "A.m"),
+            ("A.N", "class", "A"),
+            ("A.N.run", "method", "A.N"),
+            ("top", "function", None),
+        ]
+        assert symbols[1][5] == "def m(self, a: int) -> int"
+        assert symbols[4][5] == "async def run(self)"
+        assert edges == [
+            ("a.py::A", "*::Base", "inherits"),
+            ("a.py::A.m", "*::g", "calls"),
+            ("a.py::A.m.inner", "*::h", "calls"),
+            ("a.py::A.N.run", "*::k", "calls"),
+            ("a.py::top", "*::join", "calls"),
+        ]
+        assert imports == ["os", "pkg.k"]
+
+
+class TestCodeGraphAdjacency:
+    """代码图邻接查询测试类"""
+
+    @staticmethod
+    def build_graph():
+        graph = CodeGraph()
+        graph.add_symbol(CodeSymbol("Base", "class", "a.py", 1, 2))
+        graph.add_symbol(CodeSymbol("Child", "class", "b.py", 1, 5))
+        graph.add_symbol(CodeSymbol("run", "function", "b.py", 3, 5))
+        graph.add_symbol(CodeSymbol("main", "function", "c.py", 1, 3))
+        graph.add_edge(CodeEdge("b.py::Child", "*::Base", "inherits"))
+        graph.add_edge(CodeEdge("b.py::run", "*::helper", "calls"))
+        graph.add_edge(CodeEdge("c.py::main", "*::run", "calls"))
+        graph.add_edge(CodeEdge("c.py::main", "*::helper", "calls"))
+        return graph
+
+    def test_queries_by_name_and_key(self):
+        """测试按符号名和完整符号键查询"""
+        graph = self.build_graph()
+
+        assert graph.find_callers("helper") == ["b.py::run", "c.py::main"]
+        assert graph.find_callers("*::run") == ["c.py::main"]
+        assert graph.find_callees("main") == ["*::run", "*::helper"]
+        assert graph.find_callees("b.py::run") == ["*::helper"]
+        assert graph.find_references("run") == [{"file": "c.py", "line": 1, "type": "calls"}]
+        assert graph.get_class_hierarchy("Base") == {"name": "Base", "parents": [], "children": ["Child"]}
+        assert graph.get_class_hierarchy("Child")["parents"] == ["Base"]
+
+    def test_callees_by_method_name(self):
+        """测试不带类名的方法名也能查到方法调用的符号"""
+        graph = self.build_graph()
+        graph.add_symbol(CodeSymbol("Child.run", "method", "b.py", 6, 8, parent="Child"))
+        graph.add_edge(CodeEdge("b.py::Child.run", "*::save", "calls"))
+
+        assert graph.find_callees("run") == ["*::helper", "*::save"]
+        assert graph.find_callees("Child.run") == ["*::save"]
+        assert graph.find_callees("b.py::Child.run") == ["*::save"]
+        graph.remove_file("b.py")
+        assert graph.find_callees("run") == []
+
+    def test_generation_changes_with_symbols(self):
+        """测试符号增删后代数变化，且不同图的代数不重复"""
+        graph = self.build_graph()
+        generation = graph.generation
+        assert graph.find_callers("helper") and graph.generation == generation
+        graph.remove_file("c.py")
+        assert graph.generation != generation
+        assert CodeGraph().generation != CodeGraph().generation
+
+    def test_remove_file_updates_adjacency(self):
+        """测试移除文件后邻接表同步更新"""
+        graph = self.build_graph()
+        graph.remove_file("c.py")
+
+        assert graph.find_callers("helper") == ["b.py::run"]
+        assert graph.find_callers("run") == []
+        assert graph.find_callees("main") == []
+        assert "c.py::main" not in graph.out_edges
+        assert len(graph.edges) == 2
+
+    def test_compaction_keeps_queries(self):
+        """测试压缩边存储后查询结果不变"""
+        graph = self.build_graph()
+        graph.COMPACT_MIN_DEAD = 1
+        for target in ("run", "helper", "Base", "x", "y"):
+            graph.add_edge(CodeEdge("d.py::tmp", f"*::{target}", "calls"))
+        graph.remove_file("d.py")
+
+        # 已删除的边多于存活的边，触发压缩
+        assert len(graph._edge_type) == len(graph.edges) == 4
+        assert "d.py::tmp" not in graph._key_ids
+        assert graph.find_callers("run") == ["c.py::main"]
+        assert graph.find_callers("helper") == ["b.py::run", "c.py::main"]
+        assert graph.find_callees("c.py::main") == ["*::run", "*::helper"]
+        assert graph.find_references("Base") == [{"file": "b.py", "line": 1, "type": "inherits"}]
+        assert list(graph.out_edges) == ["b.py::Child", "b.py::run", "c.py::main"]
+
+    def test_memory_benchmark(self):
+        """测试紧凑存储比原存储方式占用更少内存"""
+        from code_index.benchmark import run
+        result = run(2000)
+        assert result["symbols"] == 2000
+        assert result["compact_bytes"] < result["legacy_bytes"]
+
+    def test_benchmark_suite_and_baseline(self):
+        """测试基准套件输出各项指标，并能与基线对比发现退化"""
+        import json
+        from code_index.benchmark import SuiteParams, compare, run_suite
+
+        params = SuiteParams(files=6, classes=1, methods=2, functions=2, fanout=2, queries=5, repeat=1)
+        result = run_suite(params)
+        assert result["stats"] == {"files": 6, "symbols": 30, "edges": 6 * (1 + 2 * 2 + 2 * 2)}
+        assert {"index", "search_symbol", "semantic_search", "find_callers",
+                "get_call_graph", "save", "load"} <= set(result["timings"])
+        assert result["memory"]["index_peak_bytes"] > 0
+        json.dumps(result)
+
+        assert compare(result, result)["regressions"] == []
+        faster = json.loads(json.dumps(result))
+        faster["timings"]["index"] = result["timings"]["index"] / 2
+        report = compare(result, faster, tolerance=0.5)
+        assert report["regressions"] == ["timings.index"]
+        assert report["metrics"]["timings.index"]["ratio"] == 2.0
+        faster["params"]["files"] = 7
+        assert compare(result, faster)["comparable"] is False
+
+
+class TestSymbolSearch:
+    """符号搜索索引测试类"""
+
+    @staticmethod
+    def build_graph():
+        graph = CodeGraph()
+        for i, (name, type_) in enumerate([
+            ("get_user_name", "function"),
+            ("getUser", "function"),
+            ("User", "class"),
+            ("user", "function"),
+            ("load_users", "function"),
+            ("HTTPServer", "class"),
+            ("User.get_user", "method"),
+        ]):
+            graph.add_symbol(CodeSymbol(name, type_, f"m{i}.py", 1, 1))
+        return graph
+
+    def test_match_tiers(self):
+        """测试精确/前缀/包含/模糊匹配的排序"""
+        searcher = CodeSearcher(self.build_graph())
+        results = [(r.symbol.name, r.match_type) for r in searcher.search_symbol("user")]
+
+        assert results[:2] == [("User", "exact"), ("user", "exact")]
+        assert ("User.get_user", "prefix") in results
+        assert results[-3:] == [("get_user_name", "contains"), ("getUser", "contains"), ("load_users", "contains")]
+
+        fuzzy = [(r.symbol.name, r.match_type) for r in searcher.search_symbol("gun")]
+        assert fuzzy == [("get_user_name", "fuzzy")]
+        assert [r.symbol.name for r in searcher.search_symbol("hs")] == ["HTTPServer"]
+
+    def test_type_filter_and_limit(self):
+        """测试类型过滤与数量限制"""
+        searcher = CodeSearcher(self.build_graph())
+        assert [r.symbol.name for r in searcher.search_symbol("user", "class")] == ["User"]
+        assert len(searcher.search_symbol("u", limit=2)) == 2
+
+    def test_index_follows_graph_changes(self):
+        """测试搜索索引随代码图增量更新"""
+        graph = self.build_graph()
+        searcher = CodeSearcher(graph)
+        assert searcher.search_symbol("load_users")
+
+        graph.remove_file("m4.py")
+        graph.add_symbol(CodeSymbol("load_accounts", "function", "m4.py", 1, 1))
+
+        assert searcher.search_symbol("load_users") == []
+        assert [r.symbol.name for r in searcher.search_symbol("load")] == ["load_accounts"]
+
+
+class TestSemanticSearch:
+    """BM25 全文检索测试类"""
+
+    def test_tokenize_identifiers(self):
+        """测试标识符与中文分词"""
+        assert tokenize("getUserName") == ["get", "user", "name", "getusername"]
+        assert tokenize("load_config_file") == ["load", "config", "file", "load_config_file"]
+        assert tokenize("读取文件") == ["读取", "取文", "文件"]
+
+    def test_ranking_and_incremental_update(self):
+        """测试 BM25 排序及随代码图增量更新"""
+        graph = CodeGraph()
+        graph.add_symbol(CodeSymbol("parse_config", "function", "a.py", 1, 2,
+                                    signature="def parse_config(path)", docstring="解析配置文件"))
+        graph.add_symbol(CodeSymbol("load", "function", "b.py", 1, 2,
+                                    signature="def load(config)", docstring="加载数据"))
+        graph.add_symbol(CodeSymbol("render", "function", "c.py", 1, 2,
+                                    signature="def render()", docstring="渲染页面"))
+        searcher = CodeSearcher(graph)
+
+        results = searcher.semantic_search("config")
+        assert [r["name"] for r in results] == ["parse_config", "load"]
+        assert results[0]["score"] > results[1]["score"]
+        assert [r["name"] for r in searcher.semantic_search("配置文件")] == ["parse_config"]
+
+        graph.remove_file("a.py")
+        graph.add_symbol(CodeSymbol("ConfigStore", "class", "d.py", 1, 9))
+        assert [r["name"] for r in searcher.semantic_search("config")] == ["ConfigStore", "load"]
+
+
+class TestLiveIndexUpdate:
+    """按文件变化实时更新索引测试类"""
+
+    def test_update_paths(self, temp_workspace):
+        """测试按路径更新：修改、新增、删除文件及删除目录"""
+        write(temp_workspace, "a.py", "def a():\n    pass\n")
+        write(temp_workspace, "pkg/b.py", "def b():\n    pass\n")
+        write(temp_workspace, "pkg/c.py", "def c():\n    pass\n")
+        indexer = CodeIndexer(str(temp_workspace))
+        graph = indexer.index()
+
+        write(temp_workspace, "a.py", "def a2():\n    pass\n")
+        write(temp_workspace, "d.py", "def d():\n    pass\n")
+        assert indexer.update_paths([str(temp_workspace / "a.py"), "d.py"]) is graph
+        assert graph.get_symbol("a.py", "a") is None
+        assert graph.get_symbol("a.py", "a2") is not None
+        assert graph.get_symbol("d.py", "d") is not None
+
+        for name in ("b.py", "c.py"):
+            (temp_workspace / "pkg" / name).unlink()
+        (temp_workspace / "pkg").rmdir()
+        indexer.update_paths([str(temp_workspace / "pkg")])
+        assert set(graph.file_symbols) == {"a.py", "d.py"}
+        assert set(indexer.fingerprints) == {"a.py", "d.py"}
+
+    def test_watcher_notify_and_flush(self, temp_workspace):
+        """测试保存通知经去抖后只更新变化的文件"""
+        write(temp_workspace, "a.py", "def a():\n    pass\n")
+        indexer = CodeIndexer(str(temp_workspace))
+        graph = indexer.index()
+
+        watcher = IndexWatcher(indexer, debounce=0.05, use_inotify=False).start()
+        try:
+            write(temp_workspace, "a.py", "def renamed():\n    pass\n")
+            notify_file_changed(temp_workspace / "a.py")
+            notify_file_changed("/outside/workspace.py")
+
+            deadline = time.monotonic() + 5
+            while graph.get_symbol("a.py", "renamed") is None and time.monotonic() < deadline:
+                time.sleep(0.02)
+            assert graph.get_symbol("a.py", "renamed") is not None
+            assert graph.get_symbol("a.py", "a") is None
+        finally:
+            watcher.stop()
+
+    def test_queries_wait_for_update(self, temp_workspace):
+        """测试查询与索引更新互斥：更新持有索引器的锁时查询等待其完成"""
+        write(temp_workspace, "a.py", "def a():\n    pass\n")
+        indexer = CodeIndexer(str(temp_workspace))
+        searcher = CodeSearcher(indexer.index())
+        assert searcher.graph.lock is indexer.lock
+
+        results = []
+        with indexer.lock:
+            thread = threading.Thread(target=lambda: results.append(searcher.semantic_search("a")))
+            thread.start()
+            thread.join(timeout=0.2)
+            assert thread.is_alive() and not results
+        thread.join(timeout=5)
+        assert results[0][0]["name"] == "a"
+
+    @pytest.mark.skipif(not sys.platform.startswith("linux"), reason="需要 inotify")
+    def test_inotify_honors_gitignore_and_falls_back(self, temp_workspace):
+        """测试 inotify 不监听被忽略的目录，事件源出错后改为轮询并全量扫描"""
+        write(temp_workspace, ".gitignore", "generated/\n")
+        write(temp_workspace, "a.py", "def a():\n    pass\n")
+        write(temp_workspace, "generated/b.py", "def b():\n    pass\n")
+        write(temp_workspace, "node_modules/c.js", "")
+        indexer = CodeIndexer(str(temp_workspace))
+        graph = indexer.index()
+
+        watcher = IndexWatcher(indexer, debounce=0.05).start()
+        try:
+            if watcher.backend_name != "inotify":
+                pytest.skip("inotify 不可用")
+            watched = {str(p.relative_to(temp_workspace)) for p in watcher._backend._watches.values()}
+            assert watched == {"."}
+
+            def broken(timeout):
+                raise OSError(errno.EBADF, "bad fd")
+            watcher._backend.poll = broken
+            write(temp_workspace, "d.py", "def d():\n    pass\n")
+
+            deadline = time.monotonic() + 5
+            while graph.get_symbol("d.py", "d") is None and time.monotonic() < deadline:
+                time.sleep(0.02)
+            assert watcher.backend_name == "polling"
+            assert graph.get_symbol("d.py", "d") is not None
+        finally:
+            watcher.stop()
+
+
+class TestWorkspaceSnapshot:
+    """工作区文件快照测试类"""
+
+    @staticmethod
+    def age_dirs(root: Path):
+        """把目录 mtime 调到过去，避免被当作刚修改过的目录每次都重新列出"""
+        old = time.time_ns() - 10 * 10**9
+        for dirpath, _, _ in os.walk(root):
+            os.utime(dirpath, ns=(old, old))
+
+    def test_ignore_rules(self):
+        """测试 gitignore 语法：通配符、锚定、仅目录、** 和 ! 规则"""
+        rules = IgnoreRules.parse([
+            "# comment", "*.log", "!keep.log", "/build/", "docs/**/*.tmp", "cache/", "a?c", "[!x]y"
+        ])
+        assert rules.match("x.log", False) is True
+        assert rules.match("sub/x.log", False) is True
+        assert rules.match("keep.log", False) is False
+        assert rules.match("build", True) is True
+        assert rules.match("sub/build", True) is None
+        assert rules.match("docs/a/b/c.tmp", False) is True
+        assert rules.match("docs/c.tmp", False) is True
+        assert rules.match("cache", False) is None
+        assert rules.match("sub/cache", True) is True
+        assert rules.match("abc", False) is True
+        assert (rules.match("ay", False), rules.match("xy", False)) == (True, None)
+
+    def test_gitignore_and_incremental_refresh(self, temp_workspace):
+        """测试按 .gitignore 过滤，并只重新列出变化的目录"""
+        for rel_path in ("a.py", "app.log", "node_modules/x.js", "src/b.py", "src/gen/c.py", "build/d.py"):
+            write(temp_workspace, rel_path, "x")
+        write(temp_workspace, ".gitignore", "*.log\n!build/\n")
+        write(temp_workspace, "src/.gitignore", "gen/\n")
+        self.age_dirs(temp_workspace)
+
+        snapshot = WorkspaceSnapshot(str(temp_workspace))
+        paths = [e.path for e in snapshot.files()]
+        assert paths == [".gitignore", "a.py", "build/d.py", "src/.gitignore", "src/b.py"]
+        assert snapshot.is_ignored("src/gen/c.py") and snapshot.is_ignored("node_modules")
+        assert not snapshot.is_ignored("src/b.py")
+
+        listed, version = snapshot.listed_dirs, snapshot.version
+        assert [e.path for e in snapshot.files()] == paths
+        assert (snapshot.listed_dirs, snapshot.version) == (listed, version)
+
+        write(temp_workspace, "src/new.py", "y")
+        assert "src/new.py" in [e.path for e in snapshot.files()]
+        assert snapshot.listed_dirs == listed + 1
+
+        # 修改忽略规则后重新过滤整个子树
+        write(temp_workspace, "src/.gitignore", "b.py\n")
+        assert [e.path for e in snapshot.files("src")] == ["src/.gitignore", "src/gen/c.py", "src/new.py"]
+
+    def test_walk_matches_snapshot(self, temp_workspace):
+        """测试不缓存的逐目录遍历与快照使用相同的忽略规则"""
+        for rel_path in ("a.py", "app.log", "node_modules/x.js", "src/b.py", "src/gen/c.py", "build/d.py"):
+            write(temp_workspace, rel_path, "x")
+        write(temp_workspace, ".gitignore", "*.log\n!build/\n")
+        write(temp_workspace, "src/.gitignore", "gen/\n")
+
+        walked = [os.path.join(key, name) if key else name
+                  for key, _, files in walk_workspace(temp_workspace) for name in files]
+        assert walked == [e.path for e in WorkspaceSnapshot(str(temp_workspace)).files()]
+        assert [key for key, _, _ in walk_workspace(temp_workspace, "src")] == ["src"]
+
+    def test_listing_cached_by_version(self, temp_workspace):
+        """测试排好序的文件和路径列表在快照未变化时复用，变化后重新生成"""
+        for rel_path in ("b.py", "a/c.py"):
+            write(temp_workspace, rel_path, "x")
+        self.age_dirs(temp_workspace)
+        snapshot = WorkspaceSnapshot(str(temp_workspace))
+        entries, paths = snapshot.listing()
+        assert paths == ("a/c.py", "b.py") == tuple(e.path for e in entries)
+        assert snapshot.listing()[1] is paths
+
+        write(temp_workspace, "a/d.py", "x")
+        self.age_dirs(temp_workspace)
+        assert snapshot.listing()[1] == ("a/c.py", "a/d.py", "b.py")
+
+    def test_compile_glob(self):
+        """测试路径通配符：* 和 ? 不跨越 /，** 匹配任意层目录"""
+        assert compile_glob("*.py").match("a.py")
+        assert not compile_glob("*.py").match("src/a.py")
+        assert compile_glob("src/*.py").match("src/a.py")
+        assert not compile_glob("src/*.py").match("src/sub/a.py")
+        assert compile_glob("**/*.py").match("a.py")
+        assert compile_glob("**/*.py").match("src/sub/a.py")
+        assert compile_glob("src/**").match("src/sub/a.py")
+        assert not compile_glob("src/a?.py").match("src/a/.py")
+
+    def test_indexer_honors_gitignore(self, temp_workspace):
+        """测试代码索引和内容索引跳过 .gitignore 忽略的文件"""
+        write(temp_workspace, ".gitignore", "generated/\n")
+        write(temp_workspace, "a.py", "def keep():\n    pass\n")
+        write(temp_workspace, "generated/b.py", "def skipped():\n    pass\n")
+
+        indexer = CodeIndexer(str(temp_workspace))
+        graph = indexer.index()
+        assert set(graph.file_symbols) == {"a.py"}
+        indexer.update_paths([str(temp_workspace / "generated" / "b.py")])
+        assert set(graph.file_symbols) == {"a.py"}
+        assert ContentIndex(str(temp_workspace)).index().search_candidates("skipped") == []
+
+
+class TestPathIndex:
+    """文件路径模糊查找测试类"""
+
+    def test_score_prefers_boundaries(self):
+        """测试路径段开头、驼峰和连续匹配得分更高，非子序列不匹配"""
+        assert score_path("src/user_controller.py", "xyz") is None
+        score, positions = score_path("src/UserController.py", "uc")
+        assert positions == [4, 8]
+        assert score > score_path("src/sauce.py", "uc")[0]
+        assert score_path("src/button.py", "but")[0] > score_path("src/abutment.py", "but")[0]
+        # 大小写敏感时不匹配其他大小写
+        assert score_path("src/usercontroller.py", "UC", case_sensitive=True) is None
+
+    def test_find_and_incremental_sync(self, temp_workspace):
+        """测试按分数取前 k 个，且快照变化后增量同步（不整体重建）"""
+        for rel_path in ("src/UserController.py", "src/user_list.py", "lib/cursor.py",
+                         "docs/usage.md", ".hidden/uc.py", "a/b/c/d/u/x/y/z/c.py"):
+            write(temp_workspace, rel_path, "x")
+        for i in range(20):
+            write(temp_workspace, f"pkg/m{i}.txt", "x")
+        TestWorkspaceSnapshot.age_dirs(temp_workspace)
+
+        index = PathIndex(WorkspaceSnapshot(str(temp_workspace))).refresh()
+        assert len(index) == 25
+        matches, complete = index.find("uc", limit=2)
+        assert complete
+        assert [m.path for m in matches] == ["src/UserController.py", "a/b/c/d/u/x/y/z/c.py"]
+        assert [m.path for m in index.find("UC")[0]] == ["src/UserController.py"]
+        assert index.find("qq") == ([], True)
+
+        # 锁外打分的查询持有的旧路径表不受增量同步影响
+        slots = index._paths
+        os.remove(temp_workspace / "lib" / "cursor.py")
+        write(temp_workspace, "lib/uc_helper.py", "x")
+        index.refresh(force=True)
+        assert index.rebuilds == 1
+        assert None not in slots and None in index._paths
+        assert [m.path for m in index.find("uc")[0][:2]] == ["lib/uc_helper.py", "src/UserController.py"]
+        assert index.find("cursor") == ([], True)
+
+    def test_budget(self, temp_workspace):
+        """测试超出时间预算时返回部分结果并标记未完成"""
+        for i in range(300):
+            write(temp_workspace, f"pkg/mod{i}.py", "x")
+        index = PathIndex(WorkspaceSnapshot(str(temp_workspace))).refresh()
+        matches, complete = index.find("mod", limit=5, budget=0)
+        assert not complete
+        assert len(matches) == 5
+        assert index.find("mod", limit=5)[1]
+
+
+class TestContentIndex:
+    """工作区内容（三元组）索引测试类"""
+
+    def test_query_plan(self):
+        """测试从字面量和正则中提取必须出现的三元组"""
+        assert query_plan("hello") == [frozenset({b"hel", b"ell", b"llo"})]
+        assert query_plan("ab") is None
+        assert query_plan(r"foo\d+bar") == [frozenset({b"foo", b"bar"})]
+        assert sorted(map(sorted, query_plan("(spam|eggs)x"))) == [[b"egg", b"ggs"], [b"pam", b"spa"]]
+        assert query_plan("(spam)?x") is None
+        assert query_plan("a[bc]d.*") is None
+        assert query_plan("(unclosed") is None
+        # 忽略大小写时不要求非 ASCII 三元组
+        assert query_plan("Ärger", 0) != query_plan("Ärger", re.IGNORECASE)
+
+    def test_candidates_and_incremental_update(self, temp_workspace):
+        """测试候选文件缩小、增量更新、二进制和大文件处理"""
+        write(temp_workspace, "a.py", "def HelloWorld():\n    pass\n")
+        write(temp_workspace, "b.txt", "nothing to see\n")
+        write(temp_workspace, "big.log", "x" * 200)
+        (temp_workspace / "blob.bin").write_bytes(b"hello\0world")
+        write(temp_workspace, "node_modules/dep.js", "helloworld")
+
+        index = ContentIndex(str(temp_workspace), max_file_size=100).index()
+        assert index.search_candidates("helloworld", re.IGNORECASE) == ["a.py", "big.log"]
+        # 三元组不区分大小写，候选是区分大小写匹配的超集
+        assert index.search_candidates("helloworld") == ["a.py", "big.log"]
+        assert index.candidates(None) == ["a.py", "b.txt", "big.log"]
+        assert index.stats()["binary"] == 1
+
+        write(temp_workspace, "b.txt", "HelloWorld again\n")
+        (temp_workspace / "a.py").unlink()
+        index.update_paths([str(temp_workspace / "a.py"), "b.txt"])
+        assert index.search_candidates("HelloWorld") == ["b.txt", "big.log"]
+
+        write(temp_workspace, "a.py", "HelloWorld\n")
+        (temp_workspace / "b.txt").unlink()
+        index.index(incremental=True)
+        assert index.search_candidates("HelloWorld") == ["a.py", "big.log"]
+
+    def test_compaction(self, temp_workspace, monkeypatch):
+        """测试失效的文件 ID 过多时压缩倒排表"""
+        monkeypatch.setattr(ContentIndex, "COMPACT_MIN_DEAD", 2)
+        write(temp_workspace, "a.py", "alpha\n")
+        index = ContentIndex(str(temp_workspace)).index()
+        for i in range(2):
+            write(temp_workspace, "a.py", f"alpha {i}\n")
+            index.update_paths(["a.py"])
+        assert index.search_candidates("alpha") == ["a.py"]
+        assert all(len(ids) == 1 for ids in index._postings.values())
+
+    def test_persistence(self, temp_workspace):
+        """测试持久化后重新加载，只重建变化的文件"""
+        write(temp_workspace, "a.py", "needle = 1\n")
+        write(temp_workspace, "b.py", "haystack = 2\n")
+        ContentIndex.for_workspace(str(temp_workspace)).index()
+
+        write(temp_workspace, "b.py", "needle = 2\n")
+        reloaded = ContentIndex.for_workspace(str(temp_workspace))
+        assert reloaded.stats()["files"] == 2
+        assert reloaded.search_candidates("needle") == ["a.py"]
+        assert reloaded.index().search_candidates("needle") == ["a.py", "b.py"]
+        assert reloaded.search_candidates("haystack") == []
+
+    def test_watcher_updates_attached_index(self, temp_workspace):
+        """测试注册表中的内容索引随文件监听器更新"""
+        write(temp_workspace, "a.py", "def a():\n    pass\n")
+        registry = IndexRegistry(watcher_options={"debounce": 0.05, "use_inotify": False})
+        try:
+            content = registry.content_index(str(temp_workspace))
+            assert registry.content_index(str(temp_workspace)) is content
+            assert content.search_candidates("needle") == []
+
+            write(temp_workspace, "a.py", "needle = 1\n")
+            notify_file_changed(temp_workspace / "a.py")
+            deadline = time.monotonic() + 5
+            while not content.search_candidates("needle") and time.monotonic() < deadline:
+                time.sleep(0.02)
+            assert content.search_candidates("needle") == ["a.py"]
+            assert registry.stats()["workspaces"][0]["content_files"] == 1
+        finally:
+            registry.clear()
+
+    def test_build_in_background(self, temp_workspace):
+        """测试不等待时内容索引在后台构建，就绪前返回 None"""
+        write(temp_workspace, "a.py", "needle = 1\n")
+        registry = IndexRegistry(watch=False)
+        assert registry.content_index(str(temp_workspace), wait=False) is None
+        deadline = time.monotonic() + 5
+        content = None
+        while content is None and time.monotonic() < deadline:
+            time.sleep(0.02)
+            content = registry.content_index(str(temp_workspace), wait=False)
+        assert content is registry.content_index(str(temp_workspace))
+        assert content.search_candidates("needle") == ["a.py"]
+
+    def test_independent_of_code_index(self, temp_workspace):
+        """测试构建内容索引不会构建代码索引，之后按需构建的代码索引共用同一个文件监听器"""
+        write(temp_workspace, "a.py", "def a():\n    pass\n")
+        registry = IndexRegistry(watcher_options={"debounce": 0.05, "use_inotify": False})
+        try:
+            content = registry.content_index(str(temp_workspace))
+            entry = registry.peek(str(temp_workspace))
+            assert not entry.indexed and not entry.graph.symbols
+            assert entry.indexer not in entry.watcher.targets
+
+            assert registry.get(str(temp_workspace)) is entry
+            assert entry.indexed and entry.indexer in entry.watcher.targets
+            assert [r.symbol.name for r in entry.searcher.search_symbol("a")] == ["a"]
+            assert registry.content_index(str(temp_workspace)) is content
+            assert (registry.hits, registry.misses) == (0, 1)
+        finally:
+            registry.clear()
+
+
+class TestIndexRegistry:
+    """工作区索引注册表测试类"""
+
+    @staticmethod
+    def make_workspaces(root: Path, count: int):
+        workspaces = []
+        for i in range(count):
+            ws = root / f"ws{i}"
+            write(ws, "m.py", f"def func_{i}():\n    pass\n")
+            workspaces.append(ws)
+        return workspaces
+
+    def test_lru_eviction_and_stats(self, temp_workspace):
+        """测试按工作区缓存、LRU 淘汰与命中统计"""
+        ws0, ws1, ws2 = self.make_workspaces(temp_workspace, 3)
+        registry = IndexRegistry(max_entries=2, watch=False)
+
+        first = registry.get(str(ws0))
+        assert registry.get(str(ws0) + "/.") is first
+        assert first.graph.get_symbol("m.py", "func_0") is not None
+        registry.get(str(ws1))
+        registry.get(str(ws0))   # ws0 变为最近使用
+        registry.get(str(ws2))   # 淘汰 ws1
+
+        assert registry.peek(str(ws1)) is None
+        assert registry.peek(str(ws0)) is first
+        stats = registry.stats()
+        assert (stats["hits"], stats["misses"], stats["evictions"]) == (2, 3, 1)
+        assert [w["workspace"] for w in stats["workspaces"]] == [str(ws2.resolve()), str(ws0.resolve())]
+        assert stats["total_bytes"] == sum(w["bytes"] for w in stats["workspaces"]) > 0
+
+    def test_failed_build_releases_lock(self, temp_workspace):
+        """测试索引失败时不残留构建锁，之后可以重新构建"""
+        ws, = self.make_workspaces(temp_workspace, 1)
+        failures = [RuntimeError("索引失败")]
+
+        def factory(workspace):
+            if failures:
+                raise failures.pop()
+            return CodeIndexer(workspace)
+
+        registry = IndexRegistry(indexer_factory=factory, watch=False)
+        with pytest.raises(RuntimeError):
+            registry.get(str(ws))
+        assert registry._building == {}
+        assert registry.get(str(ws)).graph.get_symbol("m.py", "func_0") is not None
+
+    def test_memory_budget(self, temp_workspace):
+        """测试超出内存预算时淘汰最久未使用的索引，但保留当前索引"""
+        ws0, ws1 = self.make_workspaces(temp_workspace, 2)
+        size = estimate_graph_bytes(CodeIndexer(str(ws0)).index())
+        registry = IndexRegistry(memory_budget=size + size // 2, watch=False)
+
+        registry.get(str(ws0))
+        registry.get(str(ws1))
+        assert registry.stats()["entries"] == 1
+        assert registry.peek(str(ws1)) is not None
+
+        registry.memory_budget = 1
+        assert registry.get(str(ws1)).graph.symbols
+
+    def test_size_estimate_cached_until_graph_changes(self, temp_workspace, monkeypatch):
+        """测试代码图未变化时沿用内存估算，变化后重新估算"""
+        from code_index import registry as registry_module
+
+        ws, = self.make_workspaces(temp_workspace, 1)
+        estimates = []
+        original = registry_module.estimate_graph_bytes
+        monkeypatch.setattr(registry_module, "estimate_graph_bytes",
+                            lambda graph: (estimates.append(1), original(graph))[1])
+
+        registry = IndexRegistry(watch=False)
+        registry.get(str(ws))
+        registry.stats()
+        registry.reindex(str(ws))
+        assert len(estimates) == 1
+
+        write(ws, "n.py", "def other():\n    pass\n")
+        entry = registry.reindex(str(ws))
+        assert len(estimates) == 2
+        assert entry.size_bytes == original(entry.graph)
+
+
+    def test_convenience_functions_share_index(self, temp_workspace, monkeypatch):
+        """测试便捷函数使用共享的常驻索引，并支持批量查询"""
+        from code_index import registry as registry_module
+        from code_index import searcher as searcher_module
+
+        write(temp_workspace, "m.py", "def alpha():\n    beta()\n\ndef beta():\n    pass\n")
+        registry = IndexRegistry(watch=False)
+        monkeypatch.setattr(registry_module, "_default_registry", None)
+        registry_module.set_default_registry(registry)
+
+        indexed = []
+        original = CodeIndexer.index
+        monkeypatch.setattr(CodeIndexer, "index",
+                            lambda self, *args, **kw: (indexed.append(1), original(self, *args, **kw))[1])
+
+        results = searcher_module.search_many(["alpha", "beta", "alpha", "missing"], str(temp_workspace))
+        assert list(results) == ["alpha", "beta", "missing"]
+        assert results["alpha"][0]["name"] == "alpha"
+        assert results["missing"] == []
+        assert searcher_module.search("beta", str(temp_workspace))[0]["line"] == 4
+        assert searcher_module.get_references("m.py", "beta", str(temp_workspace)) == [
+            {"name": "beta", "file": "m.py", "line": 1, "type": "calls"}
+        ]
+        # 只在首次调用时索引
+        assert len(indexed) == 1
+        assert registry.stats()["hits"] == 2
+
+
+class TestCallResolution:
+    """调用目标解析测试类"""
+
+    @staticmethod
+    def make_workspace(root: Path):
+        write(root, "pkg/__init__.py", "")
+        write(root, "pkg/util.py", "def helper():\n    pass\n")
+        write(root, "pkg/other.py", "def helper():\n    pass\n")
+        write(root, "main.py", (
+            "from pkg.util import helper\n\n"
+            "class Svc:\n"
+            "    def run(self):\n        self.save()\n        helper()\n        local()\n        print()\n\n"
+            "    def save(self):\n        local()\n\n"
+            "def local():\n    pass\n"
+        ))
+
+    def test_resolve_with_imports_and_scope(self, temp_workspace):
+        """测试按所在类、本模块和导入解析调用目标并排序候选"""
+        self.make_workspace(temp_workspace)
+        searcher = CodeSearcher(CodeIndexer(str(temp_workspace)).index())
+
+        callees = {c["name"]: c for c in searcher.search_callees("Svc.run")}
+        assert callees["Svc.save"]["key"] == "main.py::Svc.save"
+        assert callees["helper"]["candidates"] == ["pkg/util.py::helper", "pkg/other.py::helper"]
+        assert callees["local"]["file"] == "main.py"
+        assert callees["print"]["file"] == "external"
+
+        tree = searcher.get_call_graph("main.py::Svc.run", depth=3)
+        assert [c["name"] for c in tree["calls"]] == ["Svc.save", "helper", "local", "print"]
+        assert [c["name"] for c in tree["calls"][0]["calls"]] == ["local"]
+
+    def test_callers_by_qualified_name_and_key(self, temp_workspace):
+        """测试按方法名、限定名和完整符号键查找调用者"""
+        self.make_workspace(temp_workspace)
+        searcher = CodeSearcher(CodeIndexer(str(temp_workspace)).index())
+
+        for name in ("save", "Svc.save", "main.py::Svc.save"):
+            assert [c["name"] for c in searcher.search_callers(name)] == ["Svc.run"]
+        assert [c["name"] for c in searcher.search_callers("local")] == ["Svc.run", "Svc.save"]
+        assert [c["name"] for c in searcher.search_callers("print")] == ["Svc.run"]
+        assert searcher.search_callers("main.py::Missing.save") == []
+
+    def test_incremental_re_resolution(self, temp_workspace):
+        """测试被调用定义变化后，未修改文件中的调用也会重新解析"""
+        self.make_workspace(temp_workspace)
+        indexer = CodeIndexer(str(temp_workspace))
+        searcher = CodeSearcher(indexer.index())
+
+        write(temp_workspace, "pkg/util.py", "def unrelated():\n    pass\n")
+        indexer.update_paths(["pkg/util.py"])
+        callees = {c["name"]: c for c in searcher.search_callees("Svc.run")}
+        assert callees["helper"]["candidates"] == ["pkg/other.py::helper"]
+
+        (temp_workspace / "main.py").unlink()
+        indexer.update_paths(["main.py"])
+        assert searcher.search_callees("Svc.run") == []
+        assert searcher._calls().callers("pkg/other.py::helper") == []
+
+
+class TestCallGraph:
+    """调用图引擎测试类"""
+
+    @staticmethod
+    def make_searcher(root: Path):
+        write(root, "m.py", (
+            "def a():\n    b()\n    c()\n\n"
+            "def b():\n    c()\n    a()\n\n"
+            "def c():\n    d()\n\n"
+            "def d():\n    d()\n"
+        ))
+        indexer = CodeIndexer(str(root))
+        return indexer, CodeSearcher(indexer.index())
+
+    @staticmethod
+    def names(node):
+        return [(c["name"], c.get("cycle", False)) for c in node["calls"]]
+
+    def test_cycles_and_shared_subtrees(self, temp_workspace):
+        """测试递归标记、不因其他分支已展开而裁剪，以及批量请求复用子树"""
+        _, searcher = self.make_searcher(temp_workspace)
+
+        graphs = searcher.get_call_graphs(["a", "b", "a"], depth=3)
+        assert list(graphs) == ["a", "b"]
+        tree = graphs["a"]
+        assert self.names(tree) == [("b", False), ("c", False)]
+        b = tree["calls"][0]
+        assert self.names(b) == [("c", False), ("a", True)]
+        # c 在 b 的子树中出现过，a 直接调用 c 时仍完整展开
+        assert self.names(tree["calls"][1]) == [("d", False)]
+        assert self.names(tree["calls"][1]["calls"][0]) == [("d", True)]
+        assert self.names(graphs["b"]) == [("c", False), ("a", False)]
+        assert self.names(graphs["b"]["calls"][1]) == [("b", True), ("c", False)]
+
+        index = searcher.graph.peek_derived("call_graph")
+        assert index.hits > 0
+        assert index.reachable("m.py::c", 1) == {"m.py::c", "m.py::d"}
+
+    def test_cache_invalidated_on_change(self, temp_workspace):
+        """测试文件变更后调用图缓存失效"""
+        indexer, searcher = self.make_searcher(temp_workspace)
+        assert self.names(searcher.get_call_graph("c")) == [("d", False)]
+
+        write(temp_workspace, "m.py", "def c():\n    e()\n\ndef e():\n    pass\n")
+        indexer.update_paths(["m.py"])
+        assert self.names(searcher.get_call_graph("c")) == [("e", False)]
+
+
+class TestGraphPersistence:
+    """代码图保存/加载测试类"""
+
+    @staticmethod
+    def build_graph():
+        graph = CodeGraph()
+        graph.add_symbol(CodeSymbol("Svc", "class", "a.py", 1, 20, "class Svc(Base)", "服务类"))
+        graph.add_symbol(CodeSymbol("Svc.run", "method", "a.py", 3, 9, "def run(...)", None, "Svc"))
+        graph.add_symbol(CodeSymbol("main", "function", "b.py", 1, 4, "def main()", "入口\n\n多行文档"))
+        graph.add_edge(CodeEdge("a.py::Svc", "*::Base", "inherits"))
+        graph.add_edge(CodeEdge("b.py::main", "*::run", "calls"))
+        graph.imports_map["b.py"].update({"os", "a.Svc"})
+        return graph
+
+    def test_round_trip_with_lazy_docstrings(self, temp_workspace):
+        """测试 SQLite 格式保存后加载结果一致，且文档字符串延迟读取"""
+        from code_index.index_store import LazySymbol, _DOCSTRING_SLOT, _UNLOADED
+
+        graph = self.build_graph()
+        path = temp_workspace / "graph.db"
+        graph.save(str(path))
+        graph.save(str(path))   # 覆盖已有文件
+
+        loaded = CodeGraph.load(str(path))
+        main = loaded.get_symbol("b.py", "main")
+        assert isinstance(main, LazySymbol)
+        assert _DOCSTRING_SLOT.__get__(main) is _UNLOADED
+        assert _DOCSTRING_SLOT.__get__(loaded.get_symbol("a.py", "Svc.run")) is None
+        assert main.docstring == "入口\n\n多行文档"
+
+        assert loaded.to_dict() == graph.to_dict()
+        assert loaded.get_symbol("a.py", "Svc.run").parent == "Svc"
+        assert loaded.get_symbol("a.py", "Svc").end_line == 20
+        assert CodeGraph.load(str(path), lazy_docstrings=False).to_dict() == graph.to_dict()
+
+    def test_edge_snapshot(self, temp_workspace):
+        """测试边存储快照：损坏或失效时退回逐条重建，并在加载后重新写入"""
+        import sqlite3
+        from code_index.index_store import IndexStore
+
+        graph = self.build_graph()
+        graph.remove_file("a.py")   # 含已删除的边
+        graph.add_symbol(CodeSymbol("Svc", "class", "a.py", 1, 20))
+        graph.add_edge(CodeEdge("a.py::Svc", "*::main", "calls"))
+        path = temp_workspace / "graph.db"
+        graph.save(str(path))
+
+        restored = CodeGraph.load(str(path))
+        assert restored.to_dict() == graph.to_dict()
+        assert restored.find_callers("main") == ["a.py::Svc"]
+        assert restored.memory_usage()["adjacency"] > 0
+
+        with sqlite3.connect(str(path)) as conn:
+            conn.execute("UPDATE snapshot SET data = x'00' WHERE name = 'edge_source'")
+        assert CodeGraph.load(str(path)).to_dict() == graph.to_dict()
+
+        # 按文件更新后快照失效，下次加载时重建
+        store = IndexStore(str(path))
+        store.save_files(graph, [], ["a.py"])
+        with sqlite3.connect(str(path)) as conn:
+            assert conn.execute("SELECT COUNT(*) FROM snapshot").fetchone()[0] == 0
+        assert store.load_graph().to_dict() == graph.to_dict()
+        with sqlite3.connect(str(path)) as conn:
+            assert conn.execute("SELECT COUNT(*) FROM snapshot").fetchone()[0] > 0
+
+    def test_load_legacy_json(self, temp_workspace):
+        """测试兼容旧版 JSON 文件并保留结束行号和父符号"""
+        import json
+
+        graph = self.build_graph()
+        path = temp_workspace / "graph.json"
+        path.write_text(json.dumps(graph.to_dict()), encoding="utf-8")
+
+        assert CodeGraph.load(str(path)).to_dict() == graph.to_dict()
@@ -2,6 +2,7 @@
 文件服务单元测试
 """
 import os
+import time
 import tempfile
 import pytest
 import asyncio
@@ -173,3 +174,186 @@ class TestFileService:
                 assert item["is_dir"] is True
             else:
                 assert item["is_dir"] is False
+    
+    @pytest.mark.asyncio
+    async def test_list_directory_cache(self, file_service, temp_workspace):
+        """测试目录列表缓存：重复展开命中缓存，变更通知后失效"""
+        from services.file_service import directory_cache
+        
+        root = Path(temp_workspace)
+        (root / "a.txt").write_text("1", encoding='utf-8')
+        (root / "sub").mkdir()
+        (root / "sub" / ".hidden").write_text("x", encoding='utf-8')
+        # 目录 mtime 调到过去，避免被当作刚修改过的目录
+        old = time.time_ns() - 10 * 10**9
+        for path in (root / "sub", root):
+            os.utime(path, ns=(old, old))
+        
+        items = await file_service.list_directory("")
+        assert [(i["name"], i.get("is_empty")) for i in items] == [("sub", True), ("a.txt", None)]
+        hits = directory_cache.hits
+        assert await file_service.list_directory("") == items
+        assert directory_cache.hits == hits + 1
+        
+        # 原地修改文件不改变目录 mtime，由保存通知使缓存失效
+        await file_service.save_file("a.txt", "longer content")
+        items = await file_service.list_directory("")
+        assert items[1]["size"] == len("longer content")
+        
+        # 子目录新增文件后，上级目录中的 is_empty 随之更新
+        await file_service.create("sub/new.txt")
+        items = await file_service.list_directory("")
+        assert items[0]["is_empty"] is False
+    
+    @pytest.mark.asyncio
+    async def test_list_directory_child_then_parent(self, file_service, temp_workspace):
+        """测试先列出子目录再列出上级目录时，上级目录复用子目录的缓存判断是否为空"""
+        root = Path(temp_workspace)
+        (root / "sub").mkdir()
+        (root / "sub" / "a.txt").write_text("1", encoding='utf-8')
+        (root / "empty").mkdir()
+        old = time.time_ns() - 10 * 10**9
+        for path in (root / "sub", root / "empty", root):
+            os.utime(path, ns=(old, old))
+        
+        assert [i["name"] for i in await file_service.list_directory("sub")] == ["a.txt"]
+        assert await file_service.list_directory("empty") == []
+        items = await file_service.list_directory("")
+        assert [(i["name"], i["is_empty"]) for i in items] == [("empty", True), ("sub", False)]
+    
+    @pytest.mark.asyncio
+    async def test_list_directory_nested_workspace(self, file_service, temp_workspace):
+        """测试嵌套工作区列出同一目录时路径相对于各自的工作区"""
+        root = Path(temp_workspace)
+        (root / "proj" / "src").mkdir(parents=True)
+        (root / "proj" / "src" / "main.py").write_text("", encoding='utf-8')
+        old = time.time_ns() - 10 * 10**9
+        os.utime(root / "proj" / "src", ns=(old, old))
+        
+        outer = await file_service.list_directory("proj/src")
+        inner = await FileService(str(root / "proj")).list_directory("src")
+        assert outer[0]["path"] == os.path.join("proj", "src", "main.py")
+        assert inner[0]["path"] == os.path.join("src", "main.py")
+    
+    @pytest.mark.asyncio
+    async def test_read_lines(self, file_service, temp_workspace, monkeypatch):
+        """测试按行窗口读取（跨越行偏移索引的多个块），文件变化后索引重建"""
+        from services import file_service as file_service_module
+        monkeypatch.setattr(file_service_module, "LINE_INDEX_CHUNK", 16)
+        
+        path = Path(temp_workspace) / "app.log"
+        lines = [f"line {i}\n" for i in range(1, 51)]
+        path.write_text("".join(lines) + "tail", encoding='utf-8')
+        
+        result = await file_service.read_lines("app.log", 20, 3)
+        assert result["content"] == "".join(lines[19:22])
+        assert (result["start_line"], result["end_line"], result["total_lines"]) == (20, 22, 51)
+        result = await file_service.read_lines("app.log", 50, 10)
+        assert result["content"] == "line 50\ntail"
+        assert (await file_service.read_lines("app.log", 60, 10))["content"] == ""
+        
+        path.write_text("a\nb\n", encoding='utf-8')
+        result = await file_service.read_lines("app.log", 2, 10)
+        assert (result["content"], result["total_lines"]) == ("b\n", 2)
+        
+        (Path(temp_workspace) / "a.png").write_bytes(b"\x89PNG")
+        with pytest.raises(ValueError):
+            await file_service.read_lines("a.png")
+    
+    @pytest.mark.asyncio
+    async def test_read_large_binary_without_content(self, file_service, temp_workspace, monkeypatch):
+        """测试超过内联大小的二进制文件只返回元数据"""
+        from services import file_service as file_service_module
+        (Path(temp_workspace) / "a.png").write_bytes(b"\x89PNG" * 8)
+        
+        result = await file_service.read_file("a.png")
+        assert result["content"] and result["size"] == 32
+        monkeypatch.setattr(file_service_module, "INLINE_BINARY_LIMIT", 16)
+        result = await file_service.read_file("a.png")
+        assert (result["content"], result["size"], result["mime_type"]) == (None, 32, "image/png")
+    
+    @pytest.mark.asyncio
+    async def test_read_file_encoding_detection(self, file_service, temp_workspace):
+        """测试一次读取后检测编码（BOM、UTF-8、GBK），并按 mtime 和大小缓存结果"""
+        from services.file_service import encoding_cache
+        
+        root = Path(temp_workspace)
+        (root / "gbk.txt").write_bytes("中文注释\r\n".encode('gbk'))
+        (root / "utf8.txt").write_bytes("中文".encode('utf-8'))
+        (root / "wide.txt").write_bytes("wide".encode('utf-16'))
+        
+        result = await file_service.read_file("gbk.txt")
+        assert (result["content"], result["encoding"]) == ("中文注释\n", "gbk")
+        assert (await file_service.read_file("utf8.txt"))["encoding"] == "utf-8"
+        assert (await file_service.read_file("wide.txt"))["content"] == "wide"
+        
+        hits = encoding_cache.hits
+        await file_service.read_file("gbk.txt")
+        assert encoding_cache.hits == hits + 1
+        
+        # 保存后按新内容重新检测
+        await file_service.save_file("gbk.txt", "中文")
+        assert (await file_service.read_file("gbk.txt"))["encoding"] == "utf-8"
+    
+    @pytest.mark.asyncio
+    async def test_directory_generation(self, file_service, temp_workspace):
+        """测试目录列表代数：重新列出但内容相同时不变，内容变化后改变"""
+        root = Path(temp_workspace)
+        (root / "a.txt").write_text("1", encoding='utf-8')
+        old = time.time_ns() - 10 * 10**9
+        os.utime(root, ns=(old, old))
+        
+        generation = file_service.directory_generation("")
+        assert file_service.directory_generation("") == generation
+        
+        from code_index.watcher import notify_file_changed
+        notify_file_changed(root / "a.txt")
+        assert file_service.directory_generation("") == generation
+        
+        await file_service.save_file("a.txt", "longer content")
+        assert file_service.directory_generation("") != generation
+    
+    @pytest.mark.asyncio
+    async def test_patch_file(self, file_service, temp_workspace):
+        """测试按编辑列表和统一差异保存，基准版本不一致时拒绝"""
+        from services.file_service import VersionConflictError
+        
+        path = Path(temp_workspace) / "a.py"
+        path.write_text("a = 1\nb = 2\nc = 3\n", encoding='utf-8')
+        os.chmod(path, 0o640)
+        version = (await file_service.read_file("a.py"))["version"]
+        
+        result = await file_service.patch_file("a.py", version, edits=[{"start": 4, "end": 5, "text": "10"}])
+        assert path.read_text(encoding='utf-8') == "a = 10\nb = 2\nc = 3\n"
+        assert result["version"] == (await file_service.read_file("a.py"))["version"]
+        assert os.stat(path).st_mode & 0o777 == 0o640
+        assert [p.name for p in Path(temp_workspace).iterdir()] == ["a.py"]
+        
+        diff = "--- a/a.py\n+++ b/a.py\n@@ -2,2 +2,2 @@\n b = 2\n-c = 3\n+c = 30\n"
+        result = await file_service.patch_file("a.py", result["version"], diff=diff)
+        assert path.read_text(encoding='utf-8') == "a = 10\nb = 2\nc = 30\n"
+        
+        # 基准版本过期：文件保持不变
+        with pytest.raises(VersionConflictError) as conflict:
+            await file_service.patch_file("a.py", version, edits=[])
+        assert conflict.value.current_version == result["version"]
+        with pytest.raises(ValueError):
+            await file_service.patch_file("a.py", result["version"], diff=diff)
+        with pytest.raises(ValueError):
+            await file_service.patch_file("a.py", result["version"], edits=[{"start": 0, "end": 99}])
+        assert path.read_text(encoding='utf-8') == "a = 10\nb = 2\nc = 30\n"
+    
+    @pytest.mark.asyncio
+    async def test_save_keeps_hard_links_and_umask(self, file_service, temp_workspace):
+        """测试保存有硬链接的文件时原地写入，新文件的权限与直接创建一致"""
+        root = Path(temp_workspace)
+        (root / "probe.txt").touch()
+        expected_mode = os.stat(root / "probe.txt").st_mode & 0o777
+        
+        await file_service.save_file("new.txt", "new")
+        assert os.stat(root / "new.txt").st_mode & 0o777 == expected_mode
+        
+        os.link(root / "new.txt", root / "linked.txt")
+        await file_service.save_file("new.txt", "changed")
+        assert (root / "linked.txt").read_text(encoding='utf-8') == "changed"
+        assert os.stat(root / "new.txt").st_nlink == 2
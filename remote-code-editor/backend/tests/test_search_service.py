@@ -0,0 +1,123 @@
+"""
+内容搜索服务单元测试
+"""
+import tempfile
+import time
+import pytest
+from pathlib import Path
+
+# 添加父目录到路径
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from code_index.content_index import ContentIndex
+from services import search_service
+from services.search_service import SearchJob, build_pattern, cancel_search, search_file
+
+
+@pytest.fixture
+def temp_workspace():
+    """创建临时工作目录"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        yield Path(tmpdir)
+
+
+class TestSearchFile:
+    """单文件搜索测试类"""
+
+    CONTENT = "import os\n\ndef Foo():\n    return foo(foo)\n# end foo\nlast foo"
+
+    def test_line_numbers_and_columns(self, temp_workspace):
+        """测试整体匹配得到的行号、列号，且每行只取第一个匹配"""
+        path = temp_workspace / "a.py"
+        path.write_text(self.CONTENT, encoding="utf-8")
+
+        matches = search_file(path, build_pattern("foo"), 10)
+        assert [(m.line, m.column, m.text) for m in matches] == [
+            (3, 5, "def Foo():"),
+            (4, 12, "return foo(foo)"),
+            (5, 7, "# end foo"),
+            (6, 6, "last foo"),
+        ]
+        assert [m.line for m in search_file(path, build_pattern("foo", case_sensitive=True), 2)] == [4, 5]
+        assert [m.line for m in search_file(path, build_pattern(r"^\w+ foo$", regex=True), 10)] == [6]
+        assert search_file(path, build_pattern("fo", whole_word=True), 10) == []
+
+    def test_mmap_matches_in_memory_scan(self, temp_workspace, monkeypatch):
+        """测试大文件通过 mmap 搜索的结果与读入内存一致"""
+        path = temp_workspace / "a.py"
+        path.write_text(self.CONTENT, encoding="utf-8")
+        pattern = build_pattern("foo")
+        expected = search_file(path, pattern, 10)
+
+        monkeypatch.setattr(search_service, "MMAP_THRESHOLD", 1)
+        assert search_file(path, pattern, 10) == expected
+
+    def test_skips_binary(self, temp_workspace):
+        """测试含 NUL 字节的文件按二进制跳过（不依赖扩展名）"""
+        path = temp_workspace / "data.txt"
+        path.write_bytes(b"foo\0bar")
+        assert search_file(path, build_pattern("foo"), 10) == []
+        assert search_file(temp_workspace / "missing.txt", build_pattern("foo"), 10) == []
+
+
+class TestSearchJob:
+    """并行流式搜索测试类"""
+
+    @pytest.fixture
+    def workspace(self, temp_workspace, monkeypatch):
+        for i in range(20):
+            (temp_workspace / f"f{i:02d}.py").write_text(f"needle = {i}\nneedle again\n", encoding="utf-8")
+        (temp_workspace / "other.py").write_text("nothing\n", encoding="utf-8")
+        index = ContentIndex(str(temp_workspace)).index()
+        monkeypatch.setattr(search_service, "get_content_index", lambda workspace, wait=True: index)
+        return temp_workspace
+
+    def test_streams_in_path_order(self, workspace):
+        """测试多线程扫描仍按路径顺序产出，最后一个事件为统计"""
+        events = list(SearchJob(str(workspace), build_pattern("needle"), workers=4).run())
+        assert [e["file"] for e in events[:-1]] == [f"f{i:02d}.py" for i in range(20)]
+        assert events[-1]["type"] == "done"
+        assert (events[-1]["status"], events[-1]["files"], events[-1]["matches"]) == ("completed", 20, 40)
+
+    def test_scans_until_index_ready(self, workspace, monkeypatch):
+        """测试内容索引未就绪时直接扫描工作区文件"""
+        monkeypatch.setattr(search_service, "get_content_index", lambda workspace, wait=True: None)
+        events = list(SearchJob(str(workspace), build_pattern("needle"), workers=2).run())
+        assert [e["file"] for e in events[:-1]] == [f"f{i:02d}.py" for i in range(20)]
+        assert (events[-1]["status"], events[-1]["scanned"]) == ("completed", 21)
+
+    def test_hidden_files_skipped_but_not_hidden_dirs(self, workspace, monkeypatch):
+        """测试默认跳过以 . 开头的文件，但搜索 .github 等目录下的文件"""
+        monkeypatch.setattr(search_service, "get_content_index", lambda workspace, wait=True: None)
+        (workspace / ".github").mkdir()
+        (workspace / ".github" / "ci.yml").write_text("needle\n", encoding="utf-8")
+        (workspace / ".env").write_text("needle\n", encoding="utf-8")
+        files = [e["file"] for e in SearchJob(str(workspace), build_pattern("needle")).run() if e["type"] == "file"]
+        assert ".github/ci.yml" in files and ".env" not in files
+        job = SearchJob(str(workspace), build_pattern("needle"), include_hidden=True)
+        files = [e["file"] for e in job.run() if e["type"] == "file"]
+        assert ".env" in files
+
+    def test_result_budget(self, workspace):
+        """测试达到匹配数预算后停止"""
+        events = list(SearchJob(str(workspace), build_pattern("needle"), max_results=5).run())
+        assert [len(e["matches"]) for e in events[:-1]] == [2, 2, 1]
+        assert (events[-1]["status"], events[-1]["matches"]) == ("truncated", 5)
+
+    def test_cancel_and_timeout(self, workspace, monkeypatch):
+        """测试取消和超出时间预算时提前结束"""
+        job = SearchJob(str(workspace), build_pattern("needle"), workers=2)
+        events = job.run()
+        assert next(events)["file"] == "f00.py"
+        cancel_search(job.id)
+        assert job.cancelled
+        assert list(events)[-1]["status"] == "cancelled"
+        assert cancel_search(job.id) is False
+
+        original = search_service.search_file
+        monkeypatch.setattr(search_service, "search_file",
+                            lambda *args: (time.sleep(0.05), original(*args))[1])
+        done = list(SearchJob(str(workspace), build_pattern("needle"), timeout=0.1, workers=1).run())[-1]
+        assert done["status"] == "timeout"
+        assert done["scanned"] < 20